@@ -1,17 +1,10 @@
 import streamlit as st
-from tool_modules.eu_mix_preconfiguration import *
-from tool_modules.categorisation import *
-from tool_modules.pathway_select import *
-from tool_modules.pathway_view import *
-from tool_modules.pathway_perton import *
-from tool_modules.import_export_file import *
-from tool_modules.maps import *
-from tool_modules.cluster_results import *
-from tool_modules.cluster_configuration import *
-from tool_modules.emissions import *
-from doc.doc_pathway import *
+from tool_modules.warmup import start_warmup
 
 st.set_page_config(layout="wide", initial_sidebar_state="expanded")
+
+# Fill the shared caches in the background before the first user needs them
+start_warmup()
 logo = "images/logo_UGent_EN_RGB_2400_color.png"
 logo_side = "images/logo_side_bar.png"
 st.logo(logo_side, size="large",
@@ -1,20 +1,12 @@
 import streamlit as st
-from tool_modules.eu_mix_preconfiguration import *
-from tool_modules.categorisation import *
-from tool_modules.pathway_select import *
-from tool_modules.pathway_view import *
-from tool_modules.pathway_perton import *
-from tool_modules.import_export_file import *
-from tool_modules.maps import *
-from tool_modules.cluster_results import *
-from tool_modules.cluster_configuration import *
-from tool_modules.emissions import *
-from tool_modules.profile_load import *
-from tool_modules.supply import *
-
+from tool_modules.warmup import start_warmup
+from tool_modules.sections import run_section
 
 st.set_page_config(layout="wide")
 
+# Fill the shared caches in the background before the first user needs them
+start_warmup()
+
 # Logos
 logo = "images/logo_UGent_EN_RGB_2400_color.png"
 logo_side = "images/logo_side_bar.png"
@@ -79,20 +71,20 @@ if tool_section == "Pathway":
     )
 
     if pathway_subsection == "Pathway configuration":
-        select_page()
+        run_section("select_page")
         st.session_state["tool_subsection_prechoice"] = 0
 
     elif pathway_subsection == "Production route consumption":
-        perton_page()
+        run_section("perton_page")
         st.session_state["tool_subsection_prechoice"] = 1
 
     elif pathway_subsection == "CO2 Emissions":
         st.session_state["tool_subsection_prechoice"] = 2
-        emissions_pathway()
+        run_section("emissions_pathway")
 
     elif pathway_subsection == "Pathway visualisation":
         st.session_state["tool_subsection_prechoice"] = 3
-        view_page()
+        run_section("view_page")
 
 # === MAPS ===
 elif tool_section == "Maps - European scale":
@@ -109,7 +101,7 @@ elif tool_section == "Maps - European scale":
     )
 
     if maps_subsection == "Map per pathway":
-        map_per_pathway()
+        run_section("map_per_pathway")
 
 # === CLUSTER ===
 elif tool_section == "Cluster - micro scale":
@@ -127,18 +119,18 @@ elif tool_section == "Cluster - micro scale":
 
     if cluster_subsection == "Cluster configuration":
         st.session_state["tool_subsection_prechoice"] = 0
-        cluster_configuration()
+        run_section("cluster_configuration")
 
     elif cluster_subsection == "Cluster results":
         st.session_state["tool_subsection_prechoice"] = 1
-        cluster_results()
+        run_section("cluster_results")
 
 # === PROFILE LOAD ===
 elif tool_section == "Profile load":
     st.session_state["tool_section_prechoice_doc"] = 3
-    profile_load()
+    run_section("profile_load")
 
 # === Low Carbon supply ===
 elif tool_section == "Low Carbon supply":
     st.session_state["tool_section_prechoice_doc"] = 4
-    supply()
+    run_section("supply")
@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from zipfile import ZipFile
-import requests
-from tool_modules.loading_data import *
+import time
+from tool_modules.loading_data import ZIP_FILES, fetch_all, is_downloaded
+from tool_modules.reference_store import memory_footprint
+from tool_modules.sections import import_report
+from tool_modules.memo import cache_stats
+from tool_modules.registry import split_sector_product
+from tool_modules.warmup import is_ready, warmup_status
 
 # ------------------ Main Streamlit Page ------------------
 
@@ -33,10 +36,9 @@ if st.session_state:
                         st.markdown(f"### Pathway: **{pathway}**")
                         sector_map = {}
                         for sector_product, df in st.session_state["Pathway name"][pathway].items():
-                            parts = sector_product.split("_")
-                            if len(parts) < 2: 
+                            if "_" not in sector_product:
                                 continue
-                            sector, product = parts[0], "_".join(parts[1:])
+                            sector, product = split_sector_product(sector_product)
                             if not df.empty:
                                 sector_map.setdefault(sector, []).append((product, df))
 
@@ -73,26 +75,74 @@ else:
     st.info("Session state is currently empty.")
 
 
+# --- Shared reference data (loaded once per server process) ---
+with st.expander("Shared reference data"):
+    df_footprint = memory_footprint()
+    if df_footprint.empty:
+        st.info("No reference dataset loaded yet.")
+    else:
+        st.dataframe(df_footprint, hide_index=True)
+        st.caption(
+            f"Total: {df_footprint['size (MB)'].sum():.1f} MB, shared by all sessions")
+
+# --- Server warm-up (shared caches filled at start) ---
+with st.expander("Server warm-up"):
+    if is_ready():
+        st.success("Shared caches are ready")
+    else:
+        st.info("Shared caches are still being filled in the background")
+    st.dataframe(warmup_status(), hide_index=True)
+
+# --- Memoised computations (shared by all sessions) ---
+with st.expander("Computation caches"):
+    df_cache_stats = cache_stats()
+    if df_cache_stats.empty:
+        st.info("No computation cached yet.")
+    else:
+        st.dataframe(df_cache_stats, hide_index=True)
+
+# --- Tool sections imported so far (imported lazily on first use) ---
+with st.expander("Section import times"):
+    df_imports = import_report()
+    if df_imports.empty:
+        st.info("No tool section opened yet.")
+    else:
+        st.dataframe(df_imports, hide_index=True)
+
+
 # --- Data Download Section ---
 st.title("⬇️ Download Time Series Data")
 
-# Initialize archives if not present
-if "archives" not in st.session_state:
-    st.session_state.archives = {}
-
-# Loop through each dataset and check if it's already downloaded
-for name, info in ZIP_FILES.items():
-    # Check if dataset exists in session state
-    if name in st.session_state.archives and info["file"] in st.session_state.archives[name]:
+# Datasets are fetched once into the local cache and shared by every session
+missing = [name for name in ZIP_FILES if not is_downloaded(name)]
+for name in ZIP_FILES:
+    if name not in missing:
         st.success(f"{name} is already downloaded ✅")
-    else:
-        # Show download button for this specific dataset
-        if st.button(f"⬇️ Download {name}", key=f"download_{name}"):
-            # Ensure nested dict exists
-            if name not in st.session_state.archives:
-                st.session_state.archives[name] = {}
-
-            # Download the file
-            file_obj = fetch_file_from_zip_to_bytes(info["url"], info["file"])
-            st.session_state.archives[name][info["file"]] = file_obj
-            st.success(f"{name} downloaded and ready!")
\ No newline at end of file
+
+if missing and st.button("⬇️ Download " + ", ".join(missing), key="download_all"):
+    # Written by the download threads, displayed by this script
+    status = {}
+
+    def on_progress(name, downloaded, total):
+        status[name] = (downloaded, total)
+
+    futures = fetch_all(progress=on_progress)
+    bars = {name: st.progress(0, text=f"Downloading {name}...") for name in missing}
+
+    while not all(futures[name].done() for name in missing):
+        for name in missing:
+            downloaded, total = status.get(name, (0, 0))
+            if total:
+                bars[name].progress(min(downloaded / total, 1.0),
+                                    text=f"Downloading {name}... {downloaded / total * 100:.1f}%")
+            else:
+                bars[name].progress(0, text=f"Downloading {name}... {downloaded / 1e6:.1f} MB")
+        time.sleep(0.2)
+
+    for name in missing:
+        error = futures[name].exception()
+        if error is not None:
+            bars[name].empty()
+            st.error(f"{name} could not be downloaded: {error}")
+        else:
+            bars[name].progress(1.0, text=f"{name} downloaded and ready!")
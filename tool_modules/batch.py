@@ -0,0 +1,269 @@
+"""
+Headless evaluation of pathways, without Streamlit.
+
+Computes the site demand, clusters and cluster summaries of each pathway
+with the functions used by the maps page and writes them as the files of
+'data/results clustering'. Pathways are evaluated in parallel processes.
+
+Example:
+    python -m tool_modules.batch EU-MIX-2018 data/premade_pathway/ECM_Tool_IEA-NET-ZERO-2050.txt \\
+        --method DBSCAN --min-samples 5 --radius 10 --utilisation Steel=80 --output out/
+"""
+import os
+import argparse
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import shapely
+
+from tool_modules.reference_store import get_reference
+from tool_modules.registry import product_updates
+from tool_modules.eu_mix_preconfiguration import EU_MIX_PATHWAYS, eu_mix_pathway
+from tool_modules.site_demand import (
+    production_sites, pathways_site_demand, DEFAULT_UTILIZATION, REPORT_COLUMNS, PYPSA_COLUMNS)
+
+logger = logging.getLogger(__name__)
+
+# Energy carriers of the reports (GJ per tonne)
+GJ_CARRIERS = [col for col in REPORT_COLUMNS if col.endswith("[gj/t] ton")]
+
+FORMATS = ("csv", "parquet", "geojson")
+
+METHODS = ("DBSCAN", "HIERARCHICAL", "KMEANS", "KMEANS_WEIGHTED", "KMEANS_THRESHOLD")
+
+# AIDRES product name of each readable product name (the reports keep the AIDRES ones)
+AIDRES_PRODUCT_NAMES = {name: product for product, name in product_updates.items()}
+
+
+def load_pathway(source):
+    """
+    Read a pathway as the pathway page would save it.
+
+    Parameters:
+        source (str): Path of a pathway file (CSV/TXT with route_name and
+            route_weight, e.g. a downloaded pathway) or an EU-MIX name.
+
+    Returns:
+        (str, dict): Pathway name and 'Sector_Product' key -> DataFrame of routes.
+    """
+    from tool_modules.builder_functions import premade_routes, valid_weight_total
+
+    if source in EU_MIX_PATHWAYS:
+        # Shared with the Ready-made path option of the app
+        return source, eu_mix_pathway(source)
+
+    name = Path(source).stem.replace("Pathway_", "")
+    df_upload = pd.read_csv(source, sep=",")
+    missing_columns = {"route_name", "route_weight"} - set(df_upload.columns)
+    if missing_columns:
+        raise ValueError(f"{source}: missing columns {', '.join(sorted(missing_columns))}")
+
+    pathway = {}
+    for key, df_product in premade_routes(get_reference("perton_sector"), df_upload).items():
+        total_weight = df_product["route_weight"].sum()
+        if not valid_weight_total(total_weight):
+            logger.warning("%s: %s weights sum to %.2f, not ~100%%; skipped", name, key, total_weight)
+            continue
+        # Keep only the selected rows (where route_weight not 0)
+        pathway[key] = df_product[df_product["route_weight"] != 0]
+    return name, pathway
+
+
+def evaluate_pathway(source, sector_utilization, selected_columns, country_codes, clustering):
+    """
+    Site demand, clusters and cluster summary of one pathway.
+
+    Parameters:
+        source (str): Pathway file or EU-MIX name (see load_pathway).
+        sector_utilization (dict): Sector -> utilisation rate (%).
+        selected_columns (list): Per tonne carrier columns.
+        country_codes (list): Countries to keep (all if empty).
+        clustering (dict): choice, param1, param2, param4, threshold and
+            capacity of run_clustering.
+
+    Returns:
+        (str, GeoDataFrame, GeoDataFrame): Pathway name, clustered sites and
+        one row per cluster.
+    """
+    from tool_modules.clustering import (
+        run_clustering, summarise_clusters_by_centroid, summarise_single_linkage)
+
+    name, pathway = load_pathway(source)
+    [gdf_prod_x_perton] = pathways_site_demand(
+        production_sites(), [pathway], sector_utilization, selected_columns, country_codes)
+    if gdf_prod_x_perton.empty:
+        raise ValueError(f"{name} does not contain AIDRES data")
+
+    gdf_clustered = run_clustering(
+        clustering["choice"], gdf_prod_x_perton, clustering["param1"],
+        clustering["param2"], clustering["param4"], clustering.get("threshold"),
+        capacity=clustering.get("capacity", 0))
+    if "cluster" not in gdf_clustered.columns:
+        gdf_clustered = gdf_clustered.assign(cluster=-1)
+    if clustering["choice"] == "HIERARCHICAL":
+        gdf_summary = summarise_single_linkage(gdf_clustered, clustering["param1"])
+    else:
+        gdf_summary = summarise_clusters_by_centroid(gdf_clustered)
+    return name, gdf_clustered, gdf_summary
+
+
+def write_results(name, gdf_clustered, gdf_summary, output_dir, method, formats=FORMATS):
+    """
+    Write the results of a pathway.
+
+    Files:
+        <method>_report_<name>.csv/.parquet: Per site report (REPORT_COLUMNS).
+        <method>_clusters_<name>.csv/.parquet: One row per cluster.
+        <name>.geojson: Per site demand for PyPSA (PYPSA_COLUMNS).
+
+    Returns:
+        list: Paths written.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    df_report = gdf_clustered.reindex(columns=REPORT_COLUMNS)
+    df_report["product_name"] = df_report["product_name"].replace(AIDRES_PRODUCT_NAMES)
+    written = []
+
+    for stem, df in ((f"{method}_report_{name}", df_report),
+                     (f"{method}_clusters_{name}", gdf_summary)):
+        if "csv" in formats:
+            path = output_dir / f"{stem}.csv"
+            # Geometry as WKT rounded to 6 decimals, as in 'data/results clustering'
+            pd.DataFrame(df).assign(
+                geometry=shapely.to_wkt(df["geometry"].to_numpy(), rounding_precision=6)
+            ).to_csv(path)
+            written.append(path)
+        if "parquet" in formats:
+            path = output_dir / f"{stem}.parquet"
+            df.to_parquet(path)
+            written.append(path)
+    if "geojson" in formats:
+        path = output_dir / f"{name}.geojson"
+        gdf_clustered[PYPSA_COLUMNS].to_file(path, driver="GeoJSON")
+        written.append(path)
+    return written
+
+
+def run_pathway(source, options):
+    """Evaluate one pathway and write its files (process pool task)."""
+    name, gdf_clustered, gdf_summary = evaluate_pathway(
+        source, options["sector_utilization"], options["selected_columns"],
+        options["country_codes"], options["clustering"])
+    return write_results(name, gdf_clustered, gdf_summary, options["output_dir"],
+                         options["clustering"]["choice"], options["formats"])
+
+
+def run_batch(sources, options, workers=None):
+    """
+    Evaluate pathways in parallel processes.
+
+    Returns:
+        dict: source -> list of paths written, or the exception raised.
+    """
+    results = {}
+    if workers == 1 or len(sources) == 1:
+        for source in sources:
+            try:
+                results[source] = run_pathway(source, options)
+            except Exception as error:
+                results[source] = error
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {source: executor.submit(run_pathway, source, options) for source in sources}
+        for source, future in futures.items():
+            try:
+                results[source] = future.result()
+            except Exception as error:
+                results[source] = error
+    return results
+
+
+def _parse_utilisation(values):
+    sector_utilization = dict(DEFAULT_UTILIZATION)
+    for value in values or []:
+        sector, _, rate = value.partition("=")
+        if sector not in sector_utilization or not rate:
+            raise argparse.ArgumentTypeError(
+                f"Expected SECTOR=RATE with SECTOR in {', '.join(DEFAULT_UTILIZATION)}, not '{value}'")
+        sector_utilization[sector] = float(rate)
+    return sector_utilization
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tool_modules.batch",
+        description="Compute site demand and clusters of pathways without the Streamlit app.")
+    parser.add_argument("pathways", nargs="+",
+                        help=f"Pathway files (CSV/TXT) or {', '.join(EU_MIX_PATHWAYS)}")
+    parser.add_argument("--output", default="results", help="Output directory")
+    parser.add_argument("--utilisation", action="append", metavar="SECTOR=RATE",
+                        help="Utilisation rate (%%) of a sector, default 100 (repeatable)")
+    parser.add_argument("--countries", nargs="*", default=[], metavar="CODE",
+                        help="Country codes to keep (e.g. FR DE), default all")
+    parser.add_argument("--carriers", nargs="*", metavar="COLUMN",
+                        help="Per tonne carrier columns, default all GJ carriers")
+    parser.add_argument("--method", choices=METHODS, default="DBSCAN")
+    parser.add_argument("--min-samples", type=int, default=5, help="DBSCAN minimum number of sites")
+    parser.add_argument("--radius", type=float, default=10,
+                        help="DBSCAN / HIERARCHICAL distance between sites (km)")
+    parser.add_argument("--n-clusters", type=int, default=100, help="KMeans number of clusters")
+    parser.add_argument("--value-type", choices=("Energy", "Emissions"), default="Energy",
+                        help="KMeans weight / threshold value")
+    parser.add_argument("--threshold", type=float, default=0,
+                        help="KMEANS_THRESHOLD minimum cluster total (GJ or t)")
+    parser.add_argument("--redistribute", action="store_true",
+                        help="KMEANS_THRESHOLD: reassign sites of undersized clusters")
+    parser.add_argument("--capacity", type=float, default=0,
+                        help="KMEANS_THRESHOLD: maximum cluster total after reassignment, 0 for no limit")
+    parser.add_argument("--formats", nargs="*", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes, default one per CPU")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    try:
+        sector_utilization = _parse_utilisation(args.utilisation)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    if args.method == "DBSCAN":
+        param1, param2, param4 = args.min_samples, args.radius, None
+    elif args.method == "HIERARCHICAL":
+        param1, param2, param4 = args.radius, None, None
+    else:
+        param1, param2 = args.n_clusters, args.value_type
+        param4 = "Yes" if args.redistribute else "No"
+
+    selected_columns = args.carriers or [col[:-len(" ton")] for col in GJ_CARRIERS]
+    options = {
+        "sector_utilization": sector_utilization,
+        "selected_columns": selected_columns,
+        "country_codes": args.countries,
+        "clustering": {"choice": args.method, "param1": param1, "param2": param2,
+                       "param4": param4, "threshold": args.threshold,
+                       "capacity": args.capacity},
+        "output_dir": args.output,
+        "formats": args.formats,
+    }
+
+    failed = False
+    for source, result in run_batch(args.pathways, options, args.workers).items():
+        if isinstance(result, Exception):
+            failed = True
+            logger.error("%s: %s", source, result)
+        else:
+            logger.info("%s: wrote %s", source, ", ".join(os.fspath(path) for path in result))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,6 +4,8 @@
 from tool_modules.categorisation import *
 from tool_modules.eu_mix_preconfiguration import *
 from tool_modules.import_export_file import *
+from tool_modules.reference_store import get_reference
+from tool_modules.registry import sector_product_key
 
 import json
 from pathlib import Path
@@ -16,6 +18,26 @@ import streamlit as st
 # -------------------------------
 sectors_list_AIDRES = ["Cement", "Chemical", "Fertilisers", "Glass", "Refineries", "Steel"]
 
+# -------------------------------
+# Per-ton route table of the session
+# -------------------------------
+def get_perton_sector_table():
+    """
+    Route table used by the pathway and cluster editors.
+
+    The AIDRES routes come from the process-wide reference store and are
+    shared by all sessions; only the routes created in this session
+    (st.session_state.df_perton_user_routes) are kept per user.
+
+    Returns:
+        pd.DataFrame: Shared AIDRES routes followed by the session routes.
+    """
+    df_perton_ALL_sector = get_reference("perton_sector")
+    user_routes = st.session_state.get("df_perton_user_routes")
+    if user_routes is None or user_routes.empty:
+        return df_perton_ALL_sector
+    return pd.concat([df_perton_ALL_sector, user_routes], ignore_index=True)
+
 # -------------------------------
 # Helper function: edit dataframe selection and weighting
 # -------------------------------
@@ -170,36 +192,61 @@ def edit_dataframe_selection_and_weighting(df_product, columns_to_show_selection
             if not found_param_change:
                 st.write("No parameter changes.")
 
-    # --- Append new rows to global df_perton_ALL_sector safely ---
-    if "df_perton_ALL_sector" in st.session_state:
-        # Ensure df_perton_ALL_sector has 'route_name' column
-        if "route_name" not in st.session_state.df_perton_ALL_sector.columns:
-            st.warning("'route_name' missing in df_perton_ALL_sector. Skipping append.")
-            new_rows = pd.DataFrame()  # empty
-        else:
-            # Filter edited_selected_df to rows not already in df_perton_ALL_sector
-            if "route_name" in edited_selected_df.columns:
-                new_rows = edited_selected_df[
-                    ~edited_selected_df["route_name"].isin(
-                        st.session_state.df_perton_ALL_sector["route_name"]
-                    )
-                ]
-            else:
-                st.warning("'route_name' missing in edited_selected_df. No rows to append.")
-                new_rows = pd.DataFrame()  # empty
-
-        # Append only if there are new rows
-        if not new_rows.empty:
-            st.session_state.df_perton_ALL_sector = pd.concat(
-                [st.session_state.df_perton_ALL_sector, new_rows],
-                ignore_index=True
+    # --- Keep new rows as session routes (the shared AIDRES table is read-only) ---
+    df_perton_ALL_sector = get_perton_sector_table()
+    # Filter edited_selected_df to rows not already in df_perton_ALL_sector
+    if "route_name" in edited_selected_df.columns:
+        new_rows = edited_selected_df[
+            ~edited_selected_df["route_name"].isin(
+                df_perton_ALL_sector["route_name"]
             )
+        ]
+    else:
+        st.warning("'route_name' missing in edited_selected_df. No rows to append.")
+        new_rows = pd.DataFrame()  # empty
+
+    # Append only if there are new rows
+    if not new_rows.empty:
+        st.session_state.df_perton_user_routes = pd.concat(
+            [st.session_state.get("df_perton_user_routes", pd.DataFrame()), new_rows],
+            ignore_index=True
+        )
 
     return edited_selected_df, modified
 
 # -------------------------------
 # Function: Preconfigure path
 # -------------------------------
+def valid_weight_total(total_weight):
+    """Route weights of a product must sum to ~100 % (or 0 when unused)."""
+    return 99.95 <= total_weight <= 100.05 or total_weight == 0
+
+
+def premade_routes(df, df_upload):
+    """
+    Routes of the route table weighted as in a pathway file.
+
+    Parameters:
+        df (pd.DataFrame): Route table (see get_perton_sector_table).
+        df_upload (pd.DataFrame): Pathway routes with route_name and route_weight.
+
+    Returns:
+        dict: 'Sector_Product' key -> all routes of the product, with
+        'selected' and 'route_weight' taken from the pathway (0 if absent).
+    """
+    dict_routes = {}
+    filtered_df = df[df["route_name"].isin(df_upload["route_name"])]
+    df_upload_map = df_upload.set_index("route_name")["route_weight"].to_dict()
+    for sector in sorted(filtered_df["sector_name"].unique()):
+        all_products = sorted(df[df["sector_name"] == sector]["product_name"].unique())
+        for product in all_products:
+            df_product = df[(df["sector_name"] == sector) & (df["product_name"] == product)].copy()
+            df_product["selected"] = df_product["route_name"].isin(df_upload["route_name"])
+            df_product["route_weight"] = df_product["route_name"].map(df_upload_map).fillna(0)
+            dict_routes[sector_product_key(sector, product)] = df_product
+    return dict_routes
+
+
 def preconfigure_path(df, columns_to_show_selection):
     """
     Preconfigure pathways using pre-made EU-MIX scenarios or custom selection.
@@ -228,7 +275,7 @@ def preconfigure_path(df, columns_to_show_selection):
 
     pathway_name = selected_mix
     # Load corresponding df_upload based on scenario
-    if selected_mix in ["EU-MIX-2018", "EU-MIX-2030", "EU-MIX-2040", "EU-MIX-2050"]:
+    if selected_mix in EU_MIX_PATHWAYS:
         df_upload = eu_mix_configuration_id_weight(pathway_name)
     else:
         file_mapping = {
@@ -244,20 +291,17 @@ def preconfigure_path(df, columns_to_show_selection):
     # Edit pathway UI
     if st.checkbox("Edit pathway"):
         dict_routes_selected, modified = _edit_pathway_ui(df, df_upload, unique_sectors, columns_to_show_selection)
+    elif selected_mix in EU_MIX_PATHWAYS:
+        # Default: the EU-mix pathways are built once for all years
+        dict_routes_selected = dict(eu_mix_pathway(selected_mix))
     else:
         # Default: pre-fill with df_upload
-        for sector in unique_sectors:
-            all_products = sorted(df[df["sector_name"] == sector]["product_name"].unique())
-            for product in all_products:
-                df_product = df[(df["sector_name"] == sector) & (df["product_name"] == product)].copy()
-                df_product["selected"] = df_product["route_name"].isin(df_upload["route_name"])
-                df_upload_map = df_upload.set_index("route_name")["route_weight"].to_dict()
-                df_product["route_weight"] = df_product["route_name"].map(df_upload_map).fillna(0)
-                total_weight = df_product["route_weight"].sum()
-                if 99.95 <= total_weight <= 100.05 or total_weight == 0:
-                    dict_routes_selected[f"{sector}_{product}"] = df_product
-                else:
-                    st.warning(f"Sum of weights should be ~100%, not {total_weight:.2f}")
+        for key, df_product in premade_routes(df, df_upload).items():
+            total_weight = df_product["route_weight"].sum()
+            if valid_weight_total(total_weight):
+                dict_routes_selected[key] = df_product
+            else:
+                st.warning(f"Sum of weights should be ~100%, not {total_weight:.2f}")
 
     if modified:
         pathway_name += " modified"
@@ -273,7 +317,7 @@ def create_path(df, columns_to_show_selection):
     """
     dict_routes_selected = {}
     pathway_name = "Pathway 1"
-    df = st.session_state.df_perton_ALL_sector
+    df = get_perton_sector_table()
 
     dict_routes_selected, _ = _edit_pathway_ui(df, None, sorted(df["sector_name"].unique()), columns_to_show_selection, mode="custom")
 
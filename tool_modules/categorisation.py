@@ -1,66 +1,127 @@
 import pandas as pd
+import numpy as np
 import re
 
+# Columns added by the categorisation
+CATEGORY_COLUMNS = ["energy_feedstock", "technology_category", "hydrogen_source"]
 
-def process_configuration_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    def extract_outermost_parentheses(s):
-        stack = []
-        start = None
-        for i, char in enumerate(s):
-            if char == "(":
-                if not stack:
-                    start = i
-                stack.append(char)
-            elif char == ")":
-                stack.pop()
-                if not stack:
-                    return s[start: i + 1]
-        return None
-
-    def extract_fuel(config):
-        if not isinstance(config, str):
-            return "-"
-        if "((" in config:
-            return extract_outermost_parentheses(config)
-        if ")" in config:
-            match = re.search(r"\((.*?)\)", config)
-            if match:
-                extracted = match.group(1)
-            else:
-                extracted = None
-            return f"({extracted})" if extracted else "-"
-        return "-"
-
-    # Extract fuel
-    df["energy_feedstock"] = df["configuration_name"].apply(extract_fuel)
+
+def _balanced_parentheses(depth):
+    """Regex of a parenthesised group nested at most depth levels."""
+    pattern = r"\([^()]*\)"
+    for _ in range(depth - 1):
+        pattern = r"\((?:[^()]|" + pattern + r")*\)"
+    return pattern
+
+
+# Outermost group of names such as '((BM+H2)MeOH)O'; deeper names use the parser
+_OUTERMOST_GROUP = re.compile(r"^[^()]*(" + _balanced_parentheses(5) + ")")
+
+
+def _extract_outermost_parentheses(s):
+    stack = []
+    start = None
+    for i, char in enumerate(s):
+        if char == "(":
+            if not stack:
+                start = i
+            stack.append(char)
+        elif char == ")":
+            stack.pop()
+            if not stack:
+                return s[start: i + 1]
+    return None
+
+
+def _energy_feedstock(names):
+    feedstock = pd.Series("-", index=names.index, dtype=object)
+    names = names[names.map(lambda name: isinstance(name, str)).astype(bool)]
+
+    # Nested names: the first outermost parenthesised group
+    nested = names.str.contains("((", regex=False)
+    outermost = names[nested].str.extract(_OUTERMOST_GROUP, expand=False)
+    unmatched = outermost.isna()
+    if unmatched.any():
+        outermost[unmatched] = names[nested][unmatched].map(_extract_outermost_parentheses)
+    feedstock[outermost.index] = outermost.where(outermost.notna(), None)
+
+    # Other names: the first parenthesised group, if not empty
+    simple = names[~nested & names.str.contains(")", regex=False)]
+    inner = simple.str.extract(r"\((.*?)\)", expand=False)
+    found = inner.notna() & (inner != "")
+    feedstock[inner.index[found]] = "(" + inner[found] + ")"
+    return feedstock
+
+
+def categorise_configurations(names):
+    """
+    Energy feedstock, technology category and hydrogen source of
+    configuration names, in one vectorised pass.
+
+    Parameters:
+        names (pd.Series): Configuration (route) names.
+
+    Returns:
+        pd.DataFrame: CATEGORY_COLUMNS, aligned to names.
+    """
+    index = names.index
+    names = names.reset_index(drop=True)
 
     # Technology category logic
     ccs_keywords = ["MEA", "DEA", "-MEA", "-DEA", "CC"]
-    df["technology_category"] = "-"
-    df.loc[
-        df["configuration_name"].str.contains(
-            "|".join(ccs_keywords), case=False, na=False
-        ),
-        "technology_category",
-    ] = "CCS"
-
-    # Hydrogen source logic
-    df["hydrogen_source"] = "-"
-    df.loc[
-        df["configuration_name"].str.contains("AEL", case=False, na=False),
-        "hydrogen_source",
-    ] = "alkaline electrolyser"
+    ccs = names.str.contains("|".join(ccs_keywords), case=False, na=False)
 
     # Electrification logic
     electrification_keywords = ["EAF", r"\bEL\b", "MOE"]
-    for keyword in electrification_keywords:
-        mask = df["configuration_name"].str.contains(
-            keyword, case=False, na=False, regex=True
-        )
-        df.loc[
-            mask & ~df["technology_category"].str.contains(
-                "Electrification", na=False),
-            "technology_category",
-        ] += " Electrification"
+    electrification = names.str.contains(
+        "|".join(electrification_keywords), case=False, na=False, regex=True)
+
+    technology_category = pd.Series(np.where(ccs, "CCS", "-"), dtype=object)
+    technology_category[electrification] += " Electrification"
+
+    # Hydrogen source logic
+    hydrogen_source = pd.Series(
+        np.where(names.str.contains("AEL", case=False, na=False), "alkaline electrolyser", "-"),
+        dtype=object)
+
+    categories = pd.DataFrame({
+        "energy_feedstock": _energy_feedstock(names),
+        "technology_category": technology_category,
+        "hydrogen_source": hydrogen_source,
+    })
+    categories.index = index
+    return categories
+
 
+def build_configuration_categories(perton_all):
+    """
+    Categorisation of every AIDRES configuration (one row per
+    configuration_id), computed once at ingest.
+    """
+    configurations = perton_all.groupby("configuration_id").first().reset_index()
+    categories = categorise_configurations(configurations["configuration_name"])
+    categories.insert(0, "configuration_id", configurations["configuration_id"])
+    return categories
+
+
+def join_categories(df):
+    """
+    Add the categorisation of AIDRES configurations to a table with a
+    configuration_id column, from the precomputed table.
+    """
+    from tool_modules.reference_store import get_reference
+
+    categories = get_reference("configuration_categories")
+    return df.drop(columns=CATEGORY_COLUMNS, errors="ignore").join(categories, on="configuration_id")
+
+
+def process_configuration_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Categorise the routes of df from their configuration_name (e.g. custom
+    uploaded routes); AIDRES configurations are categorised at ingest (see
+    join_categories).
+    """
+    categories = categorise_configurations(df["configuration_name"])
+    for column in CATEGORY_COLUMNS:
+        df[column] = categories[column].to_numpy()
     return df
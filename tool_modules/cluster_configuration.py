@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
+from tool_modules.builder_functions import get_perton_sector_table
 
 
 # Existing dictionary
@@ -106,7 +107,8 @@ def _cluster_product_selection():
 
     for i, sector in enumerate(selected_sectors):
         with tabs[i]:
-            all_products = list(st.session_state.df_perton_ALL_sector[st.session_state.df_perton_ALL_sector["sector_name"] == sector]["product_name"].unique())
+            df_perton_ALL_sector = get_perton_sector_table()
+            all_products = list(df_perton_ALL_sector[df_perton_ALL_sector["sector_name"] == sector]["product_name"].unique())
             for product in all_products:
 
                 with st.expander(f"{product}", expanded=False):
@@ -181,7 +183,8 @@ def upload_cluster():
             for i, sector in enumerate(sectors_list_plus_other):
                 with tabs[i]:
                     dict_product_by_sector=st.session_state["dict_product_by_sector"]
-                    all_products = list(st.session_state.df_perton_ALL_sector[st.session_state.df_perton_ALL_sector["sector_name"] == sector]["product_name"].unique())
+                    df_perton_ALL_sector = get_perton_sector_table()
+                    all_products = list(df_perton_ALL_sector[df_perton_ALL_sector["sector_name"] == sector]["product_name"].unique())
 
                     for product in all_products:
                         with st.expander(f"{product}", expanded=False):
@@ -8,6 +8,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 
 from tool_modules.graph_output import *
+from tool_modules.pathway_engine import pathway_intensities
 type_ener_feed = ["electricity_[mwh/t]",
                   "electricity_[gj/t]",
                   "alternative_fuel_mixture_[gj/t]",
@@ -285,30 +286,7 @@ def _get_df_prod_x_perton_cluster(pathway, sector_utilization, selected_columns,
     df["prod_rate"] = np.where(condition, prod_rate_calc, df["prod_cap"])
 
     # Prepare weighted pathway data
-    df_pathway_weighted = pd.DataFrame()
-    df_path = pd.concat(perton.values(), ignore_index=True)
-
-    for sector_product in perton.keys():
-        product = sector_product.split("_")[-1]
-        sector = sector_product.split("_")[0]
-
-        df_filtered = df_path[df_path["product_name"] == product]
-        if df_filtered.empty:
-            continue
-
-        def weighted_avg(df_, value_cols, weight_col):
-            return pd.Series({
-                col: np.average(df_[col], weights=df_[weight_col]) for col in value_cols
-            })
-
-        df_filtered_weight = df_filtered.groupby("product_name").apply(
-            weighted_avg, value_cols=selected_columns, weight_col="route_weight"
-        ).reset_index()
-
-        df_filtered_weight["sector_name"] = sector
-        df_pathway_weighted = pd.concat(
-            [df_pathway_weighted, df_filtered_weight], ignore_index=True
-        )
+    df_pathway_weighted = pathway_intensities(perton, selected_columns)
     # Merge once with suffixes to avoid duplicates
     df_prod_x_perton = df.merge(
         df_pathway_weighted,
@@ -1,26 +1,40 @@
-from sklearn.cluster import KMeans
 import os
-import io
 import math
-import base64
-from io import BytesIO
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import matplotlib.pyplot as plt
 import streamlit as st
-import pydeck as pdk
-import plotly.express as px
-import plotly.graph_objects as go
-from PIL import Image, ImageDraw
-from shapely import wkt, wkb
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
 from shapely.geometry import MultiPoint
-from sklearn.cluster import DBSCAN, KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.neighbors import BallTree
 from sklearn.preprocessing import StandardScaler
 
-from geopy.distance import geodesic
-from tool_modules.convert import *
+from tool_modules.ingest import CACHE_DIR, unique_tmp_path
+from tool_modules.memo import LRUCache, memoized, stable_hash
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+# Largest "Distance between sites (km)" of the maps page; neighbour graphs reach it
+MAX_RADIUS_KM = 100
+
+# Cluster labels of site sets, also kept on disk across server restarts
+LABELS_CACHE_DIR = os.path.join(CACHE_DIR, "clusters")
+# Part of the labels key; change it when a method gives other labels
+LABELS_VERSION = 3
+# Size of LABELS_CACHE_DIR above which the least recently used files are removed
+LABELS_CACHE_MAX_BYTES = 256 * 2**20
+
+# "Number of clusters" of the maps page, fitted ahead by KMeansSweep
+KMEANS_RANGE = range(1, 201)
+# Sweeps of larger row sets use MiniBatchKMeans
+MINIBATCH_ROWS = 10_000
 
 
 type_ener_feed = ["electricity_[mwh/t]",
@@ -74,16 +88,395 @@ color_map.update({
 })
 
 
-def kmeans_threshold(gdf, n_clusters, value_type, redistribute) -> gpd.GeoDataFrame:
+_labels_cache = LRUCache("cluster labels", maxsize=64)
+
+
+def _read_labels(path):
+    try:
+        labels = np.load(path, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)  # Recently used, see _prune_labels
+    except OSError:
+        pass
+    return labels
+
+
+def _write_labels(path, labels):
+    try:
+        os.makedirs(LABELS_CACHE_DIR, exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees half a file
+        tmp_path = unique_tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.save(f, labels)
+        os.replace(tmp_path, path)
+    except OSError:
+        return  # e.g. a read-only deployment: the labels stay cached in memory
+    _prune_labels()
+
+
+def _prune_labels(max_bytes=LABELS_CACHE_MAX_BYTES):
+    """Remove the least recently used label files above max_bytes."""
+    files = []
+    try:
+        with os.scandir(LABELS_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".npy"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue  # e.g. removed by another process meanwhile
+        total -= size
+
+
+def _labels_key(method, params, site_ids, coords, weights=None):
+    """
+    Row order (by site id, then weight) and cache key of a set of rows.
+
+    The key holds the coordinates, so labels of sites that moved (e.g. a
+    new AIDRES release) are not reused.
+    """
+    site_ids = np.asarray(site_ids)
+    coords = np.asarray(coords, dtype=float)
+    if weights is None:
+        order = np.argsort(site_ids, kind="stable")
+        return order, stable_hash(LABELS_VERSION, method, params, site_ids[order], coords[order])
+    order = np.lexsort((weights, site_ids))
+    return order, stable_hash(
+        LABELS_VERSION, method, params, site_ids[order], coords[order], weights[order])
+
+
+def _get_labels(key, n_rows):
+    """Cached labels of key (memory, then disk), or None."""
+    labels = _labels_cache.get(key)
+    if labels is None:
+        path = os.path.join(LABELS_CACHE_DIR, f"{key}.npy")
+        labels = _read_labels(path) if os.path.exists(path) else None
+        if labels is None or len(labels) != n_rows:
+            return None
+        _labels_cache.put(key, labels)
+    return labels
+
+
+def _put_labels(key, labels):
+    _labels_cache.put(key, labels)
+    _write_labels(os.path.join(LABELS_CACHE_DIR, f"{key}.npy"), labels)
+
+
+def _unsort(order, labels):
+    """
+    Labels of the sorted rows back in row order, with clusters numbered by
+    their first seed row as a fit on the rows in that order numbers them.
+
+    Seed rows have a label >= 0 (-1 for noise). labels may have more columns
+    (see NeighbourGraph.cluster_candidates): rows of DBSCAN border sites
+    then hold -2 - label of each cluster they can join, and join the one
+    numbered first.
+    """
+    labels = np.asarray(labels)
+    if labels.ndim == 1:
+        labels = labels[:, None]
+    row_labels = np.empty(labels.shape, dtype=np.int64)
+    row_labels[order] = labels
+    clusters = np.where(row_labels <= -2, -2 - row_labels, row_labels)
+
+    seed_rows = np.flatnonzero(row_labels[:, 0] >= 0)
+    if len(seed_rows) == 0:
+        return np.full(len(row_labels), -1, dtype=np.int64)
+    seed_clusters, first_seed = np.unique(row_labels[seed_rows, 0], return_index=True)
+    renumber = np.full(clusters.max() + 1, len(row_labels), dtype=np.int64)
+    renumber[seed_clusters[np.argsort(first_seed)]] = np.arange(len(seed_clusters))
+    ranks = np.where(clusters >= 0, renumber[np.maximum(clusters, 0)], len(row_labels)).min(axis=1)
+    return np.where(ranks < len(row_labels), ranks, -1)
+
+
+def site_labels(method, params, site_ids, coords, fit, weights=None):
+    """
+    Cluster label of each row, computed once per method, parameters and
+    site set (ids and coordinates), and kept in memory and on disk
+    (LABELS_CACHE_DIR, pruned to LABELS_CACHE_MAX_BYTES).
+
+    Rows are clustered sorted by site id (then weight), so the cached
+    labels only depend on the sites and their weights, not on the pathway
+    or the row order they come from; clusters are then numbered in row
+    order (see _unsort).
+
+    Parameters:
+    method (str): Clustering method, part of the key.
+    params (tuple): Method parameters, part of the key.
+    site_ids (array-like): aidres_site_id of each row.
+    coords (np.ndarray): Coordinates of each row, as fit expects them.
+    fit (callable): fit(coords, weights) -> labels (or label candidates, see
+        _unsort), for rows in the given order.
+    weights (np.ndarray, optional): Sample weights, part of the key.
+
+    Returns:
+    np.ndarray: Label of each row.
+    """
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+    order, key = _labels_key(method, params, site_ids, coords, weights)
+
+    labels = _get_labels(key, len(order))
+    if labels is None:
+        labels = np.asarray(fit(coords[order], None if weights is None else weights[order]))
+        _put_labels(key, labels)
+    return _unsort(order, labels)
+
+
+def _kmeans_fit(n_clusters):
+    """KMeans on standardised lat/lon, as fit of site_labels."""
+    def fit(coords, weights):
+        coords_scaled = StandardScaler().fit_transform(coords)
+        kmeans = KMeans(n_clusters=n_clusters, random_state=0)
+        return kmeans.fit(coords_scaled, sample_weight=weights).labels_
+    return fit
+
+
+class KMeansSweep:
+    """
+    KMeans labels of every number of clusters of KMEANS_RANGE for one set
+    of rows, fitted in a background thread.
+
+    Each k starts from the centroids of k - 1 plus the row farthest from
+    them, so the whole range costs a few full fits. Above MINIBATCH_ROWS
+    rows MiniBatchKMeans is used. Labels are kept as one small-integer
+    array per k, and written to LABELS_CACHE_DIR once all are fitted.
+    A fit that raises stops the sweep and is kept in failed.
+    """
+
+    def __init__(self, key, coords, weights=None):
+        self.key = key
+        self.coords_scaled = StandardScaler().fit_transform(coords)
+        self.weights = weights
+        self.ks = np.array([k for k in KMEANS_RANGE if k <= len(coords)])
+        dtype = np.uint8 if len(self.ks) == 0 or self.ks[-1] <= 256 else np.int32
+        self.path = os.path.join(LABELS_CACHE_DIR, f"{key}.npy")
+
+        labels = _read_labels(self.path) if os.path.exists(self.path) else None
+        if labels is not None and labels.shape == (len(self.ks), len(coords)):
+            self.labels = labels
+            self.done = np.ones(len(self.ks), dtype=bool)
+        else:
+            self.labels = np.zeros((len(self.ks), len(coords)), dtype=dtype)
+            self.done = np.zeros(len(self.ks), dtype=bool)
+        self.failed = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None and not self.done.all():
+                self._thread = threading.Thread(
+                    target=self._run, name="res2go-kmeans-sweep", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            self._fit_range()
+        except Exception as error:
+            self.failed = error
+            logger.warning("KMeans sweep %s stopped: %s", self.key, error)
+            return
+        _write_labels(self.path, self.labels)
+
+    def _fit_range(self):
+        X, weights = self.coords_scaled, self.weights
+        minibatch = len(X) > MINIBATCH_ROWS
+        model = None
+        for i, k in enumerate(self.ks):
+            if model is None:
+                init = "k-means++"
+            else:
+                # Row farthest from its centroid (weighted)
+                centers = model.cluster_centers_
+                gap = ((X - centers[model.labels_]) ** 2).sum(axis=1)
+                if weights is not None:
+                    gap = gap * weights
+                init = np.vstack([centers, X[np.argmax(gap)]])
+            if minibatch:
+                model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, random_state=0)
+            else:
+                model = KMeans(n_clusters=k, init=init, n_init=1, random_state=0)
+            model.fit(X, sample_weight=weights)
+            self.labels[i] = model.labels_
+            self.done[i] = True
+
+    def nearest(self, n_clusters):
+        """
+        (k, labels) of the fitted k nearest to n_clusters, or (None, None)
+        when none is fitted yet.
+        """
+        fitted = np.flatnonzero(self.done)
+        if len(fitted) == 0:
+            return None, None
+        i = fitted[np.argmin(np.abs(self.ks[fitted] - n_clusters))]
+        return int(self.ks[i]), self.labels[i]
+
+
+_kmeans_sweeps = LRUCache("KMeans sweeps", maxsize=8)
+_kmeans_sweeps_lock = threading.Lock()
+
+# Exact fits of the numbers of clusters answered from a sweep, one at a time
+_exact_fits = ThreadPoolExecutor(max_workers=1, thread_name_prefix="res2go-kmeans-exact")
+_exact_fits_pending = set()
+_exact_fits_lock = threading.Lock()
+
+
+def _fit_exact_later(key, n_clusters, coords, weights):
+    """Fit n_clusters exactly in the background and cache the labels under key."""
+    with _exact_fits_lock:
+        if key in _exact_fits_pending:
+            return
+        _exact_fits_pending.add(key)
+
+    def run():
+        try:
+            if _get_labels(key, len(coords)) is None:
+                _put_labels(key, np.asarray(_kmeans_fit(n_clusters)(coords, weights)))
+        except Exception as error:
+            logger.warning("Exact KMeans fit of %d clusters failed: %s", n_clusters, error)
+        finally:
+            with _exact_fits_lock:
+                _exact_fits_pending.discard(key)
+
+    _exact_fits.submit(run)
+
+
+def kmeans_labels(method, n_clusters, site_ids, coords, weights=None, sweep=False):
+    """
+    KMeans labels of each row (see site_labels), and the number of
+    clusters they have.
+
+    With sweep, every k of KMEANS_RANGE is also fitted in the background
+    for these rows (KMeansSweep). Until n_clusters is cached, the labels
+    of the nearest k fitted by the sweep are returned instead, so a slider
+    move does not wait for a fit, and n_clusters is fitted exactly in the
+    background. Sweep labels are warm-started, so they are only shown
+    meanwhile: the cached labels are always the exact fit, as without
+    sweep. Once a sweep has failed, n_clusters is fitted exactly at once.
+
+    Returns:
+    (np.ndarray, int, bool): Label of each row, their number of clusters
+    and whether they are the exact fit of n_clusters.
+    """
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+    order, key = _labels_key(method, (n_clusters,), site_ids, coords, weights)
+    labels = _get_labels(key, len(order))
+    if labels is not None:
+        return _unsort(order, labels), n_clusters, True
+
+    sorted_weights = None if weights is None else weights[order]
+    kmeans_sweep = None
+    if sweep:
+        sweep_key = _labels_key(f"{method} sweep", (), site_ids, coords, weights)[1]
+        with _kmeans_sweeps_lock:
+            kmeans_sweep = _kmeans_sweeps.get(sweep_key)
+            if kmeans_sweep is None:
+                kmeans_sweep = KMeansSweep(sweep_key, coords[order], sorted_weights)
+                _kmeans_sweeps.put(sweep_key, kmeans_sweep)
+        if kmeans_sweep.failed is None:
+            k, labels = kmeans_sweep.nearest(n_clusters)
+            if labels is not None:
+                _fit_exact_later(key, n_clusters, coords[order], sorted_weights)
+                return _unsort(order, labels), k, False
+
+    labels = np.asarray(_kmeans_fit(n_clusters)(coords[order], sorted_weights))
+    _put_labels(key, labels)
+    if kmeans_sweep is not None:
+        # Started after the first fit, which the page is waiting for
+        kmeans_sweep.start()
+    return _unsort(order, labels), n_clusters, True
+
+
+def _show_nearest_k(n_clusters, k, exact):
+    if k != n_clusters:
+        st.caption(f"Showing {k} clusters while {n_clusters} clusters are computed.")
+    elif not exact:
+        st.caption(f"Showing an approximate fit of {n_clusters} clusters while the exact one is computed.")
+
+
+def nearest_centroids(coords, centroids, values=None, loads=None, capacity=None):
+    """
+    Nearest centroid (great-circle distance) of each point, from a
+    haversine BallTree of the centroids.
+
+    With a capacity, points are placed in rounds: each point still unplaced
+    is offered its nearest open centroid, and each centroid takes its
+    closest points while its total stays within capacity. A centroid that
+    refuses a point is closed for the next rounds. Memory stays in
+    O(points + centroids).
+
+    Parameters:
+    coords (np.ndarray): (lat, lon) of the points, in degrees.
+    centroids (np.ndarray): (lat, lon) of the centroids, in degrees.
+    values (np.ndarray, optional): Value of each point (with capacity).
+    loads (np.ndarray, optional): Current total of each centroid (with capacity).
+    capacity (float, optional): Maximum total per centroid.
+
+    Returns:
+    np.ndarray: Centroid index of each point (-1 if no centroid can take it).
+    """
+    points = np.radians(coords)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if capacity is None:
+        tree = BallTree(np.radians(centroids), metric="haversine")
+        return tree.query(points, k=1, return_distance=False)[:, 0]
+
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    loads = np.zeros(len(centroids)) if loads is None else np.asarray(loads, dtype=float).copy()
+    assignment = np.full(len(points), -1)
+    pending = np.arange(len(points))
+    open_centroids = np.flatnonzero(loads < capacity)
+    while len(pending) and len(open_centroids):
+        tree = BallTree(np.radians(centroids[open_centroids]), metric="haversine")
+        distance, nearest = tree.query(points[pending], k=1)
+        candidate = open_centroids[nearest[:, 0]]
+
+        # Closest points first, per centroid
+        order = np.lexsort((distance[:, 0], candidate))
+        candidate, point_values = candidate[order], values[pending[order]]
+        first = np.r_[True, candidate[1:] != candidate[:-1]]
+        total = np.cumsum(point_values)
+        group_total = total - (total - point_values)[first][np.cumsum(first) - 1]
+        fits = loads[candidate] + group_total <= capacity
+
+        assignment[pending[order[fits]]] = candidate[fits]
+        loads += np.bincount(candidate[fits], point_values[fits], minlength=len(loads))
+        open_centroids = np.setdiff1d(open_centroids, candidate[~fits])
+        pending = pending[order[~fits]]
+    return assignment
+
+
+def kmeans_threshold(gdf, n_clusters, value_type, redistribute, threshold=None,
+                     sweep=False, capacity=None) -> gpd.GeoDataFrame:
     """
     Perform KMeans clustering on a GeoDataFrame using lat/lon coordinates,
     then only retain clusters whose total value (energy or emissions) exceeds the threshold.
-    Optionally redistributes points from undersized clusters to closest valid cluster.
+    Optionally redistributes points from undersized clusters to closest valid cluster
+    (great-circle distance to the cluster centroids), within a capacity.
 
     Parameters:
     gdf (GeoDataFrame): Input GeoDataFrame with Point geometries.
     value_type (str): "Energy" or "Emissions".
-    threshold (float): Minimum total value per cluster (in GJ or ktCO₂).
+    redistribute (str): "Yes" to reassign the points of undersized clusters.
+    threshold (float, optional): Minimum total value per cluster (in GJ or t);
+        chosen with a slider when not given.
+    sweep (bool): Fit the other numbers of clusters in the background (see kmeans_labels).
+    capacity (float, optional): Maximum total value of a cluster after the
+        redistribution, 0 for no limit (see nearest_centroids); chosen with
+        an input when not given.
 
     Returns:
     GeoDataFrame: GeoDataFrame with a new 'cluster' column.
@@ -105,11 +498,11 @@ def kmeans_threshold(gdf, n_clusters, value_type, redistribute) -> gpd.GeoDataFr
     gdf['lat'] = gdf.geometry.y
 
     coords = gdf[['lat', 'lon']].to_numpy()
-    coords_scaled = StandardScaler().fit_transform(coords)
 
-    # KMeans clustering
-    kmeans = KMeans(n_clusters, random_state=0, n_init="auto")
-    gdf['kmeans_label'] = kmeans.fit_predict(coords_scaled)
+    # KMeans clustering (the labels of KMEANS)
+    labels, k, exact = kmeans_labels("KMEANS", n_clusters, gdf["aidres_site_id"], coords, sweep=sweep)
+    _show_nearest_k(n_clusters, k, exact)
+    gdf['kmeans_label'] = labels
     # Cluster value totals
     cluster_totals = gdf.groupby("kmeans_label")[value_col].sum()
     # Step 1: Get raw min/max values from cluster totals
@@ -129,13 +522,16 @@ def kmeans_threshold(gdf, n_clusters, value_type, redistribute) -> gpd.GeoDataFr
     max_val_rounded = math.ceil(max_val)
 
     # Step 4: Use slider directly in converted units
-    limit_converted = st.slider(
-        f"{value_type} threshold ({base_unit})",
-        min_value=min_val_rounded,
-        max_value=max_val_rounded - 1,
-        value=min_val_rounded,
-        step=1
-    )
+    if threshold is None:
+        limit_converted = st.slider(
+            f"{value_type} threshold ({base_unit})",
+            min_value=min_val_rounded,
+            max_value=max_val_rounded - 1,
+            value=min_val_rounded,
+            step=1
+        )
+    else:
+        limit_converted = threshold
 
     # Step 6: Filter valid clusters
     valid_clusters = cluster_totals[cluster_totals >=
@@ -155,44 +551,313 @@ def kmeans_threshold(gdf, n_clusters, value_type, redistribute) -> gpd.GeoDataFr
             .to_numpy()
         )
 
+        if capacity is None:
+            capacity = st.number_input(
+                f"Maximum {value_type.lower()} per cluster ({base_unit}), 0 for no limit",
+                min_value=0, value=0, step=1)
+
         mask_unassigned = gdf['cluster'] == -1
         unassigned_coords = gdf.loc[mask_unassigned, ["lat", "lon"]].to_numpy()
 
-        dist_matrix = np.linalg.norm(
-            unassigned_coords[:, None, :] - valid_centroids[None, :, :],
-            axis=2
-        )
-
-        nearest = dist_matrix.argmin(axis=1)
-        gdf.loc[mask_unassigned, 'cluster'] = valid_clusters[nearest]
+        nearest = nearest_centroids(
+            unassigned_coords, valid_centroids,
+            values=gdf.loc[mask_unassigned, value_col].to_numpy(),
+            loads=cluster_totals[valid_clusters].to_numpy(),
+            capacity=capacity or None)
+        gdf.loc[mask_unassigned, 'cluster'] = np.where(
+            nearest >= 0, valid_clusters[np.maximum(nearest, 0)], -1)
 
     return gdf.drop(columns=["kmeans_label"])
 
 
+class NeighbourGraph:
+    """
+    Haversine neighbours of a set of sites up to max_radius (km), from which
+    the DBSCAN labels of any min_samples and radius <= max_radius are
+    derived without a new neighbour search.
+
+    Neighbours are stored as a sparse row per site (the site included),
+    sorted by great-circle distance in radians. For each min_samples, the
+    minimum spanning forest of the mutual reachability distances
+    max(d(i, j), core distance of i, core distance of j) is kept: the core
+    sites within radius of each other are connected exactly by its edges
+    not longer than radius, so a radius change only takes a prefix of them.
+    """
+
+    def __init__(self, coords_rad, max_radius=MAX_RADIUS_KM):
+        self.max_radius = max_radius
+        self.n_sites = len(coords_rad)
+        self._forests = {}
+        self._tree = None
+        if self.n_sites == 0:
+            self.indptr = np.zeros(1, dtype=np.int64)
+            self.indices = np.zeros(0, dtype=np.int32)
+            self.distances = np.zeros(0)
+            self.rows = np.zeros(0, dtype=np.int32)
+            return
+
+        tree = BallTree(coords_rad, metric="haversine")
+        neighbours, distances = tree.query_radius(
+            coords_rad, r=max_radius / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+        counts = np.fromiter((len(row) for row in neighbours), dtype=np.int64, count=self.n_sites)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.indices = np.concatenate(neighbours).astype(np.int32)
+        self.distances = np.concatenate(distances)
+        self.rows = np.repeat(np.arange(self.n_sites, dtype=np.int32), counts)
+
+    def _nearest(self, k):
+        """Positions of the k nearest neighbours of each site, and which exist."""
+        position = self.indptr[:-1, None] + np.arange(k)
+        found = position < self.indptr[1:, None]
+        return np.minimum(position, len(self.indices) - 1), found
+
+    def core_distances(self, min_samples):
+        """
+        Distance (radians) of each site to its min_samples-th nearest site,
+        itself first; inf if beyond max_radius.
+        """
+        position, found = self._nearest(min_samples)
+        return np.where(found[:, -1], self.distances[position[:, -1]], np.inf)
+
+    def _forest(self, min_samples):
+        """Core distances and the spanning forest edges (i, j, weight), by weight."""
+        if min_samples not in self._forests:
+            core_distance = self.core_distances(min_samples)
+            upper = self.indices > self.rows
+            i, j = self.rows[upper], self.indices[upper]
+            weight = np.maximum(self.distances[upper],
+                                np.maximum(core_distance[i], core_distance[j]))
+            finite = np.isfinite(weight)
+            i, j, weight = i[finite], j[finite], weight[finite]
+
+            # Ranks as weights keep the exact order, and no weight is 0 (a
+            # missing edge for scipy)
+            order = np.argsort(weight, kind="stable")
+            rank = np.empty(len(weight))
+            rank[order] = np.arange(1, len(weight) + 1)
+            forest = minimum_spanning_tree(
+                csr_matrix((rank, (i, j)), shape=(self.n_sites, self.n_sites))).tocoo()
+            edges = np.argsort(forest.data)
+            self._forests[min_samples] = (
+                core_distance, forest.row[edges], forest.col[edges],
+                weight[order][forest.data[edges].astype(np.int64) - 1])
+        return self._forests[min_samples]
+
+    def labels(self, min_samples, radius):
+        """
+        DBSCAN labels (-1 for noise), as sklearn's DBSCAN with the haversine
+        metric gives them.
+
+        Core sites have at least min_samples sites (themselves included)
+        within radius; clusters are the connected core sites, numbered by
+        their first site, and border sites join the first cluster among
+        their core neighbours.
+        """
+        if radius > self.max_radius:
+            raise ValueError(f"radius {radius} km is beyond the graph ({self.max_radius} km)")
+        labels = np.full(self.n_sites, -1, dtype=np.int64)
+        if self.n_sites == 0:
+            return labels
+
+        eps = radius / EARTH_RADIUS_KM
+        core_distance, rows, cols, weights = self._forest(min_samples)
+        core = core_distance <= eps
+        if not core.any():
+            return labels
+
+        # Connected core sites
+        n_edges = np.searchsorted(weights, eps, side="right")
+        graph = csr_matrix(
+            (np.ones(n_edges, dtype=np.int8), (rows[:n_edges], cols[:n_edges])),
+            shape=(self.n_sites, self.n_sites))
+        _, component = connected_components(graph, directed=False)
+        core_sites = np.flatnonzero(core)
+        _, first_site, cluster = np.unique(
+            component[core_sites], return_index=True, return_inverse=True)
+        # Number clusters by their first core site
+        order = np.argsort(first_site)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        labels[core_sites] = rank[cluster.ravel()]
+
+        # Border sites have fewer than min_samples sites within radius, so
+        # these are among their min_samples nearest
+        position, found = self._nearest(min_samples)
+        neighbour = self.indices[position]
+        near = found & (self.distances[position] <= eps) & core[neighbour] & ~core[:, None]
+        border = np.where(near, labels[neighbour], self.n_sites).min(axis=1)
+        is_border = border < self.n_sites
+        labels[is_border] = border[is_border]
+        return labels
+
+    def cluster_candidates(self, min_samples, radius):
+        """
+        DBSCAN labels (see labels) that can be renumbered for another site
+        order: the label of each core site (-1 for noise) in the first
+        column, and for border sites -2 - label of every cluster among their
+        core neighbours, padded with -1 (see _unsort).
+
+        Returns:
+            np.ndarray: sites x (1 to min_samples - 1) labels.
+        """
+        labels = self.labels(min_samples, radius)
+        if self.n_sites == 0:
+            return labels[:, None]
+        eps = radius / EARTH_RADIUS_KM
+        core = self.core_distances(min_samples) <= eps
+        position, found = self._nearest(min_samples)
+        neighbour = self.indices[position]
+        near = found & (self.distances[position] <= eps) & core[neighbour] & ~core[:, None]
+
+        # Each candidate cluster once per border site, padding (-1) last
+        candidates = np.sort(np.where(near, -2 - labels[neighbour], -1), axis=1)
+        candidates[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = -1
+        candidates = np.sort(candidates, axis=1)
+        is_border = near.any(axis=1)
+        candidates[~is_border, 0] = labels[~is_border]
+        width = max(1, int((candidates != -1).sum(axis=1).max()))
+        return candidates[:, :width]
+
+    def single_linkage(self, distance):
+        """
+        Single-linkage clusters cut at distance (km): sites joined by chains
+        of sites at most distance apart. Sites alone at that distance get -1.
+
+        These are the DBSCAN clusters with min_samples 2 (no site is then a
+        border site), whose spanning forest is the geodesic minimum spanning
+        tree of the sites, so the cut reuses it.
+        """
+        return self.labels(2, distance)
+
+    def single_linkage_tree(self):
+        """SingleLinkageTree of the sites, built once."""
+        if self._tree is None:
+            _, rows, cols, weights = self._forest(2)
+            self._tree = SingleLinkageTree(self.n_sites, rows, cols, weights)
+        return self._tree
+
+
+class SingleLinkageTree:
+    """
+    Merge order of the single-linkage clustering of sites: the geodesic
+    minimum spanning tree edges by length, merged with a union-find.
+
+    Nodes 0..n-1 are the sites and node n + i the cluster formed by merge
+    i. Totals of site values are accumulated per node once along the
+    merge order, so the clusters at a distance and their totals are read
+    off in O(n) (see cut and node_totals).
+    """
+
+    def __init__(self, n_sites, rows, cols, heights):
+        n_merges = len(heights)
+        self.n_sites = n_sites
+        self.heights = heights
+        self.children = np.empty((n_merges, 2), dtype=np.int64)
+        # Merge absorbing each node (n_merges if none)
+        self.parent_merge = np.full(n_sites + n_merges, n_merges, dtype=np.int64)
+        # Lowest site of each node, which numbers the clusters as single_linkage does
+        self.first_site = np.concatenate([np.arange(n_sites), np.zeros(n_merges, dtype=np.int64)])
+
+        root = list(range(n_sites))
+        node_of_root = list(range(n_sites))
+
+        def find(site):
+            while root[site] != site:
+                root[site] = root[root[site]]
+                site = root[site]
+            return site
+
+        for i, (a, b) in enumerate(zip(rows.tolist(), cols.tolist())):
+            root_a, root_b = find(a), find(b)
+            node_a, node_b = node_of_root[root_a], node_of_root[root_b]
+            self.children[i] = node_a, node_b
+            self.parent_merge[[node_a, node_b]] = i
+            self.first_site[n_sites + i] = min(self.first_site[node_a], self.first_site[node_b])
+            root[root_b] = root_a
+            node_of_root[root_a] = n_sites + i
+
+    def cut(self, distance):
+        """Nodes of the clusters (of two sites or more) at distance (km), by cluster label."""
+        n_merged = np.searchsorted(self.heights, distance / EARTH_RADIUS_KM, side="right")
+        merges = np.arange(n_merged)
+        nodes = self.n_sites + merges[self.parent_merge[self.n_sites + merges] >= n_merged]
+        return nodes[np.argsort(self.first_site[nodes])]
+
+    def node_totals(self, site_values):
+        """Totals of site values (sites x columns) for every node."""
+        site_values = np.asarray(site_values, dtype=float)
+        totals = np.zeros((self.n_sites + len(self.heights),) + site_values.shape[1:])
+        totals[:self.n_sites] = site_values
+        for i, (a, b) in enumerate(self.children):
+            totals[self.n_sites + i] = totals[a] + totals[b]
+        return totals
+
+
+_neighbour_graph_cache = LRUCache("DBSCAN neighbour graph", maxsize=8)
+
+
+def neighbour_graph(coords_rad, max_radius=MAX_RADIUS_KM):
+    """NeighbourGraph of the sites, built once per set of coordinates."""
+    coords_rad = np.ascontiguousarray(coords_rad, dtype=float)
+    return memoized(_neighbour_graph_cache, ("neighbour graph", coords_rad, max_radius),
+                    lambda: NeighbourGraph(coords_rad, max_radius))
+
+
 def cluster_gdf_dbscan(gdf, min_samples, radius):
     """
     Perform DBSCAN clustering on a GeoDataFrame using lat/lon.
 
+    Labels are cached by parameters and site set (see site_labels). The neighbours of the sites up to MAX_RADIUS_KM are searched once and
+    cached, so other min_samples / radius values only threshold them.
+
     Parameters:
     gdf (GeoDataFrame): Input GeoDataFrame with Point geometries.
     min_samples (int): Minimum number of points to form a cluster.
-    eps (float): Maximum distance between points in the same cluster (in degrees).
+    radius (float): Maximum distance between points in the same cluster (in km).
 
     Returns:
     GeoDataFrame: GeoDataFrame with an added 'cluster' column.
     """
-    # Ensure geometry is in lat/lon
-    gdf.loc[:, "lat"] = gdf.geometry.y
-    gdf.loc[:, "long"] = gdf.geometry.x
-    coords_rad = np.radians(gdf[["lat", "long"]])
-
-    db = DBSCAN(
-        eps=radius / 6371.0,  # Convert radius from km to radians
-        min_samples=min_samples,
-        metric="haversine",
-        algorithm="ball_tree",
-    ).fit(coords_rad)
-    gdf['cluster'] = db.labels_
+    # Ensure geometry is in lat/lon (new frame, gdf may be a slice)
+    gdf = gdf.assign(lat=gdf.geometry.y, long=gdf.geometry.x)
+    coords_rad = np.radians(gdf[["lat", "long"]].to_numpy())
+
+    def fit(coords_rad, _):
+        graph = neighbour_graph(coords_rad, max(MAX_RADIUS_KM, radius))
+        # Border sites are assigned once clusters are numbered in row order (see _unsort)
+        return graph.cluster_candidates(min_samples, radius)
+
+    gdf['cluster'] = site_labels(
+        "DBSCAN", (min_samples, radius), gdf["aidres_site_id"], coords_rad, fit)
+
+    return gdf
+
+
+def cluster_gdf_hierarchical(gdf, distance):
+    """
+    Perform single-linkage (hierarchical) clustering on a GeoDataFrame using lat/lon.
+
+    The geodesic minimum spanning tree of the sites is built once and
+    cached with their neighbours (see neighbour_graph), so any distance
+    up to MAX_RADIUS_KM is a cut of it. Labels are cached by distance and
+    site set (see site_labels).
+
+    Parameters:
+    gdf (GeoDataFrame): Input GeoDataFrame with Point geometries.
+    distance (float): Maximum distance between linked sites (in km).
+
+    Returns:
+    GeoDataFrame: GeoDataFrame with an added 'cluster' column.
+    """
+    gdf = gdf.assign(lat=gdf.geometry.y, long=gdf.geometry.x)
+    coords_rad = np.radians(gdf[["lat", "long"]].to_numpy())
+
+    def fit(coords_rad, _):
+        graph = neighbour_graph(coords_rad, max(MAX_RADIUS_KM, distance))
+        return graph.single_linkage(distance)
+
+    gdf['cluster'] = site_labels(
+        "HIERARCHICAL", (distance,), gdf["aidres_site_id"], coords_rad, fit)
 
     return gdf
 
@@ -254,14 +919,80 @@ def summarise_clusters_by_centroid(gdf_clustered):
     return gdf_summary
 
 
+_node_totals_cache = LRUCache("single-linkage node totals", maxsize=8)
+
+
+def summarise_single_linkage(gdf_clustered, distance):
+    """
+    summarise_clusters_by_centroid of HIERARCHICAL clusters, read off the
+    merge tree of the sites (see SingleLinkageTree).
+
+    Site totals, row counts and coordinate sums are accumulated per tree
+    node once per set of site values, so another distance on the same
+    sites only reads the nodes of its cut. gdf_clustered must hold every
+    row that was clustered (no row filtered out since).
+
+    Parameters:
+    gdf_clustered (GeoDataFrame): Output of cluster_gdf_hierarchical / run_clustering.
+    distance (float): Distance (km) of the clustering.
+
+    Returns:
+    GeoDataFrame: As summarise_clusters_by_centroid.
+    """
+    if 'cluster' not in gdf_clustered.columns:
+        raise ValueError("GeoDataFrame must contain a 'cluster' column.")
+    if not (gdf_clustered["cluster"] != -1).any():
+        return gdf_clustered
+    columns = [col for col in gdf_clustered.columns if any(
+        col.startswith(f"{feed} ") for feed in type_ener_feed) or col == "total_energy" or col == "Direct CO2 emissions (t)"]
+
+    # Sites in the order they were clustered (see site_labels)
+    site_ids = np.sort(gdf_clustered["aidres_site_id"].unique())
+    sites = gdf_clustered.drop_duplicates(subset="aidres_site_id").set_index(
+        "aidres_site_id").loc[site_ids]
+    coords_rad = np.radians(np.column_stack([sites.geometry.y, sites.geometry.x]))
+    tree = neighbour_graph(coords_rad, max(MAX_RADIUS_KM, distance)).single_linkage_tree()
+
+    # Row values summed per site: columns, row count, latitude and longitude
+    site_rows = np.searchsorted(site_ids, gdf_clustered["aidres_site_id"].to_numpy())
+    row_values = np.column_stack([
+        gdf_clustered[columns].to_numpy(dtype=float),
+        np.ones(len(gdf_clustered)),
+        gdf_clustered.geometry.y.to_numpy(),
+        gdf_clustered.geometry.x.to_numpy(),
+    ])
+
+    def compute():
+        site_values = np.zeros((len(site_ids), row_values.shape[1]))
+        np.add.at(site_values, site_rows, np.nan_to_num(row_values))
+        return tree.node_totals(site_values)
+
+    totals = memoized(_node_totals_cache, ("node totals", coords_rad, site_rows, row_values), compute)
+    nodes = tree.cut(distance)
+    # Clusters are numbered in row order (see _unsort): read each node's label off one of its sites
+    node_labels = sites["cluster"].to_numpy()[tree.first_site[nodes]]
+    order = np.argsort(node_labels)
+    cluster_totals = totals[nodes[order]]
+
+    count = cluster_totals[:, len(columns)]
+    summary = pd.DataFrame(cluster_totals[:, :len(columns)], columns=columns)
+    summary.insert(0, "cluster", node_labels[order])
+    summary["Latitude"] = cluster_totals[:, len(columns) + 1] / count
+    summary["Longitude"] = cluster_totals[:, len(columns) + 2] / count
+    return gpd.GeoDataFrame(
+        summary, geometry=gpd.points_from_xy(summary["Longitude"], summary["Latitude"]),
+        crs="EPSG:4326")
+
+
 # KMeans clustering for GeoDataFrame
-def cluster_gdf_kmeans(gdf, n_clusters=5):
+def cluster_gdf_kmeans(gdf, n_clusters=5, sweep=False):
     """
     Perform KMeans clustering on a GeoDataFrame using lat/lon.
 
     Parameters:
     gdf (GeoDataFrame): Input GeoDataFrame with Point geometries.
     n_clusters (int): The number of clusters to form.
+    sweep (bool): Fit the other numbers of clusters in the background (see kmeans_labels).
 
     Returns:
     GeoDataFrame: GeoDataFrame with an added 'cluster' column.
@@ -271,16 +1002,14 @@ def cluster_gdf_kmeans(gdf, n_clusters=5):
     gdf['lat'] = gdf.geometry.y
 
     coords = gdf[['lat', 'lon']].to_numpy()
-    scaler = StandardScaler()
-    coords_scaled = scaler.fit_transform(coords)
-
-    kmeans = KMeans(n_clusters=n_clusters, random_state=0).fit(coords_scaled)
-    gdf['cluster'] = kmeans.labels_
+    labels, k, exact = kmeans_labels("KMEANS", n_clusters, gdf["aidres_site_id"], coords, sweep=sweep)
+    _show_nearest_k(n_clusters, k, exact)
+    gdf['cluster'] = labels
 
     return gdf
 
 
-def cluster_gdf_kmeans_weight(gdf, value_type, n_clusters=5):
+def cluster_gdf_kmeans_weight(gdf, value_type, n_clusters=5, sweep=False):
     """
     Perform KMeans clustering on a GeoDataFrame using lat/lon and weighted by total_energy or emissions.
 
@@ -288,6 +1017,7 @@ def cluster_gdf_kmeans_weight(gdf, value_type, n_clusters=5):
         gdf (GeoDataFrame): Input GeoDataFrame with Point geometries and relevant columns.
         value_type (str): Either "Energy" or "Emissions".
         n_clusters (int): The number of clusters to form.
+        sweep (bool): Fit the other numbers of clusters in the background (see kmeans_labels).
 
     Returns:
         GeoDataFrame: GeoDataFrame with an added 'cluster' column.
@@ -297,8 +1027,6 @@ def cluster_gdf_kmeans_weight(gdf, value_type, n_clusters=5):
     gdf['lat'] = gdf.geometry.y
 
     coords = gdf[['lat', 'lon']].to_numpy()
-    scaler = StandardScaler()
-    coords_scaled = scaler.fit_transform(coords)
 
     # Select weight column based on value_type
     if value_type == "Energy":
@@ -327,9 +1055,70 @@ def cluster_gdf_kmeans_weight(gdf, value_type, n_clusters=5):
 
     weights_normalised = weights / max_weight
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=0)
-    kmeans.fit(coords_scaled, sample_weight=weights_normalised)
-
-    gdf['cluster'] = kmeans.labels_
+    labels, k, exact = kmeans_labels(
+        "KMEANS_WEIGHTED", n_clusters, gdf["aidres_site_id"], coords, weights_normalised, sweep)
+    _show_nearest_k(n_clusters, k, exact)
+    gdf['cluster'] = labels
 
     return gdf
+
+
+def run_clustering(choice, gdf, param1, param2, param4, threshold=None, sweep=False,
+                   capacity=None):
+    """
+    Cluster the sites of a pathway with the method chosen in the maps page.
+
+    Parameters:
+    choice (str): "DBSCAN", "HIERARCHICAL", "KMEANS", "KMEANS_WEIGHTED" or
+        "KMEANS_THRESHOLD".
+    gdf (GeoDataFrame): Sites with their demand.
+    param1, param2, param4: Method parameters, as returned by the maps page
+        (min_samples and radius (km) for DBSCAN; distance (km) for
+        HIERARCHICAL; number of clusters, value type and redistribute
+        option for KMeans).
+    threshold (float, optional): Cluster threshold of KMEANS_THRESHOLD.
+    sweep (bool): KMeans methods also fit the other numbers of clusters in
+        the background, and answer with the nearest fitted one meanwhile.
+    capacity (float, optional): Cluster capacity of the KMEANS_THRESHOLD
+        redistribution (0 for no limit).
+
+    Returns:
+    GeoDataFrame: The sites with a 'cluster' column, or the input sites when
+    no cluster was found.
+    """
+    if choice in ("DBSCAN", "HIERARCHICAL"):
+        # Sites are clustered once, whatever the number of products they make
+        gdf = gdf.copy()
+        gdf_filtered = gdf.drop_duplicates(subset="aidres_site_id")
+        if choice == "DBSCAN":
+            min_samples, radius = param1, param2
+            gdf_clustered_single = cluster_gdf_dbscan(
+                gdf_filtered, min_samples, radius)
+        else:
+            distance = param1
+            gdf_clustered_single = cluster_gdf_hierarchical(gdf_filtered, distance)
+        cluster_map = dict(
+            zip(gdf_clustered_single["aidres_site_id"], gdf_clustered_single["cluster"]))
+        gdf["cluster"] = gdf["aidres_site_id"].map(cluster_map)
+        gdf_clustered = gdf
+
+    elif choice == "KMEANS":
+        n_cluster = param1
+        gdf_clustered = cluster_gdf_kmeans(gdf, n_cluster, sweep)
+
+    elif choice == "KMEANS_WEIGHTED":
+        n_cluster, value_type = param1, param2
+        gdf_clustered = cluster_gdf_kmeans_weight(gdf, value_type, n_cluster, sweep)
+
+    elif choice == "KMEANS_THRESHOLD":
+        n_cluster, value_type, redistribute = param1, param2, param4
+        gdf_clustered = kmeans_threshold(
+            gdf, n_cluster, value_type, redistribute, threshold, sweep, capacity)
+
+    else:
+        return gdf  # fallback
+
+    if (gdf_clustered["cluster"] != -1).any():
+        return gdf_clustered
+    else:
+        return gdf
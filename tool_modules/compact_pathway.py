@@ -0,0 +1,206 @@
+import json
+import hashlib
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from tool_modules.reference_store import get_reference
+from tool_modules.perton_cube import perton_sector_table
+
+# configuration_id of routes that are not in the shared AIDRES table
+CUSTOM_ROUTE = -1
+
+
+def _same(a, b):
+    if pd.isna(a) and pd.isna(b):
+        return True
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _native(value):
+    """Python scalar of a numpy/pandas value (for JSON)."""
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _compress_routes(df, base):
+    """
+    Split a route table into AIDRES references and deltas.
+
+    Rows whose configuration_id is in the shared table are stored as that id
+    plus the values that differ from the shared row; other rows are kept in
+    full.
+    """
+    columns = list(df.columns)
+    n_rows = len(df)
+
+    ids = np.full(n_rows, CUSTOM_ROUTE, dtype=np.int64)
+    if "configuration_id" in df.columns:
+        raw_ids = pd.to_numeric(df["configuration_id"], errors="coerce").to_numpy()
+        known = ~np.isnan(raw_ids)
+        known[known] = np.isin(raw_ids[known].astype(np.int64), base.index.to_numpy())
+        ids[known] = raw_ids[known].astype(np.int64)
+
+    weights = None
+    if "route_weight" in df.columns:
+        weights = pd.to_numeric(df["route_weight"], errors="coerce").to_numpy(dtype=float)
+
+    compared = [col for col in columns if col not in ("configuration_id", "route_weight")]
+    overrides = {}
+    for pos in np.flatnonzero(ids != CUSTOM_ROUTE):
+        base_row = base.loc[ids[pos]]
+        row = df.iloc[pos]
+        changes = {
+            col: _native(row[col]) for col in compared
+            if col not in base_row.index or not _same(row[col], base_row[col])
+        }
+        if changes:
+            overrides[int(pos)] = changes
+
+    custom_positions = np.flatnonzero(ids == CUSTOM_ROUTE)
+    custom = df.iloc[custom_positions] if len(custom_positions) else None
+
+    return {
+        "columns": columns,
+        "index": df.index.to_numpy(),
+        "configuration_id": ids,
+        "route_weight": weights,
+        "overrides": overrides,
+        "custom": custom,
+    }
+
+
+class CompactPathway(Mapping):
+    """
+    A saved pathway: 'Sector_Product' key -> DataFrame of routes.
+
+    Only the configuration_id, the weight and the user-edited values of each
+    route are stored; the other columns are read from the shared AIDRES
+    route table when a key is accessed. Routes that are not in that table
+    (new sectors, uploaded routes) are kept in full. Behaves as the plain
+    dict of DataFrames it replaces.
+
+    The shared values are those of the AIDRES default table, or of one
+    scenario and horizon of the per tonne cube (see evaluated_at).
+    """
+
+    def __init__(self, entries=None, scenario=None, horizon=None):
+        self._entries = entries or {}
+        self.scenario = scenario
+        self.horizon = horizon
+        self._hash = None
+
+    @classmethod
+    def from_routes(cls, dict_routes):
+        """
+        Build a compact pathway from a dict of route DataFrames.
+
+        Parameters:
+            dict_routes (dict): 'Sector_Product' key -> DataFrame of routes.
+
+        Returns:
+            CompactPathway
+        """
+        base = get_reference("perton_sector_by_id")
+        entries = {key: _compress_routes(df, base) for key, df in dict_routes.items()}
+
+        # Keys built by the same editor share one column list
+        column_sets = {}
+        for entry in entries.values():
+            entry["columns"] = column_sets.setdefault(tuple(entry["columns"]), tuple(entry["columns"]))
+        return cls(entries)
+
+    def evaluated_at(self, scenario=None, horizon=None):
+        """
+        The same pathway resolved against one scenario and horizon
+        (None for the AIDRES default). User-edited values are kept.
+        """
+        return CompactPathway(self._entries, scenario, horizon)
+
+    def __getitem__(self, key):
+        return self._resolve(self._entries[key])
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"CompactPathway({list(self._entries)})"
+
+    def _resolve(self, entry):
+        base = perton_sector_table(self.scenario, self.horizon)
+        columns = list(entry["columns"])
+        ids = entry["configuration_id"]
+
+        df = base.reindex(ids).reset_index().reindex(columns=columns).astype(object)
+
+        custom = entry["custom"]
+        if custom is not None:
+            positions = np.flatnonzero(ids == CUSTOM_ROUTE)
+            df.iloc[positions] = custom.reindex(columns=columns).to_numpy(dtype=object)
+
+        column_pos = {col: i for i, col in enumerate(columns)}
+        for pos, changes in entry["overrides"].items():
+            for col, value in changes.items():
+                df.iat[pos, column_pos[col]] = np.nan if value is None else value
+
+        if entry["route_weight"] is not None:
+            df["route_weight"] = entry["route_weight"]
+        df.index = entry["index"]
+        return df.infer_objects()
+
+    def to_dict(self):
+        """JSON-serialisable form of the pathway."""
+        column_sets = list(dict.fromkeys(entry["columns"] for entry in self._entries.values()))
+        routes = {}
+        for key, entry in self._entries.items():
+            custom = entry["custom"]
+            routes[key] = {
+                "columns": column_sets.index(entry["columns"]),
+                "index": entry["index"].tolist(),
+                "configuration_id": entry["configuration_id"].tolist(),
+                "route_weight": None if entry["route_weight"] is None
+                else [_native(w) for w in entry["route_weight"]],
+                "overrides": {str(pos): changes for pos, changes in entry["overrides"].items()},
+                "custom": None if custom is None
+                else json.loads(custom.to_json(orient="split")),
+            }
+        return {"column_sets": [list(columns) for columns in column_sets], "routes": routes,
+                "scenario": _native(self.scenario), "horizon": _native(self.horizon)}
+
+    @classmethod
+    def from_dict(cls, serialised):
+        """Inverse of to_dict."""
+        column_sets = [tuple(columns) for columns in serialised["column_sets"]]
+        entries = {}
+        for key, entry in serialised["routes"].items():
+            custom = entry["custom"]
+            entries[key] = {
+                "columns": column_sets[entry["columns"]],
+                "index": np.asarray(entry["index"]),
+                "configuration_id": np.asarray(entry["configuration_id"], dtype=np.int64),
+                "route_weight": None if entry["route_weight"] is None
+                else np.asarray(entry["route_weight"], dtype=float),
+                "overrides": {int(pos): changes for pos, changes in entry["overrides"].items()},
+                "custom": None if custom is None
+                else pd.DataFrame(custom["data"], index=custom["index"], columns=custom["columns"]),
+            }
+        return cls(entries, serialised.get("scenario"), serialised.get("horizon"))
+
+    def content_hash(self):
+        """sha1 of the serialised pathway (the pathway is never modified)."""
+        if self._hash is None:
+            serialised = json.dumps(self.to_dict(), sort_keys=True)
+            self._hash = hashlib.sha1(serialised.encode()).hexdigest()
+        return self._hash
+
+    def memory_usage(self):
+        """Size of the serialised pathway in bytes."""
+        return len(json.dumps(self.to_dict()))
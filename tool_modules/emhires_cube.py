@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from tool_modules.ingest import CACHE_DIR, fingerprint_sources, is_fresh, write_json
+
+# EMHIRES NUTS2 capacity factor series (hourly), split over two files per technology
+EMHIRES_SOURCES = {
+    "solar": [
+        "Times series data/EMHIRES_PV_NUTS2_Filtered_2006_2011.csv",
+        "Times series data/EMHIRES_PV_NUTS2_Filtered_2011_2016.csv",
+    ],
+    "wind": [
+        "Times series data/EMHIRES_WIND_NUTS2_Filtered_2006_2011.csv",
+        "Times series data/EMHIRES_WIND_NUTS2_Filtered_2011_2016.csv",
+    ],
+}
+
+CUBE_DIR = os.path.join(CACHE_DIR, "emhires")
+
+# Leap years have 8784 hours; shorter years are padded
+HOURS_PER_YEAR = 8784
+EPOCH_PAD = np.iinfo(np.int64).min
+
+
+def _cube_paths(technology):
+    base = os.path.join(CUBE_DIR, technology)
+    return f"{base}_cf.npy", f"{base}_epoch.npy", f"{base}.json"
+
+
+def build_emhires_cube(technology, sources=None):
+    """
+    Pack the EMHIRES NUTS2 CSVs of one technology into a float32
+    year x hour x region cube and an int64 year x hour epoch index (seconds).
+
+    Parameters:
+        technology (str): 'solar' or 'wind'.
+        sources (list, optional): CSV files; defaults to EMHIRES_SOURCES.
+
+    Returns:
+        dict: Cube metadata (years, regions, sources).
+    """
+    sources = sources or EMHIRES_SOURCES[technology]
+
+    df = pd.concat([pd.read_csv(path) for path in sources], ignore_index=True)
+    df["Date"] = pd.to_datetime(
+        df["Date"], format="mixed", dayfirst=True, errors="coerce")
+    # The two files overlap on their boundary year
+    df = df.dropna(subset=["Date"]).drop_duplicates(
+        subset="Date").sort_values("Date")
+
+    regions = [col for col in df.columns if col != "Date"]
+    years = sorted(df["Date"].dt.year.unique().tolist())
+
+    year_idx = df["Date"].dt.year.map({year: i for i, year in enumerate(years)}).to_numpy()
+    year_start = pd.to_datetime(df["Date"].dt.year.astype(str) + "-01-01")
+    hour_idx = ((df["Date"] - year_start) // pd.Timedelta(hours=1)).to_numpy()
+
+    cube = np.full((len(years), HOURS_PER_YEAR, len(regions)), np.nan, dtype=np.float32)
+    epoch = np.full((len(years), HOURS_PER_YEAR), EPOCH_PAD, dtype=np.int64)
+    cube[year_idx, hour_idx, :] = df[regions].to_numpy(dtype=np.float32)
+    epoch[year_idx, hour_idx] = df["Date"].to_numpy(
+        dtype="datetime64[s]").astype(np.int64)
+
+    cf_path, epoch_path, meta_path = _cube_paths(technology)
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    np.save(cf_path, cube)
+    np.save(epoch_path, epoch)
+
+    meta = {
+        "technology": technology,
+        "years": years,
+        "regions": regions,
+        "sources": fingerprint_sources(sources),
+    }
+    write_json(meta_path, meta)
+    return meta
+
+
+class EmhiresCube:
+    """Memory-mapped capacity factor cube of one technology."""
+
+    def __init__(self, technology):
+        cf_path, epoch_path, meta_path = _cube_paths(technology)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.technology = technology
+        self.years = meta["years"]
+        self.regions = meta["regions"]
+        self._year_index = {year: i for i, year in enumerate(self.years)}
+        self._region_index = {region: i for i, region in enumerate(self.regions)}
+        self.cf = np.load(cf_path, mmap_mode="r")
+        self.epoch = np.load(epoch_path, mmap_mode="r")
+
+    def profile(self, year, nuts2_list):
+        """
+        Summed capacity factor of a set of NUTS2 regions for one year.
+
+        Parameters:
+            year (int or None): Year to slice; None keeps every year.
+            nuts2_list (list): NUTS2 codes; codes absent from the cube are ignored.
+
+        Returns:
+            (pd.Series, pd.Series, list): Hourly capacity factor sum, matching
+            timestamps and the NUTS2 codes that were found.
+        """
+        valid_columns = [code for code in nuts2_list if code in self._region_index]
+        columns = [self._region_index[code] for code in valid_columns]
+
+        if year is None:
+            year_slice = slice(None)
+        elif year in self._year_index:
+            year_slice = slice(self._year_index[year], self._year_index[year] + 1)
+        else:
+            valid_columns = []
+
+        if not valid_columns:
+            return pd.Series(dtype=float), pd.Series(dtype="datetime64[ns]"), []
+
+        epoch = np.asarray(self.epoch[year_slice]).reshape(-1)
+        mask = epoch != EPOCH_PAD
+        values = np.asarray(self.cf[year_slice][:, :, columns], dtype=np.float64)
+        values = np.nansum(values.reshape(-1, len(columns))[mask], axis=1)
+        time = pd.Series(pd.to_datetime(epoch[mask], unit="s"))
+        return pd.Series(values), time, valid_columns
+
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+
+def get_emhires_cube(technology):
+    """
+    Return the memory-mapped cube of a technology, building it from the
+    EMHIRES CSVs the first time or when they changed.
+
+    Returns:
+        EmhiresCube or None: None when neither the cube nor its sources exist.
+    """
+    with _cubes_lock:
+        if technology in _cubes:
+            return _cubes[technology]
+
+        sources = EMHIRES_SOURCES[technology]
+        sources_exist = all(os.path.exists(path) for path in sources)
+        cf_path, epoch_path, meta_path = _cube_paths(technology)
+
+        if os.path.exists(meta_path) and os.path.exists(cf_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # A shipped cube without its CSVs is used as is
+            if sources_exist and not is_fresh(meta, sources)[0]:
+                build_emhires_cube(technology)
+        elif sources_exist:
+            build_emhires_cube(technology)
+        else:
+            return None
+
+        _cubes[technology] = EmhiresCube(technology)
+        return _cubes[technology]
+
+
+if __name__ == "__main__":
+    for technology in sys.argv[1:] or list(EMHIRES_SOURCES):
+        build_emhires_cube(technology)
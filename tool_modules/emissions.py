@@ -3,6 +3,9 @@ import pandas as pd
 import numpy as np
 import plotly.express as px  # Correct import for plotting
 
+from tool_modules.pathway_engine import pathway_routes, weighted_intensities
+from tool_modules.registry import get_registry, group_codes
+
 
 def emissions_pathway():
     st.subheader("CO2 emissions")
@@ -35,27 +38,17 @@ def emissions_pathway():
 
     product_list = []  # accumulate all products
 
+    registry = get_registry()
     for name in pathways_names:
-        df_pathway = pd.DataFrame()
-        pathway_dict = st.session_state["Pathway name"][name]
-        sector_product_list = pathway_dict.keys()
-
-        for sector_product in sector_product_list:
-            df = pathway_dict[sector_product]
-            df = df[columns]
-
-            # Compute weighted averages
-            weights = df["route_weight"]
-            weighted_averages = df.drop(columns="route_weight").apply(
-                lambda col: np.average(col, weights=weights)
-            )
-            weighted_averages = weighted_averages.to_frame().T
-
-            product = sector_product.split("_")[-1]
-            product_list.append(product)
-            weighted_averages["product"] = product
-
-            df_pathway = pd.concat([df_pathway, weighted_averages])
+        # Weighted averages of every product of the pathway, grouped on product codes
+        df_routes = pathway_routes(st.session_state["Pathway name"][name])
+        products = registry.categorical("product", df_routes["product_name"])
+        df_pathway = weighted_intensities(
+            df_routes.assign(product_code=group_codes(products)),
+            [col for col in columns if col != "route_weight"],
+            by="product_code", sort=False)
+        df_pathway["product"] = products.categories[df_pathway.pop("product_code").to_numpy(dtype=int)]
+        product_list.extend(df_pathway["product"])
 
         pathway_emission[name] = df_pathway
 
@@ -0,0 +1,94 @@
+import threading
+
+import pandas as pd
+
+SCENARIOS = ["low", "medium", "high"]
+
+# ENSPRESO column holding each resource, per scenario
+RESOURCE_COLUMNS = {
+    "wind": "wind_onshore_production_twh_{scenario}",
+    "solar": "solar_production_twh_{scenario}_total",
+    "biomass": "biomass_production_twh_{scenario}_total",
+}
+
+
+class EnspresoIndex:
+    """
+    ENSPRESO NUTS2 potentials parsed once and indexed by NUTS2 code.
+
+    values[scenario] is a DataFrame indexed by nuts2_code with one float
+    column per resource ('wind', 'solar', 'biomass').
+    """
+
+    def __init__(self, df):
+        df = df.drop_duplicates(subset="nuts2_code").set_index("nuts2_code")
+        self.nuts2_codes = df.index
+        self.values = {}
+        for scenario in SCENARIOS:
+            columns = {resource: pattern.format(scenario=scenario)
+                       for resource, pattern in RESOURCE_COLUMNS.items()}
+            available = {resource: col for resource, col in columns.items()
+                         if col in df.columns}
+            self.values[scenario] = pd.DataFrame(
+                {resource: pd.to_numeric(df[col], errors="coerce")
+                 for resource, col in available.items()},
+                index=df.index,
+            )
+
+    def memory_usage(self):
+        """Size of the indexed tables in bytes."""
+        return int(sum(table.memory_usage(index=True, deep=True).sum()
+                       for table in self.values.values()))
+
+    def lookup(self, nuts2_list, scenario):
+        """
+        Potentials of a list of NUTS2 regions.
+
+        Returns:
+            pd.DataFrame: One row per NUTS2 code found, resources as columns.
+        """
+        table = self.values[scenario]
+        return table.loc[table.index.intersection(pd.Index(nuts2_list).unique())]
+
+    def totals(self, nuts2_list, scenario):
+        """
+        Summed solar and onshore wind potential (TWh) of a set of NUTS2 regions.
+
+        Returns:
+            (float, float): (solar, wind); regions absent from ENSPRESO count as 0.
+        """
+        rows = self.lookup(nuts2_list, scenario)
+        solar = float(rows["solar"].sum()) if "solar" in rows else 0
+        wind = float(rows["wind"].sum()) if "wind" in rows else 0
+        return solar, wind
+
+    def scenario_table(self, scenario):
+        """
+        Wind, solar and biomass potential of every NUTS2 region with the
+        original ENSPRESO column names and a 'NUTS2' column.
+        """
+        table = self.values[scenario]
+        rename = {resource: RESOURCE_COLUMNS[resource].format(scenario=scenario)
+                  for resource in table.columns}
+        table = table.rename(columns=rename).reset_index()
+        return table.rename(columns={"nuts2_code": "NUTS2"})
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def enspreso_index_from_download(name="ENSPRESO"):
+    """
+    Index of the ENSPRESO table fetched by loading_data (parsed on disk).
+
+    Indexes are shared by archive checksum, so every session reuses the
+    same index until a different archive is downloaded.
+    """
+    from tool_modules.loading_data import artifact_checksum, load_artifact
+
+    key = artifact_checksum(name)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = EnspresoIndex(load_artifact(name))
+        return _indexes[key]
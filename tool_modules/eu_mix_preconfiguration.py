@@ -1,26 +1,27 @@
+import logging
+
 import pandas as pd
 import streamlit as st
 from tool_modules.categorisation import *
+from tool_modules.reference_store import get_reference
 
+logger = logging.getLogger(__name__)
 
-def eu_mix_configuration_id_weight(pathway_name):
-    """
-    Returns a DataFrame mapping configuration_id to weighted share (%) 
-    for a given EU-mix year (e.g., 'EU-mix-2030'), based on model_configuration.csv.
+# Ready-made pathways built from the mix_<year> columns of model_configuration
+EU_MIX_PATHWAYS = ["EU-MIX-2018", "EU-MIX-2030", "EU-MIX-2040", "EU-MIX-2050"]
 
-    Parameters:
-        pathway_name (str): Name of the EU-mix pathway (e.g., 'EU-mix-2040').
 
-    Returns:
-        pd.DataFrame: DataFrame containing configuration_id and their corresponding weights for the specified year.
+def build_eu_mix_routes():
     """
-    columns = ["configuration_id", "sector_id", "product_id",
-               "route_name", "route_weight"]
-
-    model_config_path = "data/model_configuration.csv"
+    Route tables of every EU-mix year, in one pass over model_configuration
+    and perton_all.
 
+    Returns:
+        dict: 'EU-MIX-<year>' -> DataFrame of the configurations of that mix,
+        categorised, with route_name and route_weight (%).
+    """
     # Load the configuration data
-    model_configuration = pd.read_csv(model_config_path)
+    model_configuration = get_reference("model_configuration")
     # List of known EU-mix route names (to be excluded)
     eumix = ["EU-mix-2018", "EU-mix-2030", "EU-mix-2040", "EU-mix-2050"]
 
@@ -29,33 +30,84 @@ def eu_mix_configuration_id_weight(pathway_name):
         ~model_configuration["route_name"].isin(eumix)
     ]
 
-    # Extract the year from the pathway name
-    year = pathway_name.split("-")[-1]
-    mix_column = f"mix_{year}"
-    # Filter and compute weights
-    df_upload = model_configuration[model_configuration[mix_column] != 0].copy(
-    )
-    df_upload["route_weight"] = df_upload[mix_column] * 100
+    # Load and categorise the per-ton configuration data
+    perton_ALL_AIDRES = get_reference("perton_all")
+    perton_ALL_AIDRES = perton_ALL_AIDRES.groupby(
+        "configuration_id").first().reset_index()
+    perton_ALL_AIDRES = join_categories(perton_ALL_AIDRES)
 
-    # Load and clean the per-ton configuration data
-    perton_path = "data/perton_all.csv"
-    perton_ALL_AIDRES = pd.read_csv(perton_path)
+    dict_routes = {}
+    for pathway_name in EU_MIX_PATHWAYS:
+        # Extract the year from the pathway name
+        year = pathway_name.split("-")[-1]
+        mix_column = f"mix_{year}"
+        # Filter and compute weights
+        df_upload = model_configuration[model_configuration[mix_column] != 0].copy(
+        )
+        df_upload["route_weight"] = df_upload[mix_column] * 100
 
+        df_upload = perton_ALL_AIDRES.merge(
+            df_upload[["configuration_id", "route_weight"]],
+            on="configuration_id",
+            how="inner",
+        )
+        df_upload["route_name"] = df_upload["configuration_name"]
+        dict_routes[pathway_name] = df_upload
+    return dict_routes
 
-    perton_ALL_AIDRES = perton_ALL_AIDRES.groupby(
-        "configuration_id").first().reset_index()
 
-    perton_ALL_AIDRES = process_configuration_dataframe(perton_ALL_AIDRES)
+def build_eu_mix_pathways():
+    """
+    Every EU-mix year as a saved pathway (CompactPathway), as the
+    Ready-made path option saves it when the pathway is not edited.
+
+    Returns:
+        dict: 'EU-MIX-<year>' -> CompactPathway.
+    """
+    from tool_modules.builder_functions import premade_routes, valid_weight_total
+    from tool_modules.compact_pathway import CompactPathway
+
+    df_perton_sector = get_reference("perton_sector")
+    pathways = {}
+    for pathway_name, df_upload in get_reference("eu_mix_routes").items():
+        dict_routes = {}
+        for key, df_product in premade_routes(df_perton_sector, df_upload).items():
+            total_weight = df_product["route_weight"].sum()
+            if not valid_weight_total(total_weight):
+                logger.warning("%s: %s weights sum to %.2f, not ~100%%; skipped",
+                               pathway_name, key, total_weight)
+                continue
+            # Keep only the selected rows (where route_weight not 0)
+            dict_routes[key] = df_product[df_product["route_weight"] != 0]
+        pathways[pathway_name] = CompactPathway.from_routes(dict_routes)
+    return pathways
+
+
+def eu_mix_configuration_id_weight(pathway_name):
+    """
+    Returns a DataFrame mapping configuration_id to weighted share (%)
+    for a given EU-mix year (e.g., 'EU-mix-2030'), based on model_configuration.csv.
+
+    The tables of all years are built once per process (see build_eu_mix_routes).
+
+    Parameters:
+        pathway_name (str): Name of the EU-mix pathway (e.g., 'EU-mix-2040').
+
+    Returns:
+        pd.DataFrame: DataFrame containing configuration_id and their corresponding weights for the specified year.
+    """
+    year = pathway_name.split("-")[-1]
+    return get_reference("eu_mix_routes")[f"EU-MIX-{year}"].copy()
+
 
-    # perton_ALL_mix_AIDRES = perton_ALL_AIDRES[perton_ALL_AIDRES["configuration_name"].str.contains(
-    #     "mix")]
+def eu_mix_pathway(pathway_name):
+    """
+    The saved (compact) pathway of an EU-mix year, shared by every session.
 
-    df_upload = perton_ALL_AIDRES.merge(
-    df_upload[["configuration_id", "route_weight"]],
-    on="configuration_id",
-    how="inner",
-    
-)
-    df_upload["route_name"] = df_upload["configuration_name"]
+    Parameters:
+        pathway_name (str): One of EU_MIX_PATHWAYS.
 
-    return df_upload
+    Returns:
+        CompactPathway
+    """
+    return get_reference("eu_mix_pathways")[pathway_name]
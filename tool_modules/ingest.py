@@ -0,0 +1,257 @@
+import os
+import json
+import hashlib
+import threading
+
+import pandas as pd
+
+# Folder holding the converted (columnar) copies of the reference datasets
+CACHE_DIR = os.environ.get("RES2GO_CACHE_DIR", "data/.cache")
+
+
+def _build_production_site_geo():
+    """
+    Production sites with the WKB hex 'geom' column decoded once into
+    float 'lon'/'lat' columns (EPSG:4326).
+    """
+    import shapely
+
+    df = pd.read_csv("data/production_site.csv")
+    points = shapely.from_wkb(df["geom"].to_numpy())
+    df["lon"] = shapely.get_x(points)
+    df["lat"] = shapely.get_y(points)
+    return df.drop(columns="geom")
+
+
+def _build_site_crosswalk():
+    """
+    One row per AIDRES site with the regions it belongs to: NUTS3 and NUTS2
+    (2021, from the site's nuts3_code), NUTS2 2013 (from the same code, see
+    nuts2_2013_code) and country.
+    """
+    from tool_modules.nuts_regions import nuts2_2013_code
+
+    sites = load_dataset("production_site_geo").drop_duplicates(
+        subset="aidres_site_id")
+    nuts3_2021 = sites["nuts3_code"].astype(str)
+    return pd.DataFrame({
+        "aidres_site_id": sites["aidres_site_id"].to_numpy(),
+        "nuts3_2021": nuts3_2021.to_numpy(),
+        "nuts2_2021": nuts3_2021.str[:-1].to_numpy(),
+        "nuts2_2013": nuts3_2021.map(nuts2_2013_code).to_numpy(),
+        "country": nuts3_2021.str[:2].to_numpy(),
+    })
+
+
+def _build_configuration_categories():
+    """Energy feedstock, technology category and hydrogen source per configuration_id."""
+    from tool_modules.categorisation import build_configuration_categories
+
+    return build_configuration_categories(load_dataset("perton_all"))
+
+
+# Reference datasets: source file(s) and the reader used to build them once
+DATASETS = {
+    "perton_all": {
+        "sources": ["data/perton_all.csv"],
+        "read_csv": {},
+    },
+    "configuration_categories": {
+        "sources": ["data/perton_all.csv"],
+        "build": _build_configuration_categories,
+    },
+    "production_site": {
+        "sources": ["data/production_site.csv"],
+        "read_csv": {},
+    },
+    "production_site_geo": {
+        "sources": ["data/production_site.csv"],
+        "build": _build_production_site_geo,
+    },
+    "site_crosswalk": {
+        # nuts_regions.py holds the NUTS 2021 -> 2013 correspondence
+        "sources": ["data/production_site.csv", "tool_modules/nuts_regions.py"],
+        "build": _build_site_crosswalk,
+    },
+    "model_configuration": {
+        "sources": ["data/model_configuration.csv"],
+        "read_csv": {},
+    },
+    "ets_all": {
+        "sources": ["data/ETS_ALL.csv"],
+        "read_csv": {},
+    },
+    "elmas_time_series": {
+        "sources": ["data/ELMAS_dataset/Time_series_18_clusters.csv"],
+        "read_csv": {"sep": ";", "decimal": ","},
+    },
+    "elmas_clusters": {
+        "sources": ["data/ELMAS_dataset/Clusters_after_manual_reclassification.csv"],
+        "read_csv": {"sep": ";", "dtype": {"Class": str}},
+    },
+    "eurostat_solar": {
+        "sources": ["data/Energy_production/Solar_MWh_m2_2023.csv"],
+        "read_csv": {"dtype": {"Value": str}},
+    },
+    "eurostat_wind": {
+        "sources": ["data/Energy_production/WindOnshore_MWh_m2_2023.csv"],
+        "read_csv": {"dtype": {"Value": str}},
+    },
+}
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _checksum(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"path": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def unique_tmp_path(path):
+    """
+    Temporary path next to path, unique to the calling process and thread,
+    to write a file before moving it into place with os.replace.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def write_json(path, content):
+    """Write a JSON file through a temporary file, so a reader never sees half of it."""
+    tmp_path = unique_tmp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(content, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _cache_paths(name):
+    return (os.path.join(CACHE_DIR, f"{name}.parquet"),
+            os.path.join(CACHE_DIR, f"{name}.json"))
+
+
+def fingerprint_sources(sources):
+    """Manifest entries (path, mtime, size, sha256) for a list of source files."""
+    return [dict(_fingerprint(path), sha256=_checksum(path)) for path in sources]
+
+
+def is_fresh(manifest, sources):
+    """
+    Check the stored source fingerprints against the files on disk.
+
+    The mtime/size pair is compared first; the checksum is only recomputed
+    when the mtime moved, so touching a file without changing it does not
+    trigger a rebuild.
+
+    Returns:
+        (bool, bool): (cache valid, manifest needs rewriting)
+    """
+    stored = manifest.get("sources", [])
+    if [s["path"] for s in stored] != list(sources):
+        return False, False
+
+    touched = False
+    for entry in stored:
+        current = _fingerprint(entry["path"])
+        if current["mtime_ns"] == entry["mtime_ns"] and current["size"] == entry["size"]:
+            continue
+        if current["size"] != entry["size"] or _checksum(entry["path"]) != entry["sha256"]:
+            return False, False
+        entry["mtime_ns"] = current["mtime_ns"]
+        touched = True
+    return True, touched
+
+
+def _read_source(name):
+    spec = DATASETS[name]
+    if "build" in spec:
+        return spec["build"]()
+    return pd.read_csv(spec["sources"][0], **spec.get("read_csv", {}))
+
+
+def build_dataset(name):
+    """
+    Parse the source file(s) of a dataset and write its Parquet copy.
+
+    Parameters:
+        name (str): Key in DATASETS.
+
+    Returns:
+        pd.DataFrame: The freshly parsed dataset.
+    """
+    spec = DATASETS[name]
+    df = _read_source(name)
+
+    if not _parquet_available():
+        return df
+
+    parquet_path, manifest_path = _cache_paths(name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary file first so a concurrent reader never sees half a file
+    tmp_path = unique_tmp_path(parquet_path)
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+
+    manifest = {
+        "name": name,
+        "sources": fingerprint_sources(spec["sources"]),
+    }
+    write_json(manifest_path, manifest)
+
+    return df
+
+
+def load_dataset(name):
+    """
+    Load a reference dataset through its columnar cache.
+
+    The source CSV is parsed only when no cached copy exists or when the
+    source changed (different size or checksum) since the copy was written.
+
+    Parameters:
+        name (str): Key in DATASETS (e.g. 'perton_all').
+
+    Returns:
+        pd.DataFrame: The dataset.
+    """
+    if name not in DATASETS:
+        raise KeyError(f"Unknown dataset '{name}'")
+
+    if not _parquet_available():
+        return _read_source(name)
+
+    parquet_path, manifest_path = _cache_paths(name)
+    if os.path.exists(parquet_path) and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        fresh, touched = is_fresh(manifest, DATASETS[name]["sources"])
+        if fresh:
+            if touched:
+                write_json(manifest_path, manifest)
+            return pd.read_parquet(parquet_path)
+
+    return build_dataset(name)
+
+
+def build_all():
+    """Convert every registered dataset (used once after a data update)."""
+    for name in DATASETS:
+        build_dataset(name)
+
+
+if __name__ == "__main__":
+    build_all()
@@ -1,13 +1,22 @@
-import streamlit as st
-import requests
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from zipfile import ZipFile
-from io import BytesIO
+
+import pandas as pd
+import requests
+
+from tool_modules.ingest import (
+    CACHE_DIR, _checksum, _parquet_available, fingerprint_sources, is_fresh, unique_tmp_path,
+    write_json)
 
 # Define the datasets
 ZIP_FILES = {
     "ENSPRESO": {
         "url": "https://cidportal.jrc.ec.europa.eu/ftp/jrc-opendata/ENSPRESO/ENSPRESO_Integrated_Data.zip",
         "file": "ENSPRESO_Integrated_NUTS2_Data.csv",
+        "read_csv": {"sep": ";"},
     },
     # "WIND": {
     #     "url": "https://zenodo.org/api/records/8340501/files/EMHIRES_WIND_ONSHORE_NUTS2.zip/content",
@@ -19,41 +28,224 @@ ZIP_FILES = {
     # },
 }
 
-# Initialize session state
-if "archives" not in st.session_state:
-    st.session_state.archives = {}
+# Downloaded archives and their extracted, parsed copies
+DOWNLOAD_DIR = os.path.join(CACHE_DIR, "downloads")
+
+CHUNK_SIZE = 1 << 16
+
+_locks = {}
+_registry_lock = threading.Lock()
+_executor = None
+
 
-st.title("⬇️ Download Time Series Data")
+def _lock_for(name):
+    with _registry_lock:
+        if name not in _locks:
+            _locks[name] = threading.Lock()
+        return _locks[name]
 
-def fetch_file_from_zip_to_bytes(url: str, target_file: str) -> BytesIO:
+
+def _artifact_paths(name):
+    base = os.path.join(DOWNLOAD_DIR, name)
+    extension = "parquet" if _parquet_available() else "csv"
+    return {
+        "archive": f"{base}.zip",
+        "part": f"{base}.zip.part",
+        "validator": f"{base}.zip.part.json",
+        "table": f"{base}.{extension}",
+        "manifest": f"{base}.json",
+    }
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def download_archive(name, info, progress=None, session=None):
     """
-    Download a ZIP file and return a BytesIO containing the target file.
+    Download an archive to DOWNLOAD_DIR, resuming a previous partial download.
+
+    The bytes are streamed to '<name>.zip.part'. When that file exists, only
+    the missing range is requested; the server's ETag/Last-Modified is sent
+    back as If-Range so a changed remote file is fetched again from scratch.
+    The part file is renamed once complete and, when ZIP_FILES gives a
+    'sha256', checked against it.
+
+    Parameters:
+        name (str): Key in ZIP_FILES.
+        info (dict): Entry of ZIP_FILES ('url', optional 'sha256').
+        progress (callable, optional): progress(name, downloaded, total) with
+            byte counts; total is 0 when the server does not send a length.
+        session (requests.Session, optional): HTTP session to use.
+
+    Returns:
+        str: Path of the complete archive.
     """
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
+    paths = _artifact_paths(name)
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    http = session or requests
+
+    offset = os.path.getsize(paths["part"]) if os.path.exists(paths["part"]) else 0
+    validator = _read_json(paths["validator"]).get("validator")
+
+    headers = {}
+    if offset and validator:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+    else:
+        offset = 0
+
+    with http.get(info["url"], stream=True, headers=headers, timeout=60) as response:
+        if response.status_code == 416:
+            # Nothing left to fetch: the part file already holds the whole archive
+            response.close()
+        else:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Full body: the server ignored the range or the file changed
+                offset = 0
+
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            if validator:
+                write_json(paths["validator"], {"url": info["url"], "validator": validator})
 
-    total_length = int(response.headers.get("content-length", 0))
-    buffer = BytesIO()
-    downloaded = 0
+            total = int(response.headers.get("content-length", 0))
+            total = total + offset if total else 0
+            downloaded = offset
 
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+            with open(paths["part"], "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if progress is not None:
+                            progress(name, downloaded, total)
 
-    for chunk in response.iter_content(chunk_size=8192):
-        if chunk:
-            buffer.write(chunk)
-            downloaded += len(chunk)
-            percent = downloaded / total_length
-            progress_bar.progress(percent)
-            status_text.text(f"Downloading {target_file}... {percent*100:.1f}%")
+            if total and downloaded != total:
+                raise IOError(
+                    f"{name}: download interrupted ({downloaded} of {total} bytes), retry to resume")
 
-    buffer.seek(0)
+    expected = info.get("sha256")
+    if expected and _checksum(paths["part"]) != expected:
+        os.remove(paths["part"])
+        raise IOError(f"{name}: checksum mismatch, the download was discarded")
+
+    os.replace(paths["part"], paths["archive"])
+    if os.path.exists(paths["validator"]):
+        os.remove(paths["validator"])
+    return paths["archive"]
+
+
+def extract_archive(name, info):
+    """
+    Parse the target file of a downloaded archive and store it as a columnar
+    table next to the archive (CSV when pyarrow is not installed).
+
+    Returns:
+        pd.DataFrame: The parsed table.
+    """
+    paths = _artifact_paths(name)
+    with ZipFile(paths["archive"]) as zf:
+        if info["file"] not in zf.namelist():
+            raise FileNotFoundError(f"{info['file']} not found in ZIP")
+        with zf.open(info["file"]) as f:
+            df = pd.read_csv(f, **info.get("read_csv", {}))
 
-    # Extract the target file into BytesIO
-    with ZipFile(buffer) as zf:
-        if target_file not in zf.namelist():
-            raise FileNotFoundError(f"{target_file} not found in ZIP")
-        with zf.open(target_file) as f:
-            file_bytes = BytesIO(f.read())
+    tmp_path = unique_tmp_path(paths["table"])
+    if _parquet_available():
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, paths["table"])
 
-    return file_bytes
\ No newline at end of file
+    write_json(paths["manifest"], {
+        "name": name,
+        "url": info["url"],
+        "file": info["file"],
+        "sources": fingerprint_sources([paths["archive"]]),
+    })
+    return df
+
+
+def is_downloaded(name):
+    """
+    True when the parsed table of a dataset is on disk and matches its archive.
+
+    Only file sizes and modification times are compared, so this is cheap
+    enough to call on every page run.
+    """
+    paths = _artifact_paths(name)
+    if not (os.path.exists(paths["table"]) and os.path.exists(paths["archive"])):
+        return False
+    manifest = _read_json(paths["manifest"])
+    return bool(manifest) and is_fresh(manifest, [paths["archive"]])[0]
+
+
+def artifact_checksum(name):
+    """sha256 of the archive a downloaded dataset was extracted from."""
+    manifest = _read_json(_artifact_paths(name)["manifest"])
+    return manifest["sources"][0]["sha256"]
+
+
+def fetch_dataset(name, sources=None, progress=None, session=None):
+    """
+    Make a dataset available on disk: download (or resume) its archive and
+    extract it, skipping whatever is already done.
+
+    Parameters:
+        name (str): Key in sources.
+        sources (dict, optional): Dataset definitions; defaults to ZIP_FILES.
+        progress (callable, optional): See download_archive.
+        session (requests.Session, optional): HTTP session to use.
+
+    Returns:
+        str: Path of the parsed table.
+    """
+    info = (sources or ZIP_FILES)[name]
+    paths = _artifact_paths(name)
+
+    # One fetch per dataset at a time, even across sessions
+    with _lock_for(name):
+        if is_downloaded(name):
+            return paths["table"]
+        if not os.path.exists(paths["archive"]):
+            download_archive(name, info, progress=progress, session=session)
+        extract_archive(name, info)
+    return paths["table"]
+
+
+def fetch_all(sources=None, progress=None, session=None, max_workers=4):
+    """
+    Start fetching every dataset concurrently in background threads.
+
+    Returns:
+        dict: Dataset name -> concurrent.futures.Future of its table path.
+    """
+    global _executor
+    sources = sources or ZIP_FILES
+    with _registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="res2go-download")
+    return {
+        name: _executor.submit(fetch_dataset, name, sources, progress, session)
+        for name in sources
+    }
+
+
+def load_artifact(name):
+    """
+    Read the parsed table of a downloaded dataset.
+
+    Raises:
+        FileNotFoundError: The dataset was not fetched yet.
+    """
+    if not is_downloaded(name):
+        raise FileNotFoundError(f"{name} is not downloaded yet")
+    table_path = _artifact_paths(name)["table"]
+    if table_path.endswith(".parquet"):
+        return pd.read_parquet(table_path)
+    return pd.read_csv(table_path)
@@ -24,6 +24,12 @@ from geopy.distance import geodesic
 from tool_modules.clustering import *
 from tool_modules.convert import *
 from tool_modules.graph_output import *
+from tool_modules.reference_store import get_reference
+from tool_modules.nuts_regions import locate_sites, site_regions
+from tool_modules.memo import LRUCache, memoized
+from tool_modules.site_demand import (
+    production_sites, pathways_site_demand, DEFAULT_UTILIZATION, REPORT_COLUMNS, PYPSA_COLUMNS)
+from tool_modules.uncertainty import uncertainty_bands, N_SAMPLES, CONCENTRATION, EU_SCOPE
 
 type_ener_feed = ["electricity_[mwh/t]",
                   "electricity_[gj/t]",
@@ -104,52 +110,23 @@ def _get_radius(df):
 
 
 
-@st.cache_resource(show_spinner=False)
-def get_NUTS2_polygons():
-    """Download and cache the NUTS2 polygons (2013)."""
-    url = "https://gisco-services.ec.europa.eu/distribution/v2/nuts/geojson/NUTS_RG_01M_2013_4326_LEVL_2.geojson"
-    return gpd.read_file(url)
-
-
 def matching_NUTS2(list_sites):
-    # ✅ Cached instead of fetching each time
-    gdf_polygon_NUTS2_2013 = get_NUTS2_polygons()
-
-    # Ensure list_sites is a GeoDataFrame in EPSG:4326
+    """NUTS2 (2013) region of each site, from the local spatially indexed polygons."""
     if not isinstance(list_sites, gpd.GeoDataFrame):
         if {"lon", "lat"}.issubset(list_sites.columns):
-            geometry = [Point(xy) for xy in zip(list_sites["lon"], list_sites["lat"])]
+            geometry = gpd.points_from_xy(list_sites["lon"], list_sites["lat"])
             list_sites = gpd.GeoDataFrame(list_sites, geometry=geometry, crs="EPSG:4326")
         else:
             raise ValueError("list_sites must be a GeoDataFrame or a DataFrame with 'lon' and 'lat' columns")
 
-    if list_sites.crs is None or list_sites.crs.to_epsg() != 4326:
-        list_sites = list_sites.to_crs(epsg=4326)
-
-    # Spatial join to assign NUTS2 regions
-    result = gpd.sjoin(list_sites, gdf_polygon_NUTS2_2013, how="left", predicate="intersects")
+    matched = locate_sites(list_sites, year=2013, level=2)
+    result = gpd.GeoDataFrame(matched, geometry=list_sites.geometry)
 
     # Return only relevant columns (site + matched NUTS2 code)
     gdf_list_NUTS2_cluster = result[["geometry", "NUTS_ID", "NAME_LATN"]].drop_duplicates()
     return gdf_list_NUTS2_cluster
 
 
-product_updates = {
-    "cement": "Cement product",
-    "chemical-PE": "Polyethylene",
-    "chemical-PEA": "Poly-ethyl-acetate",
-    "chemical-olefins": "Olefins",
-    "fertiliser-ammonia": "Ammonia",
-    "fertiliser-nitric-acid": "Nitric acid",
-    "fertiliser-urea": "Urea",
-    "glass-container": "Container glass",
-    "glass-fibre": "Glass fibre",
-    "glass-float": "Float glass",
-    "refineries-light-liquid-fuel": "Light liquid fuel",
-    "steel-secondary" : "Secondary steel", 
-    "steel-primary" : "Primary steel"
-}
-
 # Existing dictionary
 dict_product_by_sector_AIDRES = {
     "Cement": ["Cement"],
@@ -199,12 +176,7 @@ def map_per_pathway():
             "Please include AIDRES production routes to use map features."
         )
         return
-    path = "data/production_site.csv"
-    df = pd.read_csv(path)
-
-    df = df[df["wp1_model_product_name"] != "not included in blue-print model"]
-
-    df["wp1_model_product_name"] = df["wp1_model_product_name"].replace(product_updates)
+    df = production_sites()
 
 
 
@@ -315,19 +287,13 @@ def map_per_pathway():
         st.markdown(""" *Default value 100 %* """)
         with st.expander("Utilisation rate"):
             sector_utilization = _get_utilization_rates(sectors_all_list)
-        dict_gdf = {}
-        pathways_names_filtered = []
-        for pathway in pathways_names:
-            gdf_prod_x_perton = _get_gdf_prod_x_perton(
-                df, pathway, sector_utilization, selected_columns)
-            # Convert to GeoDataFrame
-            if gdf_prod_x_perton is not None:
-                dict_gdf[pathway] = gdf_prod_x_perton
-                pathways_names_filtered.append(pathway)
+        dict_gdf = _get_site_demand(
+            df, pathways_names, sector_utilization, selected_columns, country_codes)
+        pathways_names_filtered = list(dict_gdf)
         st.divider()
 
         choice = st.radio("Cluster method", [
-                          "DBSCAN", "KMEANS"], horizontal=True)
+                          "DBSCAN", "HIERARCHICAL", "KMEANS"], horizontal=True)
         choice_cluster, param1, param2, param4 = _edit_clustering(
             choice)
         dict_gdf_clustered = {}
@@ -338,15 +304,6 @@ def map_per_pathway():
             # assign empty GeoDataFrame
             dict_gdf_clustered[pathway] = empty_gdf
 
-        for pathway in pathways_names_filtered:
-            dict_gdf[pathway] = dict_gdf[pathway].rename(
-                columns={
-                    "direct_emission_[tco2/t] ton": "Direct CO2 emissions (t)"}
-            )
-            if country_codes:
-                dict_gdf[pathway] = dict_gdf[pathway][
-                    dict_gdf[pathway]["nuts3_code"].str[:2].isin(country_codes)
-                ]
         st.divider()
 
 
@@ -395,8 +352,8 @@ def map_per_pathway():
 
             pathway = st.radio("Select a pathway",
                                pathways_names_filtered, horizontal=True)
-            gdf_clustered = _run_clustering(
-                choice_cluster, dict_gdf[pathway], param1, param2, param4)
+            gdf_clustered = run_clustering(
+                choice_cluster, dict_gdf[pathway], param1, param2, param4, sweep=True)
             dict_gdf_clustered[pathway] = gdf_clustered
 
             sectors_included = dict_gdf_clustered[pathway]["aidres_sector_name"].unique(
@@ -448,8 +405,13 @@ def map_per_pathway():
 
         if map_choice == "cluster centroid":
             df_selected_site = None
-            gdf_clustered_centroid = summarise_clusters_by_centroid(
-                dict_gdf_clustered[pathway])
+            if choice_cluster == "HIERARCHICAL" and len(sector_seleted) == len(sectors_included):
+                # Every clustered site is shown: read the clusters off the merge tree
+                gdf_clustered_centroid = summarise_single_linkage(
+                    dict_gdf_clustered[pathway], param1)
+            else:
+                gdf_clustered_centroid = summarise_clusters_by_centroid(
+                    dict_gdf_clustered[pathway])
             st.markdown(
                 """*Click on a cluster centroid to see details **below the map***""")
             st.divider()
@@ -494,6 +456,9 @@ def map_per_pathway():
             df_selected_site = _mapping_chart_per_ener_feed_sites(
                 dict_gdf_clustered[pathway], color_choice, gdf_layer)
             st.divider()
+        with st.expander("Route weight uncertainty"):
+            # All sites of the pathway, before the sector and noise filters
+            _show_uncertainty(pathway, gdf_clustered, selected_columns, unit)
         if df_selected_site is not None:
 
             _chart_site(df_selected_site, unit)
@@ -515,17 +480,11 @@ def map_per_pathway():
                 st.write(
                     f"Direct CO2 emissions per annum : {emission:.2f} {unit_CO2}")
             with st.expander("Time profiles"):
-                # Step 1: Extract NUTS3 codes 
-                #2013
-                gdf_list_NUTS2_cluster = matching_NUTS2(df_filtered_cluster)
-                NUTS3_cluster_list_2013 = gdf_list_NUTS2_cluster["NUTS_ID"].unique().tolist()
-
-                #2021
-                NUTS3_cluster_list_2021=df_filtered_cluster["nuts3_code"].unique().tolist()
-                
-                # Step 2: Derive NUTS2 codes by removing last character from each NUTS3 code
-                NUTS2_cluster_list_2021 = list(
-                    set([code[:-1] for code in NUTS3_cluster_list_2021]))
+                # Step 1: NUTS2 codes (2013 and 2021) of the cluster sites,
+                # looked up in the precomputed site crosswalk
+                df_regions_cluster = site_regions(df_filtered_cluster["aidres_site_id"])
+                NUTS3_cluster_list_2013 = df_regions_cluster["nuts2_2013"].dropna().unique().tolist()
+                NUTS2_cluster_list_2021 = df_regions_cluster["nuts2_2021"].dropna().unique().tolist()
 
                 # Ensure session_state key exists
                 if "saved_clusters" not in st.session_state:
@@ -599,56 +558,9 @@ def map_per_pathway():
         with st.expander("File sites energy consumption (GEOJson PyPSA compatible)"):
             if unit == "GJ":
 
-                cols = [
-                "site_name",
-                "nuts3_code",
-                "cluster",
-                "geometry",
-                "aidres_sector_name",
-                "production_route_name",
-                "prod_cap",
-                "prod_rate",
-                "utilization_rate",
-                "product_name",
-                "electricity_[gj/t] ton",
-                "alternative_fuel_mixture_[gj/t] ton",
-                "biomass_[gj/t] ton",
-                "biomass_waste_[gj/t] ton",
-                "coal_[gj/t] ton",
-                "coke_[gj/t] ton",
-                "crude_oil_[gj/t] ton",
-                "hydrogen_[gj/t] ton",
-                "methanol_[gj/t] ton",
-                "ammonia_[gj/t] ton",
-                "naphtha_[gj/t] ton",
-                "natural_gas_[gj/t] ton",
-                "plastic_mix_[gj/t] ton",
-                "sector_name",
-                "total_energy",
-                "Direct CO2 emissions (t)"
-            ]
-                st.write(mapped_sites[cols])
-                # Filter + select columns
-                columns_nienke = [
-                    "site_name",
-                    "geometry",
-                    "electricity_[gj/t] ton",
-                    "alternative_fuel_mixture_[gj/t] ton",
-                    "biomass_[gj/t] ton",
-                    "biomass_waste_[gj/t] ton",
-                    "coal_[gj/t] ton",
-                    "coke_[gj/t] ton",
-                    "crude_oil_[gj/t] ton",
-                    "hydrogen_[gj/t] ton",
-                    "methanol_[gj/t] ton",
-                    "ammonia_[gj/t] ton",
-                    "naphtha_[gj/t] ton",
-                    "natural_gas_[gj/t] ton",
-                    "plastic_mix_[gj/t] ton",
-                    "total_energy",
-                ]
+                st.write(mapped_sites[REPORT_COLUMNS])
                 # select columns
-                mapped_sites = mapped_sites[columns_nienke]
+                mapped_sites = mapped_sites[PYPSA_COLUMNS]
 
                 # Convert geometry from WKT if needed
                 if isinstance(mapped_sites["geometry"].iloc[0], str):
@@ -715,129 +627,106 @@ def _site_within_cluster(df_selected, pathway, dict_gdf_clustered):
 
 
 def _get_utilization_rates(sectors):
-    sector_utilization_defaut = {
-        "Fertilisers": 100,
-        "Steel": 100,
-        "Cement": 100,
-        "Refineries": 100,
-        "Chemical": 100,
-        "Glass": 100,
-    }
     sector_utilization = {}
     for sector in sectors:
         st.text("Ulisation rate (%)")
         value = st.slider(f"{sector}", 0, 100,
-                          value=sector_utilization_defaut[sector])
+                          value=DEFAULT_UTILIZATION[sector])
         sector_utilization[sector] = value
     return sector_utilization
 
 
-def _get_gdf_prod_x_perton(df, pathway, sector_utilization, selected_columns):
-    perton = st.session_state["Pathway name"][pathway]
-
-    list_keys = list(perton.keys())
-    sectors_list = []
-    for key in list_keys:
-        sectors_list.append(key.split("_")[0])
-    unique_sectors = set(sectors_list)
-        # Convert WKB hex to geometry
-    df['geometry'] = df['geom'].apply(lambda x: wkb.loads(bytes.fromhex(x)))
-
-    # Convert to GeoDataFrame
-    gdf_production_site = gpd.GeoDataFrame(
-        df.drop(columns="geom"), geometry='geometry', crs="EPSG:4326")
-
-    for sector, utilization_rate in sector_utilization.items():
+# Site demand of the pathways, shared by reruns and sessions
+_site_demand_cache = LRUCache("site demand", maxsize=32)
 
-        # Matching sector & utlisation rate
-        matching = gdf_production_site["aidres_sector_name"] == sector
-        gdf_production_site.loc[matching,
-                                "utilization_rate"] = utilization_rate
 
-    # Condition : prod_rate if prod_cap extist, but not prod_rate
-    prod_rate_cap_utli_condi_1 = gdf_production_site["utilization_rate"] / \
-        100 * gdf_production_site["prod_cap"]
-
-    condition_1 = (gdf_production_site["prod_rate"].isna() &
-                   gdf_production_site["prod_cap"].notna() &
-                   gdf_production_site["utilization_rate"].notna())
-
-    gdf_production_site["prod_rate"] = np.where(
-        condition_1, prod_rate_cap_utli_condi_1, gdf_production_site["prod_rate"])
-
-    # Condition : prod_rate if prod_rate exist but not prod_cap
-    prod_rate_cap_utli_condi_2 = gdf_production_site["utilization_rate"] / \
-        100 * gdf_production_site["prod_rate"]
-
-    condition_2 = (gdf_production_site["prod_rate"].notna() &
-                   gdf_production_site["prod_cap"].isna() &
-                   gdf_production_site["utilization_rate"].notna())
+def _get_site_demand(df, pathways_names, sector_utilization, selected_columns, country_codes):
+    """
+    Per site demand of every pathway, renamed and filtered to the selected
+    countries, memoised on the pathways contents, utilisation rates,
+    carriers and countries. df is the shared production site table.
 
-    gdf_production_site["prod_rate"] = np.where(
-        condition_2, prod_rate_cap_utli_condi_2, gdf_production_site["prod_rate"])
+    Returns:
+        dict: pathway name -> DataFrame of its sites.
+    """
+    pathways = [(name, st.session_state["Pathway name"][name]) for name in pathways_names]
 
-    # Condition : prod_rate if prod_rate exist and prod_cap
-    prod_rate_cap_utli_condi_3 = gdf_production_site["utilization_rate"] / \
-        100 * gdf_production_site["prod_cap"]
+    def compute():
+        list_gdf = pathways_site_demand(
+            df, [pathway for _, pathway in pathways], sector_utilization,
+            selected_columns, country_codes)
+        return dict(zip(pathways_names, list_gdf))
 
-    condition_3 = (gdf_production_site["prod_rate"].isna() &
-                   gdf_production_site["prod_cap"].isna() &
-                   gdf_production_site["utilization_rate"].notna())
+    key_parts = ("site demand", pathways, sector_utilization,
+                 selected_columns, sorted(country_codes))
+    dict_gdf = memoized(_site_demand_cache, key_parts, compute)
+    # Callers may add columns to the frames, not to the cached ones
+    return {name: gdf.copy(deep=False) for name, gdf in dict_gdf.items()}
 
-    gdf_production_site["prod_rate"] = np.where(
-        condition_3, prod_rate_cap_utli_condi_3, gdf_production_site["prod_rate"])
 
-    # Multiply per ton with matching product
-    sectors_products = list(perton.keys())
-    df_pathway_weighted = pd.DataFrame()
-    columns = selected_columns + ["direct_emission_[tco2/t]"]
+# Monte Carlo bands of the pathways, shared by reruns and sessions
+_uncertainty_cache = LRUCache("route weight uncertainty", maxsize=8)
 
-    dfs_dict_path = st.session_state["Pathway name"][pathway]
-    df_path = pd.concat(dfs_dict_path.values(), ignore_index=True)
 
-    for sector_product in sectors_products:
-        product = sector_product.split("_")[-1]
-        sector = sector_product.split("_")[0]
-        dfs_dict_path = st.session_state["Pathway name"][pathway]
-        df_path = pd.concat(dfs_dict_path.values(), ignore_index=True)
+def _show_uncertainty(pathway, gdf_clustered, selected_columns, unit):
+    """
+    Percentile bands of the EU-wide and per cluster totals when the route
+    weights of the pathway are drawn around the chosen ones.
 
-        df_filtered = df_path[df_path["product_name"] == product]
+    gdf_clustered holds every site of the pathway (all sectors, clustered
+    or not): the EU row covers all of them, the cluster rows only the sites
+    of each cluster.
+    """
+    st.markdown(
+        "*Route weights are drawn from a Dirichlet distribution centred on the chosen weights;"
+        " a higher concentration means more confidence in them.*")
+    col_samples, col_concentration = st.columns(2)
+    with col_samples:
+        n_samples = st.select_slider(
+            "Samples", [1000, 2000, 5000, 10000, 20000], value=N_SAMPLES)
+    with col_concentration:
+        concentration = st.number_input(
+            "Concentration", min_value=1.0, value=CONCENTRATION, step=10.0)
+    if not st.toggle("Run the simulation", key="run_uncertainty"):
+        return
 
-        if not df_filtered.empty:
-            def weighted_avg(df, value_cols, weight_col):
-                return pd.Series({
-                    col: np.average(df[col], weights=df[weight_col]) for col in value_cols
-                })
+    indicators = {
+        f"Total energy ({unit})": selected_columns,
+        "Direct CO2 emissions (t)": ["direct_emission_[tco2/t]"],
+    }
+    sites = gdf_clustered
+    if "cluster" in sites.columns:
+        # Unclustered sites (-1) count in the EU row only
+        clusters = sites["cluster"].astype(object).where(sites["cluster"] != -1, None)
+    else:
+        clusters = pd.Series(None, index=sites.index, dtype=object)
+    perton = st.session_state["Pathway name"][pathway]
 
-            df_filtered_weight = df_filtered.groupby("product_name").apply(
-                weighted_avg, value_cols=columns, weight_col="route_weight"
-            ).reset_index()
-
-            df_filtered_weight["sector_name"] = sector  # retain sector info
-
-            # Correct way to append data to the final DataFrame
-            df_pathway_weighted = pd.concat(
-                [df_pathway_weighted, df_filtered_weight], ignore_index=True)
-    # Optional: only display once, outside the loop
-    gdf_prod_x_perton = gdf_production_site.merge(
-        df_pathway_weighted,
-        how="left",
-        left_on="wp1_model_product_name",
-        right_on="product_name",
-    )
-    for column in columns:
-        gdf_prod_x_perton[column] = gdf_prod_x_perton[column] * \
-            gdf_prod_x_perton["prod_rate"] * 1000  # prod rate kt
+    def compute():
+        return uncertainty_bands(
+            perton, indicators, sites["product_name"],
+            sites["prod_rate"] * 1000,  # prod rate kt
+            clusters, n_samples, concentration)
+
+    key_parts = ("route weight uncertainty", perton, indicators,
+                 sites[["product_name", "prod_rate"]], clusters, n_samples, concentration)
+    try:
+        df_bands = memoized(_uncertainty_cache, key_parts, compute)
+    except ZeroDivisionError as error:
+        st.warning(f"Route weights of a product sum to zero: {error}")
+        return
 
-    gdf_prod_x_perton['total_energy'] = gdf_prod_x_perton[columns].sum(
-        axis=1)
+    # The EU row with the chosen weights is the sum of the site values of the map
+    energy_sites = sites[[f"{col} ton" for col in selected_columns]].sum().sum()
+    energy_eu = df_bands.loc[(df_bands["scope"] == EU_SCOPE)
+                             & (df_bands["indicator"] == f"Total energy ({unit})"), "chosen weights"].iloc[0]
+    st.caption(
+        f"EU: all {sites['aidres_site_id'].nunique()} sites of the pathway, clustered or not and of every sector "
+        f"(total energy of the site values: {energy_sites:,.0f} {unit}, chosen weights: {energy_eu:,.0f} {unit}).")
 
-    for column in columns:
-        gdf_prod_x_perton.rename(
-            columns={column: f"{column} ton"}, inplace=True)
-    gdf_prod_x_perton = gdf_prod_x_perton[gdf_prod_x_perton["sector_name"].notnull(
-    )]
-    return gdf_prod_x_perton
+    df_bands["scope"] = df_bands["scope"].apply(
+        lambda scope: scope if scope == EU_SCOPE else f"Cluster {scope}")
+    st.dataframe(df_bands, hide_index=True)
 
 
 def _mapping_chart_per_ener_feed_cluster(gdf, color_map, unit, extra_layer = None):
@@ -1297,12 +1186,22 @@ def _edit_clustering(choice):
                            1, 100, step=1, value=10)
         return choice, min_samples, radius, None
 
+    elif choice == "HIERARCHICAL":
+        st.markdown(
+            """<small><i>Hierarchical (single-linkage) clustering links every site to the sites within the chosen distance; linked sites form a cluster. Sites without another site within the distance stay unclustered: unlike DBSCAN there is no minimum number of sites, so unclustered sites are isolated sites, not noise.</i></small>""",
+            unsafe_allow_html=True
+        )
+        distance = st.slider("Distance between sites (km)",
+                             1.0, 100.0, step=0.5, value=10.0)
+        return choice, distance, None, None
+
     elif choice == "KMEANS":
         st.markdown(
             """<small><i>KMeans clustering requires the number of clusters to be defined. It clusters the sites based on their location only.</i></small>""",
             unsafe_allow_html=True
         )
-        n_cluster = st.slider("Number of clusters", 1, 200, step=1, value=100)
+        n_cluster = st.slider("Number of clusters", KMEANS_RANGE.start,
+                              KMEANS_RANGE.stop - 1, step=1, value=100)
         kmeans_option = st.segmented_control(
             "Clustering option", options=["Weighted", "Threshold"]
         )
@@ -1337,39 +1236,6 @@ def _edit_clustering(choice):
         else:
             return "KMEANS", n_cluster, None, None
 
-def _run_clustering(choice, gdf, param1, param2, param4):
-    if choice == "DBSCAN":
-        min_samples, radius = param1, param2
-        gdf = gdf.copy()
-        gdf_filtered = gdf.drop_duplicates(subset="aidres_site_id")
-        gdf_clustered_single = cluster_gdf_dbscan(
-            gdf_filtered, min_samples, radius)
-        cluster_map = dict(
-            zip(gdf_clustered_single["aidres_site_id"], gdf_clustered_single["cluster"]))
-        gdf["cluster"] = gdf["aidres_site_id"].map(cluster_map)
-        gdf_clustered = gdf
-
-    elif choice == "KMEANS":
-        n_cluster = param1
-        gdf_clustered = cluster_gdf_kmeans(gdf, n_cluster)
-
-    elif choice == "KMEANS_WEIGHTED":
-        n_cluster, value_type = param1, param2
-        gdf_clustered = cluster_gdf_kmeans_weight(gdf, value_type, n_cluster)
-
-    elif choice == "KMEANS_THRESHOLD":
-        n_cluster, value_type, redistribute = param1, param2, param4
-        gdf_clustered = kmeans_threshold(
-            gdf, n_cluster, value_type, redistribute)
-
-    else:
-        return gdf  # fallback
-
-    if (gdf_clustered["cluster"] != -1).any():
-        return gdf_clustered
-    else:
-        return gdf
-
 def mapping_cluster_polygons(gdf):
     import pydeck as pdk
     import streamlit as st
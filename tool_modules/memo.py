@@ -0,0 +1,135 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+def _feed(digest, obj):
+    """Add a canonical byte form of obj to a hash."""
+    if hasattr(obj, "content_hash"):
+        digest.update(b"H" + obj.content_hash().encode())
+    elif isinstance(obj, pd.DataFrame):
+        digest.update(b"F" + json.dumps([str(col) for col in obj.columns]).encode())
+        digest.update(json.dumps([str(dtype) for dtype in obj.dtypes]).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        digest.update(b"S" + str(obj.name).encode())
+        digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(b"A" + str(obj.dtype).encode() + str(obj.shape).encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, Mapping):
+        digest.update(b"M%d" % len(obj))
+        for key in sorted(obj, key=repr):
+            _feed(digest, key)
+            _feed(digest, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"L%d" % len(obj))
+        for item in obj:
+            _feed(digest, item)
+    elif isinstance(obj, (set, frozenset)):
+        _feed(digest, sorted(obj, key=repr))
+    else:
+        digest.update(b"V" + repr(obj).encode())
+
+
+def stable_hash(*parts):
+    """
+    Hash of the contents of the given objects, stable across reruns and sessions.
+
+    DataFrames are hashed by their values, index, columns and dtypes; dicts
+    regardless of their insertion order; objects with a content_hash()
+    method (e.g. CompactPathway) through it.
+
+    Returns:
+        str: sha1 hex digest.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        _feed(digest, part)
+    return digest.hexdigest()
+
+
+# Named caches of the process, for reporting
+CACHES = {}
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, name, maxsize=32):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hits, misses and current size."""
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._data), "maxsize": self.maxsize}
+
+
+def cache_stats():
+    """
+    Counters of every named cache.
+
+    Returns:
+        pd.DataFrame: One row per cache with hits, misses, size and maxsize.
+    """
+    rows = [dict(cache=name, **cache.stats()) for name, cache in CACHES.items()]
+    return pd.DataFrame(rows, columns=["cache", "hits", "misses", "size", "maxsize"])
+
+
+_missing = object()
+
+
+def memoized(cache, key_parts, compute):
+    """
+    Return compute() from the cache, keyed by the content hash of key_parts.
+
+    DataFrame results are handed out as shallow copies, so adding or
+    replacing columns on them does not alter the cached copy.
+    """
+    key = stable_hash(*key_parts)
+    result = cache.get(key, _missing)
+    if result is _missing:
+        result = compute()
+        cache.put(key, result)
+    if isinstance(result, pd.DataFrame):
+        return result.copy(deep=False)
+    return result
@@ -0,0 +1,291 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from tool_modules.ingest import unique_tmp_path
+
+NUTS_DIR = "data/NUTS"
+
+# Source of each NUTS version, converted once to GeoParquet in NUTS_DIR. Both
+# GeoParquet files are shipped; NUTS2 2013 is derived from NUTS3 2021 (see
+# derive_nuts2_2013) unless rebuilt from GISCO ('--gisco', needs network access)
+NUTS_SOURCES = {
+    2013: {
+        "source": "https://gisco-services.ec.europa.eu/distribution/v2/nuts/geojson/NUTS_RG_20M_2013_4326.geojson",
+        "parquet": os.path.join(NUTS_DIR, "NUTS_RG_20M_2013_4326.parquet"),
+    },
+    2021: {
+        "source": os.path.join(NUTS_DIR, "NUTS_RG_20M_2021_4326", "NUTS_RG_20M_2021_4326.shp"),
+        "parquet": os.path.join(NUTS_DIR, "NUTS_RG_20M_2021_4326.parquet"),
+    },
+}
+
+# NUTS2 2013 region of the NUTS 2021 regions whose code changed since 2013
+# (Eurostat NUTS 2016 and NUTS 2021 amendments). Keyed by NUTS2 code, or by
+# NUTS3 code where a NUTS2 2021 region straddles 2013 regions; other NUTS2
+# codes are unchanged. NUTS3 boundary shifts (e.g. Louth moving from IE01 to
+# IE06) are not followed.
+NUTS2_2013_OF_2021 = {
+    # France: 2016 regional reform
+    "FRB0": "FR24", "FRC1": "FR26", "FRC2": "FR43", "FRD1": "FR25", "FRD2": "FR23",
+    "FRE1": "FR30", "FRE2": "FR22", "FRF1": "FR42", "FRF2": "FR21", "FRF3": "FR41",
+    "FRG0": "FR51", "FRH0": "FR52", "FRI1": "FR61", "FRI2": "FR63", "FRI3": "FR53",
+    "FRJ1": "FR81", "FRJ2": "FR62", "FRK1": "FR72", "FRK2": "FR71", "FRL0": "FR82",
+    "FRM0": "FR83", "FRY1": "FRA1", "FRY2": "FRA2", "FRY3": "FRA3", "FRY4": "FRA4",
+    "FRY5": "FRA5",
+    # Greece: 2016 NUTS1 regrouping
+    "EL51": "EL11", "EL52": "EL12", "EL53": "EL13", "EL54": "EL21", "EL61": "EL14",
+    "EL62": "EL22", "EL63": "EL23", "EL64": "EL24", "EL65": "EL25",
+    # Poland: 2016 NUTS1 regrouping and split of Mazowieckie
+    "PL71": "PL11", "PL72": "PL33", "PL81": "PL31", "PL82": "PL32", "PL84": "PL34",
+    "PL91": "PL12", "PL92": "PL12",
+    # Splits of capital regions (2016) and Croatia (2021)
+    "HU11": "HU10", "HU12": "HU10",
+    "LT01": "LT00", "LT02": "LT00",
+    "HR02": "HR04", "HR05": "HR04", "HR06": "HR04",
+    "UKI3": "UKI1", "UKI4": "UKI1", "UKI5": "UKI2", "UKI6": "UKI2", "UKI7": "UKI2",
+    # Slovenia: 2016 recoding
+    "SI03": "SI01", "SI04": "SI02",
+    # Ireland: 2016 redrawing
+    "IE041": "IE01", "IE042": "IE01", "IE063": "IE01",
+    "IE051": "IE02", "IE052": "IE02", "IE053": "IE02", "IE061": "IE02", "IE062": "IE02",
+    # Scotland: 2016 redrawing
+    "UKM7": "UKM2", "UKM91": "UKM2",
+    "UKM8": "UKM3", "UKM92": "UKM3", "UKM93": "UKM3", "UKM94": "UKM3", "UKM95": "UKM3",
+    # Norway: 2021 county reform
+    "NO081": "NO01", "NO082": "NO01", "NO091": "NO03", "NO092": "NO04", "NO0A1": "NO04",
+    "NO0A2": "NO05", "NO0A3": "NO05", "NO0B1": None, "NO0B2": None,
+}
+
+# Names of the NUTS2 2013 regions whose code is not in NUTS 2021
+NUTS2_2013_NAMES = {
+    "FR21": "Champagne-Ardenne", "FR22": "Picardie", "FR23": "Haute-Normandie",
+    "FR24": "Centre", "FR25": "Basse-Normandie", "FR26": "Bourgogne",
+    "FR30": "Nord - Pas-de-Calais", "FR41": "Lorraine", "FR42": "Alsace",
+    "FR43": "Franche-Comté", "FR51": "Pays de la Loire", "FR52": "Bretagne",
+    "FR53": "Poitou-Charentes", "FR61": "Aquitaine", "FR62": "Midi-Pyrénées",
+    "FR63": "Limousin", "FR71": "Rhône-Alpes", "FR72": "Auvergne",
+    "FR81": "Languedoc-Roussillon", "FR82": "Provence-Alpes-Côte d'Azur", "FR83": "Corse",
+    "FRA1": "Guadeloupe", "FRA2": "Martinique", "FRA3": "Guyane", "FRA4": "La Réunion",
+    "FRA5": "Mayotte",
+    "EL11": "Anatoliki Makedonia, Thraki", "EL12": "Kentriki Makedonia",
+    "EL13": "Dytiki Makedonia", "EL14": "Thessalia", "EL21": "Ipeiros",
+    "EL22": "Ionia Nisia", "EL23": "Dytiki Ellada", "EL24": "Sterea Ellada",
+    "EL25": "Peloponnisos",
+    "PL11": "Łódzkie", "PL12": "Mazowieckie", "PL31": "Lubelskie", "PL32": "Podkarpackie",
+    "PL33": "Świętokrzyskie", "PL34": "Podlaskie",
+    "HU10": "Közép-Magyarország", "LT00": "Lietuva", "HR04": "Kontinentalna Hrvatska",
+    "UKI1": "Inner London", "UKI2": "Outer London",
+    "SI01": "Vzhodna Slovenija", "SI02": "Zahodna Slovenija",
+    "IE01": "Border, Midland and Western", "IE02": "Southern and Eastern",
+    "UKM2": "Eastern Scotland", "UKM3": "South Western Scotland",
+    "NO01": "Oslo og Akershus", "NO03": "Sør-Østlandet", "NO04": "Agder og Rogaland",
+    "NO05": "Vestlandet",
+}
+
+# Countries of NUTS 2021 outside NUTS 2013
+NUTS_2021_ONLY_COUNTRIES = ["AL", "RS"]
+
+NUTS_COLUMNS = ["NUTS_ID", "LEVL_CODE", "CNTR_CODE", "NAME_LATN", "NUTS_NAME", "geometry"]
+
+
+def nuts2_2013_code(nuts_2021):
+    """NUTS2 2013 code of a NUTS2 or NUTS3 2021 code (None outside NUTS 2013)."""
+    if nuts_2021[:2] in NUTS_2021_ONLY_COUNTRIES:
+        return None
+    for code in (nuts_2021, nuts_2021[:4]):
+        if code in NUTS2_2013_OF_2021:
+            return NUTS2_2013_OF_2021[code]
+    return nuts_2021[:4]
+
+
+def derive_nuts2_2013(nuts_2021):
+    """
+    NUTS2 2013 polygons, as the union of the NUTS3 2021 polygons of each
+    region (see NUTS2_2013_OF_2021).
+
+    Parameters:
+        nuts_2021 (gpd.GeoDataFrame): NUTS 2021 polygons (see load_nuts).
+
+    Returns:
+        gpd.GeoDataFrame: The NUTS2 polygons (EPSG:4326), in NUTS_COLUMNS.
+    """
+    nuts3 = nuts_2021[nuts_2021["LEVL_CODE"] == 3]
+    codes = nuts3["NUTS_ID"].map(nuts2_2013_code)
+    nuts3 = nuts3[codes.notna()].assign(NUTS_ID=codes.dropna())
+    gdf = nuts3.dissolve(by="NUTS_ID", aggfunc={"CNTR_CODE": "first"}).reset_index()
+
+    names_2021 = nuts_2021[nuts_2021["LEVL_CODE"] == 2].set_index("NUTS_ID")
+    gdf["NAME_LATN"] = gdf["NUTS_ID"].map(NUTS2_2013_NAMES).fillna(
+        gdf["NUTS_ID"].map(names_2021["NAME_LATN"]))
+    gdf["NUTS_NAME"] = gdf["NUTS_ID"].map(NUTS2_2013_NAMES).fillna(
+        gdf["NUTS_ID"].map(names_2021["NUTS_NAME"]))
+    gdf["LEVL_CODE"] = 2
+    return gdf[NUTS_COLUMNS].set_crs(epsg=4326, allow_override=True)
+
+
+def build_nuts_geoparquet(year, gisco=False):
+    """
+    Convert the NUTS polygons of one version to GeoParquet.
+
+    NUTS 2021 (all levels) is read from the shapefile shipped in NUTS_DIR.
+    NUTS 2013 (level 2) is derived from it offline, or with gisco fetched
+    from GISCO (all levels; needs network access).
+
+    Returns:
+        gpd.GeoDataFrame: The polygons (EPSG:4326).
+    """
+    spec = NUTS_SOURCES[year]
+    if year == 2013 and not gisco:
+        gdf = derive_nuts2_2013(load_nuts(2021))
+    else:
+        gdf = gpd.read_file(spec["source"]).to_crs(epsg=4326)
+        gdf = gdf[[col for col in NUTS_COLUMNS if col in gdf.columns]]
+        gdf["LEVL_CODE"] = gdf["LEVL_CODE"].astype(int)
+
+    tmp_path = unique_tmp_path(spec["parquet"])
+    gdf.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, spec["parquet"])
+    return gdf
+
+
+def load_nuts(year):
+    """
+    NUTS polygons of one version, from the shipped GeoParquet (rebuilt
+    offline from the shipped sources if missing; GISCO is never fetched at
+    runtime).
+    """
+    spec = NUTS_SOURCES[year]
+    if os.path.exists(spec["parquet"]):
+        return gpd.read_parquet(spec["parquet"])
+    return build_nuts_geoparquet(year)
+
+
+class NutsIndex:
+    """
+    NUTS polygons of one version with one STRtree per level.
+
+    Point lookups go through the tree's bounding boxes first and only test
+    the few candidate polygons exactly.
+    """
+
+    def __init__(self, gdf):
+        self.gdf = gdf.reset_index(drop=True)
+        self._levels = {}
+        for level, rows in self.gdf.groupby("LEVL_CODE").groups.items():
+            rows = np.asarray(rows)
+            geometries = self.gdf.geometry.values[rows]
+            self._levels[int(level)] = (rows, shapely.STRtree(np.asarray(geometries)))
+
+    def memory_usage(self):
+        """Size of the attribute table in bytes (geometries excluded)."""
+        return int(self.gdf.drop(columns="geometry").memory_usage(index=True, deep=True).sum())
+
+    def locate_rows(self, lon, lat, level=2):
+        """
+        Row of self.gdf containing each point, -1 for points outside every region.
+
+        On a shared border the first region in the table wins.
+        """
+        rows, tree = self._levels[level]
+        points = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        point_idx, geom_idx = tree.query(points, predicate="intersects")
+
+        located = np.full(len(points), -1, dtype=np.int64)
+        order = np.lexsort((geom_idx, point_idx))
+        first_points, first = np.unique(point_idx[order], return_index=True)
+        located[first_points] = rows[geom_idx[order][first]]
+        return located
+
+    def locate(self, lon, lat, level=2):
+        """
+        NUTS code of each point.
+
+        Parameters:
+            lon, lat (array-like): Coordinates in EPSG:4326.
+            level (int): NUTS level (0 to 3).
+
+        Returns:
+            np.ndarray: NUTS_ID per point (None outside every region).
+        """
+        located = self.locate_rows(lon, lat, level)
+        codes = self.gdf["NUTS_ID"].to_numpy(dtype=object)[np.maximum(located, 0)]
+        codes[located < 0] = None
+        return codes
+
+    def regions(self, level):
+        """Polygons of one level."""
+        rows, _ = self._levels[level]
+        return self.gdf.iloc[rows]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_nuts_index(year):
+    """Spatial index of a NUTS version, built once per server process."""
+    with _indexes_lock:
+        if year not in _indexes:
+            _indexes[year] = NutsIndex(load_nuts(year))
+        return _indexes[year]
+
+
+def locate_sites(df, year=2013, level=2):
+    """
+    NUTS region of each site of a DataFrame.
+
+    Parameters:
+        df (pd.DataFrame): Sites with 'lon'/'lat' columns or a point geometry.
+        year (int): NUTS version (2013 or 2021).
+        level (int): NUTS level.
+
+    Returns:
+        pd.DataFrame: 'NUTS_ID' and 'NAME_LATN' aligned on df's index.
+    """
+    if {"lon", "lat"}.issubset(df.columns):
+        lon, lat = df["lon"].to_numpy(), df["lat"].to_numpy()
+    elif isinstance(df, gpd.GeoDataFrame):
+        geometry = df.geometry
+        if geometry.crs is not None and geometry.crs.to_epsg() != 4326:
+            geometry = geometry.to_crs(epsg=4326)
+        lon, lat = geometry.x.to_numpy(), geometry.y.to_numpy()
+    else:
+        raise ValueError("df must be a GeoDataFrame or a DataFrame with 'lon' and 'lat' columns")
+
+    index = get_nuts_index(year)
+    located = index.locate_rows(lon, lat, level)
+    matched = index.gdf[["NUTS_ID", "NAME_LATN"]].iloc[np.maximum(located, 0)]
+    matched = matched.set_index(df.index)
+    matched.loc[located < 0, :] = None
+    return matched
+
+
+def site_regions(site_ids):
+    """
+    Regions of a set of AIDRES sites, read from the precomputed crosswalk.
+
+    Parameters:
+        site_ids (array-like): aidres_site_id values.
+
+    Returns:
+        pd.DataFrame: One row per distinct site with 'nuts3_2021',
+        'nuts2_2021', 'nuts2_2013' and 'country' (NaN for unknown sites).
+    """
+    from tool_modules.reference_store import get_reference
+
+    crosswalk = get_reference("site_crosswalk")
+    return crosswalk.reindex(pd.unique(np.asarray(site_ids)))
+
+
+if __name__ == "__main__":
+    # python -m tool_modules.nuts_regions [2013] [2021] [--gisco]
+    gisco = "--gisco" in sys.argv[1:]
+    years = [int(arg) for arg in sys.argv[1:] if arg != "--gisco"]
+    for year in years or list(NUTS_SOURCES):
+        build_nuts_geoparquet(year, gisco=gisco)
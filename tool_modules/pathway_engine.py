@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+from tool_modules.registry import get_registry, split_sector_product
+
+
+def pathway_routes(pathway):
+    """
+    Concatenate a pathway into one route table.
+
+    Parameters:
+        pathway (dict): 'Sector_Product' key -> DataFrame of routes.
+
+    Returns:
+        pd.DataFrame: All routes with a 'sector_product' column holding their key.
+    """
+    frames = [df.assign(sector_product=key) for key, df in pathway.items()]
+    if not frames:
+        return pd.DataFrame(columns=["sector_product"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _group_codes(df, by, sort):
+    by = [by] if isinstance(by, str) else list(by)
+    codes = df.groupby(by, sort=sort).ngroup().to_numpy()
+    # Routes with a missing key belong to no group (code -1)
+    routes = np.flatnonzero(codes >= 0)
+    keys = df.iloc[routes][by].assign(_code=codes[routes]).drop_duplicates(
+        "_code").sort_values("_code").drop(columns="_code").reset_index(drop=True)
+    return codes[routes], routes, keys
+
+
+def product_groups(route_products, products):
+    """
+    Group routes by product and match other products to the groups.
+
+    Both sides are matched on registry product codes, so every caller
+    grouping routes by product gets the groups of pathway_intensities.
+
+    Parameters:
+        route_products (array-like): Product name of each route.
+        products (array-like): Product names to match (e.g. of keys or sites).
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray, pd.Index): The group of each
+        route with a product, the positions of those routes, the group of
+        each of products (-1 if none) and the product of each group.
+    """
+    route_products = pd.Series(route_products, dtype=object).reset_index(drop=True)
+    categorical = get_registry().categorical(
+        "product", pd.concat([route_products, pd.Series(products, dtype=object)],
+                             ignore_index=True))
+    route_codes = categorical.codes[:len(route_products)]
+    rows = np.flatnonzero(route_codes >= 0)
+    # Groups in registry code order; missing products (code -1) match none
+    groups = pd.Index(np.unique(route_codes[rows]))
+    return (groups.get_indexer(route_codes[rows]), rows,
+            groups.get_indexer(categorical.codes[len(route_products):]),
+            categorical.categories[groups])
+
+
+def weight_matrix(df, by, weight_col="route_weight", sort=True):
+    """
+    Group x route matrix of route weights.
+
+    Row g holds the weights of the routes of group g and zeros elsewhere, so
+    W @ values sums the weighted values of every group at once.
+
+    Parameters:
+        df (pd.DataFrame): Routes.
+        by (str or list): Column(s) defining the groups.
+        weight_col (str): Column holding the weights.
+        sort (bool): Order groups by key (as groupby does) or by first appearance.
+
+    Returns:
+        (np.ndarray, pd.DataFrame, np.ndarray): The matrix, the group keys
+        (one row per group) and the group of each route (-1 for routes with
+        a missing key).
+    """
+    codes, routes, keys = _group_codes(df, by, sort)
+    matrix = np.zeros((len(keys), len(df)))
+    matrix[codes, routes] = df[weight_col].to_numpy(dtype=float)[routes]
+    groups = np.full(len(df), -1)
+    groups[routes] = codes
+    return matrix, keys, groups
+
+
+def weighted_intensities(df, value_cols, by, weight_col="route_weight", sort=True):
+    """
+    Weighted average of value columns per group, in one matrix product.
+
+    Gives the same numbers as groupby(by).apply(np.average(col,
+    weights=weight_col)) for every column: a missing value in a group makes
+    that group's average missing, and a group whose weights sum to zero
+    raises ZeroDivisionError.
+
+    Parameters:
+        df (pd.DataFrame): Routes.
+        value_cols (list): Columns to average (carriers, costs, emissions...).
+        by (str or list): Column(s) defining the groups.
+        weight_col (str): Column holding the route weights.
+        sort (bool): Order groups by key or by first appearance.
+
+    Returns:
+        pd.DataFrame: The group key column(s) followed by value_cols.
+    """
+    value_cols = list(value_cols)
+    matrix, keys, groups = weight_matrix(df, by, weight_col, sort)
+    weight_sums = matrix.sum(axis=1)
+    if np.any(weight_sums == 0):
+        raise ZeroDivisionError("Weights sum to zero, can't be normalized")
+
+    values = df[value_cols].to_numpy(dtype=float)
+    missing = np.isnan(values)
+    averages = matrix @ np.where(missing, 0.0, values) / weight_sums[:, None]
+
+    # Missing values propagate to the groups containing them, as in np.average
+    # (zero weight routes included)
+    routes = np.flatnonzero(groups >= 0)
+    membership = np.zeros_like(matrix)
+    membership[groups[routes], routes] = 1.0
+    averages[membership @ missing > 0] = np.nan
+
+    result = keys.copy()
+    result[value_cols] = averages
+    return result
+
+
+def pathway_intensities(pathway, value_cols, weight_col="route_weight"):
+    """
+    Weighted intensities of every product of a pathway.
+
+    Each 'Sector_Product' key gets the weighted average over all routes of
+    its product, tagged with the key's sector.
+
+    Parameters:
+        pathway (dict): 'Sector_Product' key -> DataFrame of routes.
+        value_cols (list): Columns to average.
+
+    Returns:
+        pd.DataFrame: 'product_name', value_cols and 'sector_name', one row
+        per key whose product has routes.
+    """
+    value_cols = list(value_cols)
+    df_routes = pathway_routes(pathway)
+    keys = [split_sector_product(key) for key in pathway]
+    key_products = [product for _, product in keys]
+
+    codes, routes, rows, _ = product_groups(df_routes["product_name"], key_products)
+    df_intensity = weighted_intensities(
+        df_routes.iloc[routes].assign(product_group=codes), value_cols, by="product_group",
+        weight_col=weight_col)
+
+    found = np.flatnonzero(rows >= 0)
+    df_pathway_weighted = df_intensity.iloc[rows[found]][value_cols].reset_index(drop=True)
+    df_pathway_weighted.insert(0, "product_name", [key_products[i] for i in found])
+    df_pathway_weighted["sector_name"] = [keys[i][0] for i in found]
+    return df_pathway_weighted
+
+
+def intensity_tensor(pathways, value_cols, products):
+    """
+    Weighted intensities of several pathways on a common product axis.
+
+    Parameters:
+        pathways (list): Pathways ('Sector_Product' key -> DataFrame of routes).
+        value_cols (list): Columns to average.
+        products (pd.Index): Product names defining the product axis.
+
+    Returns:
+        (np.ndarray, np.ndarray): pathway x product x column intensities (NaN
+        where a pathway does not contain the product) and the pathway x
+        product sector names (None where absent).
+    """
+    value_cols = list(value_cols)
+    tensor = np.full((len(pathways), len(products), len(value_cols)), np.nan)
+    sectors = np.full((len(pathways), len(products)), None, dtype=object)
+    for i, pathway in enumerate(pathways):
+        df_intensity = pathway_intensities(pathway, value_cols)
+        positions = products.get_indexer(df_intensity["product_name"])
+        found = positions >= 0
+        tensor[i, positions[found]] = df_intensity[value_cols].to_numpy(dtype=float)[found]
+        sectors[i, positions[found]] = df_intensity["sector_name"].to_numpy()[found]
+    return tensor, sectors
+
+
+def site_demand(tensor, site_products, production):
+    """
+    Demand of every site under every pathway, in one vectorised step.
+
+    demand[p, s, c] = tensor[p, site_products[s], c] * production[s]
+
+    Parameters:
+        tensor (np.ndarray): pathway x product x column intensities.
+        site_products (np.ndarray): Product position of each site (-1 if none).
+        production (np.ndarray): Production of each site.
+
+    Returns:
+        np.ndarray: float32 pathway x site x column demand, NaN for sites
+        whose product is not in the pathway.
+    """
+    site_products = np.asarray(site_products)
+    demand = tensor.astype(np.float32)[:, np.maximum(site_products, 0), :]
+    demand[:, site_products < 0, :] = np.nan
+    demand *= np.asarray(production, dtype=np.float32)[None, :, None]
+    return demand
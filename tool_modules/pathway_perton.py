@@ -2,7 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.figure_factory as ff
 import plotly.express as px
-import numpy as np
+
+from tool_modules.pathway_engine import pathway_routes, weighted_intensities
+from tool_modules.registry import get_registry, group_codes
 
 
 columns_perton_and_weight = [
@@ -306,25 +308,18 @@ def _diplay_chart_per_pathway(
     # sort columns alphabetically
     columns = sorted(columns)
 
-    df_pathway_weighted = []
-
-    for sec in sector:
-        dfs_dict_path = st.session_state["Pathway name"][pathway]
-        df_path = pd.concat(dfs_dict_path.values(), ignore_index=True)
-        df_filtered = df_path[df_path["sector_name"] == sec]
-        if not df_filtered.empty:
-            def weighted_avg(df, value_cols, weight_col):
-                return pd.Series({
-                    col: np.average(df[col], weights=df[weight_col]) for col in value_cols
-                })
-
-            df_filtered_weight = df_filtered.groupby("product_name").apply(
-                weighted_avg, value_cols=columns, weight_col="route_weight"
-            ).reset_index()
-            df_filtered_weight["sector_name"] = sec  # retain sector info
-            df_pathway_weighted.append(df_filtered_weight)
-
-    df_pathway_weighted = pd.concat(df_pathway_weighted, ignore_index=True)
+    # Weighted per ton values of every product of the selected sectors,
+    # filtered and grouped on registry codes
+    registry = get_registry()
+    df_path = pathway_routes(st.session_state["Pathway name"][pathway])
+    sectors = registry.categorical("sector", df_path["sector_name"])
+    products = registry.categorical("product", df_path["product_name"])
+    df_path = df_path.assign(
+        sector_code=group_codes(sectors), product_code=group_codes(products))[sectors.isin(sector)]
+    df_pathway_weighted = weighted_intensities(
+        df_path, columns, by=["sector_code", "product_code"])
+    df_pathway_weighted["product_name"] = products.categories[
+        df_pathway_weighted["product_code"].to_numpy(dtype=int)]
 
    # st.write(df_pathway_weighted)
 
@@ -402,13 +397,8 @@ def _diplay_chart_per_route(selected_ener_feed, pathway, sector, unit):
 
     st.write(f"**{sector}**")
 
-    product_names = df_filtered["product_name"].unique()
-
-    for product_name in product_names:
-        df_product = df_filtered[df_filtered["product_name"] == product_name]
-
-        if df_product.empty:
-            continue
+    # Routes of each product, split in one pass
+    for product_name, df_product in df_filtered.groupby("product_name", sort=False):
 
         # Melt the dataframe to long format for stacked bar chart
         df_melted = df_product.melt(
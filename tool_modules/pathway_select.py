@@ -9,23 +9,11 @@ from tool_modules.import_export_file import *
 from tool_modules.eu_mix_preconfiguration import *
 from tool_modules.categorisation import *
 from tool_modules.builder_functions import *
+from tool_modules.compact_pathway import CompactPathway
+from tool_modules.perton_cube import slice_label
+from tool_modules.reference_store import get_reference
+from tool_modules.registry import product_updates
 
-# Mapping short codes to readable product names
-product_updates = {
-    "cement": "Cement product",
-    "chemical-PE": "Polyethylene",
-    "chemical-PEA": "Poly-ethyl-acetate",
-    "chemical-olefins": "Olefins",
-    "fertiliser-ammonia": "Ammonia",
-    "fertiliser-nitric-acid": "Nitric acid",
-    "fertiliser-urea": "Urea",
-    "glass-container": "Container glass",
-    "glass-fibre": "Glass fibre",
-    "glass-float": "Float glass",
-    "refineries-light-liquid-fuel": "Light liquid fuel",
-    "steel-secondary" : "Secondary steel", 
-    "steel-primary" : "Primary steel"
-}
 
 # Mapping products to detailed descriptions
 def_product = {
@@ -96,30 +84,9 @@ def select_page():
     if "df_new_sector" not in st.session_state:
         st.session_state.df_new_sector = pd.DataFrame()
 
-    # Load and clean the per-ton configuration data
-    perton_path = "data/perton_all.csv"
-    perton_ALL_AIDRES = pd.read_csv(perton_path)
-
-
-    perton_ALL_AIDRES = perton_ALL_AIDRES.groupby(
-        "configuration_id").first().reset_index()
-
-    perton_ALL_AIDRES = process_configuration_dataframe(perton_ALL_AIDRES)
-
-    perton_ALL_no_mix_AIDRES = perton_ALL_AIDRES[~perton_ALL_AIDRES["configuration_name"].str.contains(
-        "mix")]
-
-    perton_ALL_no_mix_AIDRES["route_name"] = perton_ALL_no_mix_AIDRES["configuration_name"].replace(
-        "route_name")
-    
-    # Replace product names using the mapping
-    perton_ALL_no_mix_AIDRES["product_name"] = perton_ALL_no_mix_AIDRES["product_name"].replace(product_updates)
-
-
-    if "df_perton_ALL_sector" not in st.session_state: 
-        st.session_state.df_perton_ALL_sector = perton_ALL_no_mix_AIDRES
+    # Per-ton configuration data: shared AIDRES table + routes added in this session
+    df_perton_ALL_sector = get_perton_sector_table()
 
-    
 
     # Prechoice radio doc link
 
@@ -162,16 +129,16 @@ def select_page():
         # --- EU-MIX AUTOMATED PATHWAY SELECTION ---
         if aidres_mix_checked:
             dict_routes_selected, selected_mix, pathway_name = preconfigure_path(
-                st.session_state.df_perton_ALL_sector, columns_to_show_selection)
+                df_perton_ALL_sector, columns_to_show_selection)
 
     # --- CUSTOM FROM-SCRATCH PATHWAY BUILDING ---
         if create_mix_checked:
             dict_routes_selected, pathway_name = create_path(
-                st.session_state.df_perton_ALL_sector, columns_to_show_selection)
+                df_perton_ALL_sector, columns_to_show_selection)
     # --- IMPORT PATHWAY FROM .txt FILE ---
         if upload_mix_checked:
             dict_routes_selected, pathway_name = upload_path(
-                st.session_state.df_perton_ALL_sector, columns_to_show_selection)
+                df_perton_ALL_sector, columns_to_show_selection)
         if any(not df.empty for df in dict_routes_selected.values()):
             # At least one DataFrame is not empty
 
@@ -202,7 +169,9 @@ def select_page():
                         st.warning(
                             f"A pathway named '{pathway_name}' already exists.")
                     else:
-                        st.session_state["Pathway name"][pathway_name] = dict_routes_selected
+                        # Stored as references to the shared route table plus edits
+                        st.session_state["Pathway name"][pathway_name] = CompactPathway.from_routes(
+                            dict_routes_selected)
                         st.session_state.new_sector = ""
                         st.success(f"Pathway '{pathway_name}' saved.")
                         for name in st.session_state["Pathway name"].keys():
@@ -232,7 +201,45 @@ def select_page():
             else:
                 st.text("Please upload or create a pathway before saving.")
 
-                
+            # --- SCENARIO / HORIZON OF THE SAVED PATHWAYS ---
+            if st.session_state.get("Pathway name"):
+                st.divider()
+                _select_pathway_scenario()
+
+
+def _select_pathway_scenario():
+    """
+    Evaluate a saved pathway for another AIDRES scenario and horizon.
+
+    Only the slice of the per tonne cube used to resolve the pathway
+    changes; the routes, weights and edited values stay as saved.
+    """
+    st.text("Scenario of a saved pathway")
+    saved_pathways = st.session_state["Pathway name"]
+    name = st.selectbox("Saved pathway", list(saved_pathways.keys()),
+                        key="scenario_pathway")
+    pathway = saved_pathways[name]
+    if not isinstance(pathway, CompactPathway):
+        return
+
+    cube = get_reference("perton_cube")
+    horizon_options = ["AIDRES default"] + cube.horizons
+    horizon_index = horizon_options.index(pathway.horizon) if pathway.horizon in cube.horizons else 0
+    horizon = st.selectbox("Horizon", horizon_options, index=horizon_index,
+                           key=f"horizon_{name}")
+    if horizon == "AIDRES default":
+        scenario, horizon = None, None
+    else:
+        scenario_options = cube.scenarios_of(horizon)
+        scenario_index = scenario_options.index(pathway.scenario) if pathway.scenario in scenario_options else 0
+        scenario = st.selectbox("Scenario", scenario_options, index=scenario_index,
+                                key=f"scenario_{name}_{horizon}")
+
+    if (scenario, horizon) != (pathway.scenario, pathway.horizon):
+        saved_pathways[name] = pathway.evaluated_at(scenario, horizon)
+        st.success(f"'{name}' evaluated for {slice_label(scenario, horizon)}")
+
+
 def append_new_sectors(uploaded_dict):
     """
     Add new sectors from uploaded pathway to session_state.
@@ -3,6 +3,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
 
+from tool_modules.registry import split_sector_product
+
 
 def view_page():
     st.subheader("Pathway visualisation")
@@ -108,7 +110,7 @@ def _display_pathway(column_pathway_pairs, sector):
             keys = dict_routes_selected.keys()
             keys_filtered = [k for k in keys if k.startswith(sector + "_")]
             for k in keys_filtered:
-                product = k.split("_")[1]
+                _, product = split_sector_product(k)
                 if len(product.split("-")) > 1:
                     product = "-".join(product.split("-")[1:])
 
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from tool_modules.reference_store import get_reference
+
+# Identifier columns of perton_all; every other numeric column is an indicator
+ID_COLUMNS = ["configuration_id", "solution_id", "scenario_id", "aidres_sector_id", "horizon"]
+
+
+class PertonCube:
+    """
+    AIDRES per tonne indicators as a dense
+    configuration x scenario x horizon x indicator array.
+
+    values[c, s, h, i] is NaN where perton_all has no row for that
+    configuration, scenario and horizon; available[c, s, h] tells which
+    combinations exist.
+    """
+
+    def __init__(self, df):
+        self.indicators = [col for col in df.select_dtypes("number").columns
+                           if col not in ID_COLUMNS]
+        self.configuration_ids = pd.Index(np.sort(df["configuration_id"].unique()))
+        self.scenarios = sorted(int(s) for s in df["scenario_id"].unique())
+        self.horizons = sorted(int(h) for h in df["horizon"].unique())
+
+        c = self.configuration_ids.get_indexer(df["configuration_id"])
+        s = np.searchsorted(self.scenarios, df["scenario_id"])
+        h = np.searchsorted(self.horizons, df["horizon"])
+
+        shape = (len(self.configuration_ids), len(self.scenarios), len(self.horizons))
+        self.values = np.full(shape + (len(self.indicators),), np.nan)
+        self.values[c, s, h] = df[self.indicators].to_numpy(dtype=float)
+        self.available = np.zeros(shape, dtype=bool)
+        self.available[c, s, h] = True
+
+        # Scenario -> horizon pairs present in the data (e.g. 1 -> 2030)
+        pairs = df[["scenario_id", "horizon"]].drop_duplicates().sort_values(["horizon", "scenario_id"])
+        self.slices = [(int(s), int(h)) for s, h in pairs.itertuples(index=False, name=None)]
+
+    def memory_usage(self):
+        return int(self.values.nbytes + self.available.nbytes)
+
+    def slice(self, scenario, horizon):
+        """
+        Indicators of every configuration for one scenario and horizon.
+
+        The returned array is a view of the cube (no copy).
+
+        Returns:
+            (np.ndarray, np.ndarray): configuration x indicator values and the
+            mask of configurations available in that slice.
+        """
+        s = self.scenarios.index(scenario)
+        h = self.horizons.index(horizon)
+        return self.values[:, s, h, :], self.available[:, s, h]
+
+    def scenarios_of(self, horizon):
+        """Scenarios available for a horizon."""
+        return [s for s, h in self.slices if h == horizon]
+
+
+def slice_label(scenario, horizon):
+    if scenario is None:
+        return "AIDRES default"
+    return f"{horizon} - scenario {scenario}"
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def perton_sector_table(scenario=None, horizon=None):
+    """
+    The shared AIDRES route table (indexed by configuration_id) with its
+    indicators taken from one scenario and horizon.
+
+    Configurations absent from that slice keep their default values (the
+    first row of perton_all, as in 'perton_sector'). Each slice is built
+    once per process.
+
+    Parameters:
+        scenario (int, optional): scenario_id; None returns the default table.
+        horizon (int, optional): horizon of the scenario.
+
+    Returns:
+        pd.DataFrame: Route table indexed by configuration_id.
+    """
+    base = get_reference("perton_sector_by_id")
+    if scenario is None:
+        return base
+
+    key = (scenario, horizon)
+    with _tables_lock:
+        if key not in _tables:
+            cube = get_reference("perton_cube")
+            values, available = cube.slice(scenario, horizon)
+
+            rows = cube.configuration_ids.get_indexer(base.index)
+            use = (rows >= 0) & available[np.maximum(rows, 0)]
+            table = base.copy()
+            columns = [col for col in cube.indicators if col in table.columns]
+            indicator_pos = [cube.indicators.index(col) for col in columns]
+            updated = table[columns].to_numpy(dtype=float)
+            updated[use] = values[rows[use]][:, indicator_pos]
+            table[columns] = updated
+            table.loc[use, "scenario_id"] = scenario
+            table.loc[use, "horizon"] = horizon
+            _tables[key] = table
+        return _tables[key].copy(deep=False)
@@ -4,7 +4,10 @@ import streamlit as st
 import numpy as np
 import calendar
 import plotly.express as px
-from tool_modules.loading_data import *
+from tool_modules.loading_data import is_downloaded
+from tool_modules.reference_store import get_reference
+from tool_modules.emhires_cube import get_emhires_cube
+from tool_modules.enspreso_index import enspreso_index_from_download
 
 country_offshore = [
     "BE", "BG", "HR", "CY", "DK", "EE", "FI", "FR", "DE", "EL",
@@ -23,7 +26,7 @@ def profile_load():
 
     required_keys = {"ENSPRESO"}
     
-    if "archives" not in st.session_state or not required_keys.issubset(st.session_state["archives"].keys()):
+    if not all(is_downloaded(name) for name in required_keys):
         st.warning("Please download the time series data on RES2Go session.py first.")
     
         # Provide a clickable link to the other page
@@ -33,8 +36,7 @@ def profile_load():
         # Stop this page until data exists
         st.stop()
 
-    # --- Step 2: once archives are loaded, show the rest of the app ---
-    archives = st.session_state.archives
+    # --- Step 2: once the data is on disk, show the rest of the app ---
 
 
     # col1 = selection and parameters, col2 = plot
@@ -73,6 +75,11 @@ def profile_load():
             st.warning("No saved clusters in session state.")
             return
 
+        if not NUTS2_list_2013 or not NUTS2_list_2021:
+            st.warning(f"No NUTS2 region found for the sites of {cluster_selected}; "
+                       "save the cluster again from the map page.")
+            return
+
         scenario = st.select_slider(
             "ENSPRESO Scenario", ["low", "medium", "high" ])
 
@@ -107,18 +114,9 @@ def profile_load():
         #             col for col in columns_to_show if col in df_show.columns]
         
 
-        solar_total = 0
-        wind_total = 0
-
-
-        for nuts2 in NUTS2_list_2013:
-
-            solar, wind = enspreso_extract(nuts2, scenario)
-
-            if solar is not None:
-                solar_total += solar
-            if wind is not None:
-                wind_total += wind
+        # One lookup pass over the indexed ENSPRESO table for the whole cluster
+        enspreso_table = enspreso_index_from_download("ENSPRESO")
+        solar_total, wind_total = enspreso_table.totals(NUTS2_list_2013, scenario)
 
         energy_volume_solar = st.number_input(
             "Set solar energy volume (TWh)", value=solar_total)
@@ -174,6 +172,8 @@ def profile_load():
                                                  NUTS2=NUTS2_list_2013, energy_volume=energy_volume_solar, year=year)
     wind_profile, wind_time = onshore_generation(None,
                                                  NUTS2=NUTS2_list_2021, energy_volume=energy_volume_wind, year=year)
+    if solar_profile is None or wind_profile is None:
+        return
 
     df_solar = pd.DataFrame(
         {"Time": pd.to_datetime(solar_time), "Solar": solar_profile})
@@ -259,10 +259,8 @@ def scale_profile_to_energy(profile, target_energy):
 
 
 def elmas_data():
-    df_time_cluster = pd.read_csv(
-        "data/ELMAS_dataset/Time_series_18_clusters.csv", sep=";")
-    df_cluster_NACE = pd.read_csv(
-        "data/ELMAS_dataset/Clusters_after_manual_reclassification.csv", sep=";")
+    df_time_cluster = get_reference("elmas_time_series")
+    df_cluster_NACE = get_reference("elmas_clusters")
     # df_nace = pd.read_csv(
     #     "data/ELMAS_dataset/NACE_classification.csv", sep=';')
 
@@ -270,8 +268,7 @@ def elmas_data():
     #     df_nace.set_index("Class")["Class_description"]
     # )
     # st.write(df_cluster_NACE[df_cluster_NACE["Cluster"] == 1])
-    df_time_cluster["Industry"] = df_time_cluster["1"].str.replace(
-        ",", ".", regex=False).astype(float)
+    df_time_cluster["Industry"] = df_time_cluster["1"].astype(float)
     profile = df_time_cluster["Industry"].values
     time = df_time_cluster["Time"]
     profile = np.array(profile, dtype=float) * 0.0036  # kWh to GJ
@@ -296,40 +293,23 @@ def jericho_data(sector):
 
 
 def solar_generation(country, energy_volume, year, NUTS2=None):
-    
-    if NUTS2:
-        if isinstance(NUTS2, list) and len(NUTS2) > 0:
- 
-            file_obj_1 = "/workspaces/ECMtool/Times series data/EMHIRES_PV_NUTS2_Filtered_2006_2011.csv"
-            file_obj_2 = "/workspaces/ECMtool/Times series data/EMHIRES_PV_NUTS2_Filtered_2011_2016.csv"
-
-            # Make sure NUTS2 is defined, e.g.
-            # NUTS2 = ["Column1", "Column2", ...]
-
-            df_1 = pd.read_csv(file_obj_1, usecols=lambda x: x == "Date" or x in NUTS2)
-            df_2 = pd.read_csv(file_obj_2, usecols=lambda x: x == "Date" or x in NUTS2)
-
+    if not NUTS2:
+        st.warning("No NUTS2 region given for the solar profile.")
+        return None, None
 
-            df_all = pd.concat([df_1, df_2], ignore_index=True)
-            df_all["Date"] = pd.to_datetime(df_all["Date"], format="mixed", dayfirst=True, errors="coerce")
-            
-        else :
+    if NUTS2:
+        # Memory-mapped EMHIRES cube (year x hour x NUTS2), no CSV parsing
+        cube = get_emhires_cube("solar")
+        if not isinstance(NUTS2, list) or len(NUTS2) == 0 or cube is None:
             st.error("Data PV not found")
             return None,None
 
-        # Filter by year
-        df_all = df_all[df_all["Date"].dt.year == year]
-
-        # Keep only valid NUTS2 columns that exist in df_all
-
-        valid_columns = [col for col in NUTS2 if col in df_all.columns]
+        # Compute capacity factor profile of the valid NUTS2 columns for the year
+        capacity_factor_profile, time, valid_columns = cube.profile(year, NUTS2)
         if not valid_columns:
             st.warning("None of the specified NUTS2 regions were found in the CSV.")
             return None, None
-    
-        # Compute capacity factor profile
-        capacity_factor_profile = df_all[valid_columns].sum(axis=1)
-        data_source = df_all[["Date"]].copy()
+        data_source = pd.DataFrame({"Date": time})
 
     # else:
     #     data_source = pd.read_csv(
@@ -349,34 +329,24 @@ def solar_generation(country, energy_volume, year, NUTS2=None):
 
 
 def onshore_generation(country, energy_volume, NUTS2=None, year=None):
-    if NUTS2:
-        if isinstance(NUTS2, list):
-            file_obj_1 = "/workspaces/ECMtool/Times series data/EMHIRES_WIND_NUTS2_Filtered_2006_2011.csv"
-            file_obj_2 = "/workspaces/ECMtool/Times series data/EMHIRES_WIND_NUTS2_Filtered_2011_2016.csv"
-
-
-            df_1 = pd.read_csv(file_obj_1, usecols=["Date"] + NUTS2 )
-            df_2 = pd.read_csv(file_obj_2, usecols=["Date"] + NUTS2 )
-
-
-            df_all = pd.concat([df_1, df_2], ignore_index=True)
-
-            df_all["Date"] = pd.to_datetime(df_all["Date"], format="mixed", dayfirst=True, errors="coerce")
-
-            # Keep only valid NUTS2 columns that exist in df_all
+    if not NUTS2:
+        st.warning("No NUTS2 region given for the onshore wind profile.")
+        return None, None
 
-            valid_columns = [col for col in NUTS2 if col in df_all.columns]
+    if NUTS2:
+        # Memory-mapped EMHIRES cube (year x hour x NUTS2), no CSV parsing
+        cube = get_emhires_cube("wind")
+        if isinstance(NUTS2, list) and cube is not None:
+            # Compute capacity factor profile of the valid NUTS2 columns
+            capacity_factor_profile, time, valid_columns = cube.profile(year, NUTS2)
             if not valid_columns:
                 st.warning("None of the specified NUTS2 regions were found in the CSV.")
                 return None, None
-        
-            # Compute capacity factor profile
-            capacity_factor_profile = df_all[valid_columns].sum(axis=1)
-            data_source = df_all[["Date"]].copy()
+            data_source = pd.DataFrame({"Date": time})
 
-            
         else:
             st.error("Wind data not found")
+            return None, None
     # else:
     #     data_source = pd.read_csv(
     #         "data/EMHIRES/EMHIRES_WIND_COUNTRY_June2019.csv", usecols=["Date", country])
@@ -407,32 +377,3 @@ def onshore_generation(country, energy_volume, NUTS2=None, year=None):
         (energy_volume * 1e6 / capacity_factor_profile.sum())
     time = data_source["Date"]
     return profile, time
-
-
-def enspreso_extract(NUTS2, level):
-    col = [
-        "nuts2_code",
-        f"wind_onshore_production_twh_{level}",
-        f"solar_production_twh_{level}_total"
-    ]
-    if "archives" in st.session_state:
-        archives = st.session_state.archives
-
-        file_obj = archives["ENSPRESO"]["ENSPRESO_Integrated_NUTS2_Data.csv"]
-        file_obj.seek(0)  # rewind to start
-        df = pd.read_csv(file_obj, sep = ';')
-    else :
-        return None,None
-    df_filter = df[df["nuts2_code"] == NUTS2]
-
-    if df_filter.empty:
-        return None, None
-
-    wind_series = df_filter[col[1]]
-    solar_series = df_filter[col[2]]
-
-    # Get the first (and presumably only) value as float, or None if missing
-    wind = float(wind_series.iloc[0]) if not wind_series.empty else None
-    solar = float(solar_series.iloc[0]) if not solar_series.empty else None
-
-    return solar, wind
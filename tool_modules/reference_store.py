@@ -0,0 +1,171 @@
+import threading
+
+import pandas as pd
+
+from tool_modules.ingest import load_dataset
+
+
+def _load_perton_sector():
+    """
+    AIDRES route table as shown in the pathway editors: one row per
+    configuration, categorised, EU-mix routes removed, readable product names.
+    """
+    from tool_modules.categorisation import join_categories
+    from tool_modules.registry import product_updates
+
+    perton_ALL_AIDRES = get_reference("perton_all")
+    perton_ALL_AIDRES = perton_ALL_AIDRES.groupby(
+        "configuration_id").first().reset_index()
+    perton_ALL_AIDRES = join_categories(perton_ALL_AIDRES)
+
+    perton_ALL_no_mix_AIDRES = perton_ALL_AIDRES[~perton_ALL_AIDRES["configuration_name"].str.contains(
+        "mix")].copy()
+    perton_ALL_no_mix_AIDRES["route_name"] = perton_ALL_no_mix_AIDRES["configuration_name"]
+    perton_ALL_no_mix_AIDRES["product_name"] = perton_ALL_no_mix_AIDRES["product_name"].replace(
+        product_updates)
+    return perton_ALL_no_mix_AIDRES
+
+
+def _load_perton_cube():
+    from tool_modules.perton_cube import PertonCube
+    return PertonCube(get_reference("perton_all"))
+
+
+def _load_production_site():
+    """
+    Production sites as a GeoDataFrame built from the decoded lon/lat, with
+    readable product names and categorical string columns.
+    """
+    import geopandas as gpd
+    from tool_modules.registry import categorise_sites
+
+    df = categorise_sites(load_dataset("production_site_geo"), get_reference("registry"))
+    return gpd.GeoDataFrame(
+        df, geometry=gpd.points_from_xy(df["lon"], df["lat"]), crs="EPSG:4326")
+
+
+def _load_registry():
+    from tool_modules.registry import Registry
+    return Registry(get_reference("perton_sector"), load_dataset("production_site_geo"))
+
+
+def _load_eu_mix_routes():
+    from tool_modules.eu_mix_preconfiguration import build_eu_mix_routes
+    return build_eu_mix_routes()
+
+
+def _load_eu_mix_pathways():
+    from tool_modules.eu_mix_preconfiguration import build_eu_mix_pathways
+    return build_eu_mix_pathways()
+
+
+def _load_site_crosswalk():
+    return load_dataset("site_crosswalk").set_index("aidres_site_id")
+
+
+def _load_nuts_2021():
+    from tool_modules.nuts_regions import load_nuts
+    return load_nuts(2021)
+
+
+def _load_enspreso():
+    return pd.read_csv(
+        "data/ENSPRESO/ENSPRESO_Integrated_NUTS2_Data2021.csv", encoding="latin1")
+
+
+def _load_enspreso_index():
+    from tool_modules.enspreso_index import EnspresoIndex
+    return EnspresoIndex(get_reference("enspreso"))
+
+
+# Immutable reference datasets shared by every session of the server process
+LOADERS = {
+    "perton_all": lambda: load_dataset("perton_all"),
+    "configuration_categories": lambda: load_dataset("configuration_categories").set_index("configuration_id"),
+    "perton_sector": _load_perton_sector,
+    "perton_sector_by_id": lambda: get_reference("perton_sector").set_index("configuration_id"),
+    "perton_cube": _load_perton_cube,
+    "registry": _load_registry,
+    "production_site": _load_production_site,
+    "site_crosswalk": _load_site_crosswalk,
+    "model_configuration": lambda: load_dataset("model_configuration"),
+    "eu_mix_routes": _load_eu_mix_routes,
+    "eu_mix_pathways": _load_eu_mix_pathways,
+    "elmas_time_series": lambda: load_dataset("elmas_time_series"),
+    "elmas_clusters": lambda: load_dataset("elmas_clusters"),
+    "nuts_2021": _load_nuts_2021,
+    "enspreso": _load_enspreso,
+    "enspreso_index": _load_enspreso_index,
+}
+
+_datasets = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _lock_for(name):
+    with _registry_lock:
+        if name not in _locks:
+            _locks[name] = threading.Lock()
+        return _locks[name]
+
+
+def _view(obj):
+    """Shallow copy: shares the column buffers, new columns stay private."""
+    if isinstance(obj, pd.DataFrame):
+        return obj.copy(deep=False)
+    return obj
+
+
+def get_reference(name):
+    """
+    Return a read-only view of a shared reference dataset.
+
+    The dataset is loaded once per server process; every caller receives a
+    shallow copy sharing the same buffers. Adding or replacing columns on the
+    view is private to the caller, editing values in place is not allowed.
+
+    Parameters:
+        name (str): Key in LOADERS.
+
+    Returns:
+        pd.DataFrame: View of the dataset.
+    """
+    if name not in LOADERS:
+        raise KeyError(f"Unknown reference dataset '{name}'")
+
+    if name not in _datasets:
+        with _lock_for(name):
+            if name not in _datasets:
+                _datasets[name] = LOADERS[name]()
+    return _view(_datasets[name])
+
+
+def is_loaded(name):
+    return name in _datasets
+
+
+def clear_references():
+    """Drop every loaded dataset (e.g. after the data folder was updated)."""
+    with _registry_lock:
+        _datasets.clear()
+
+
+def memory_footprint():
+    """
+    Memory held by the shared store.
+
+    Returns:
+        pd.DataFrame: One row per loaded dataset with its row count and size in MB.
+    """
+    rows = []
+    for name, df in list(_datasets.items()):
+        if isinstance(df, pd.DataFrame):
+            size = int(df.memory_usage(index=True, deep=True).sum())
+            n_rows = len(df)
+        elif hasattr(df, "memory_usage"):
+            size, n_rows = df.memory_usage(), None
+        else:
+            size, n_rows = 0, None
+        rows.append({"dataset": name, "rows": n_rows, "size (MB)": size / 1e6})
+    return pd.DataFrame(rows, columns=["dataset", "rows", "size (MB)"])
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from tool_modules.reference_store import get_reference
+
+# Mapping short codes to readable product names (production sites and AIDRES routes)
+product_updates = {
+    "cement": "Cement product",
+    "chemical-PE": "Polyethylene",
+    "chemical-PEA": "Poly-ethyl-acetate",
+    "chemical-olefins": "Olefins",
+    "fertiliser-ammonia": "Ammonia",
+    "fertiliser-nitric-acid": "Nitric acid",
+    "fertiliser-urea": "Urea",
+    "glass-container": "Container glass",
+    "glass-fibre": "Glass fibre",
+    "glass-float": "Float glass",
+    "refineries-light-liquid-fuel": "Light liquid fuel",
+    "steel-secondary" : "Secondary steel",
+    "steel-primary" : "Primary steel"
+}
+
+# Production site columns stored as categoricals, and the registry kind of each
+SITE_CATEGORIES = {
+    "aidres_sector_name": "sector",
+    "wp1_model_product_name": "product",
+    "nuts3_code": None,
+    "production_route_name": None,
+    "product_type_name": None,
+    "method_type_name": None,
+}
+
+
+def sector_product_key(sector, product):
+    """Pathway key of a product, e.g. 'Steel_Primary steel'."""
+    return f"{sector}_{product}"
+
+
+def split_sector_product(key):
+    """(sector, product) of a pathway key."""
+    parts = key.split("_")
+    return parts[0], parts[-1]
+
+
+class Registry:
+    """
+    Integer codes of the sectors and products shared by the reference
+    tables.
+
+    Codes are positions in sorted category lists, so a column stored with
+    dtype(kind) has .cat.codes equal to codes(kind, values), and tables can
+    be joined by gathering on these integers instead of matching strings.
+    Unknown values get code -1.
+    """
+
+    def __init__(self, perton_sector, production_site):
+        site_products = production_site["wp1_model_product_name"].replace(product_updates)
+        self.categories = {
+            "sector": pd.Index(sorted(
+                set(perton_sector["sector_name"].dropna())
+                | set(production_site["aidres_sector_name"].dropna()))),
+            "product": pd.Index(sorted(
+                set(perton_sector["product_name"].dropna()) | set(site_products.dropna()))),
+        }
+
+    def dtype(self, kind):
+        return pd.CategoricalDtype(self.categories[kind])
+
+    def codes(self, kind, values):
+        """Integer code of each value (-1 if not registered)."""
+        return self.categories[kind].get_indexer(pd.Index(values))
+
+    def categorical(self, kind, values):
+        """
+        values as a Categorical whose codes are the registry codes; values
+        not registered (e.g. products of uploaded routes) get codes after
+        the registry's.
+        """
+        values = pd.Series(values)
+        categories = self.categories[kind]
+        extra = pd.Index(values.dropna().unique()).difference(categories)
+        return pd.Categorical(values, categories=categories.append(extra))
+
+    def names(self, kind, codes):
+        """Values of integer codes (None for -1)."""
+        codes = np.asarray(codes)
+        values = self.categories[kind].to_numpy(dtype=object)[np.maximum(codes, 0)]
+        return np.where(codes >= 0, values, None)
+
+    def memory_usage(self):
+        return int(sum(index.memory_usage(deep=True) for index in self.categories.values()))
+
+
+def group_codes(categorical):
+    """
+    Codes of a Categorical as a nullable integer array (<NA> for missing
+    values), so that grouping on them leaves missing values out as grouping
+    on the values does.
+    """
+    codes = pd.array(categorical.codes, dtype="Int64")
+    codes[categorical.codes < 0] = pd.NA
+    return codes
+
+
+def get_registry():
+    """The process-wide registry."""
+    return get_reference("registry")
+
+
+def categorise_sites(df, registry):
+    """
+    Production sites with readable product names and categorical string
+    columns (sector and product columns use the registry categories).
+    """
+    df = df.assign(wp1_model_product_name=df["wp1_model_product_name"].replace(product_updates))
+    columns = {}
+    for column, kind in SITE_CATEGORIES.items():
+        columns[column] = df[column].astype(registry.dtype(kind) if kind else "category")
+    return df.assign(**columns)
@@ -0,0 +1,90 @@
+import sys
+import time
+import logging
+import importlib
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Page function of each tool section and the module defining it. Modules are
+# only imported when their section is opened, so e.g. sklearn, geopandas and
+# pydeck are not loaded for the pathway pages.
+SECTIONS = {
+    "select_page": "tool_modules.pathway_select",
+    "perton_page": "tool_modules.pathway_perton",
+    "emissions_pathway": "tool_modules.emissions",
+    "view_page": "tool_modules.pathway_view",
+    "map_per_pathway": "tool_modules.maps",
+    "cluster_configuration": "tool_modules.cluster_configuration",
+    "cluster_results": "tool_modules.cluster_results",
+    "profile_load": "tool_modules.profile_load",
+    "supply": "tool_modules.supply",
+}
+
+# Cold import time allowed per section module (s); exceeding it is logged
+IMPORT_BUDGETS = {
+    "tool_modules.pathway_select": 0.5,
+    "tool_modules.pathway_perton": 1.0,
+    "tool_modules.emissions": 1.0,
+    "tool_modules.pathway_view": 1.5,
+    "tool_modules.maps": 5.0,
+    "tool_modules.cluster_configuration": 0.5,
+    "tool_modules.cluster_results": 1.0,
+    "tool_modules.profile_load": 1.0,
+    "tool_modules.supply": 3.0,
+}
+
+# Measured cold import time of each section module (s)
+import_times = {}
+_import_lock = threading.Lock()
+
+
+def load_section(name):
+    """
+    Return the page function of a tool section, importing its module on
+    first use and recording how long that import took.
+
+    Parameters:
+        name (str): Key in SECTIONS.
+
+    Returns:
+        callable: The page function.
+    """
+    module_name = SECTIONS[name]
+    module = sys.modules.get(module_name)
+    if module is None:
+        with _import_lock:
+            already_imported = module_name in sys.modules
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            if not already_imported:
+                elapsed = time.perf_counter() - start
+                import_times[module_name] = elapsed
+                budget = IMPORT_BUDGETS.get(module_name)
+                if budget is not None and elapsed > budget:
+                    logger.warning("Importing %s took %.2f s (budget %.2f s)",
+                                   module_name, elapsed, budget)
+    return getattr(module, name)
+
+
+def run_section(name, *args, **kwargs):
+    """Import (if needed) and render a tool section."""
+    return load_section(name)(*args, **kwargs)
+
+
+def import_report():
+    """
+    Cold import time of every section module loaded so far.
+
+    Returns:
+        pd.DataFrame: module, import time (s), budget (s) and whether it was exceeded.
+    """
+    rows = [{
+        "module": module_name,
+        "import time (s)": elapsed,
+        "budget (s)": IMPORT_BUDGETS.get(module_name),
+        "over budget": elapsed > IMPORT_BUDGETS.get(module_name, float("inf")),
+    } for module_name, elapsed in import_times.items()]
+    return pd.DataFrame(rows, columns=["module", "import time (s)", "budget (s)", "over budget"])
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+from tool_modules.reference_store import get_reference
+from tool_modules.pathway_engine import intensity_tensor, site_demand
+from tool_modules.registry import get_registry
+
+
+
+# Utilisation rate (%) of each sector when none is given
+DEFAULT_UTILIZATION = {
+    "Fertilisers": 100,
+    "Steel": 100,
+    "Cement": 100,
+    "Refineries": 100,
+    "Chemical": 100,
+    "Glass": 100,
+}
+
+# Columns of the per site report (results clustering) and of the PyPSA GeoJSON
+REPORT_COLUMNS = [
+    "site_name",
+    "nuts3_code",
+    "cluster",
+    "geometry",
+    "aidres_sector_name",
+    "production_route_name",
+    "prod_cap",
+    "prod_rate",
+    "utilization_rate",
+    "product_name",
+    "electricity_[gj/t] ton",
+    "alternative_fuel_mixture_[gj/t] ton",
+    "biomass_[gj/t] ton",
+    "biomass_waste_[gj/t] ton",
+    "coal_[gj/t] ton",
+    "coke_[gj/t] ton",
+    "crude_oil_[gj/t] ton",
+    "hydrogen_[gj/t] ton",
+    "methanol_[gj/t] ton",
+    "ammonia_[gj/t] ton",
+    "naphtha_[gj/t] ton",
+    "natural_gas_[gj/t] ton",
+    "plastic_mix_[gj/t] ton",
+    "sector_name",
+    "total_energy",
+    "Direct CO2 emissions (t)"
+]
+PYPSA_COLUMNS = [
+    "site_name",
+    "geometry",
+    "electricity_[gj/t] ton",
+    "alternative_fuel_mixture_[gj/t] ton",
+    "biomass_[gj/t] ton",
+    "biomass_waste_[gj/t] ton",
+    "coal_[gj/t] ton",
+    "coke_[gj/t] ton",
+    "crude_oil_[gj/t] ton",
+    "hydrogen_[gj/t] ton",
+    "methanol_[gj/t] ton",
+    "ammonia_[gj/t] ton",
+    "naphtha_[gj/t] ton",
+    "natural_gas_[gj/t] ton",
+    "plastic_mix_[gj/t] ton",
+    "total_energy",
+]
+
+
+def production_sites():
+    """Production sites of the blue-print model, with route table product names."""
+    df = get_reference("production_site")
+    return df[df["wp1_model_product_name"] != "not included in blue-print model"]
+
+
+def _product_codes(site_products, registry):
+    """Registry product code of each site."""
+    if site_products.dtype == registry.dtype("product"):
+        return site_products.cat.codes.to_numpy()
+    return registry.codes("product", site_products)
+
+
+def site_production(df, sector_utilization):
+    """Production sites with their prod_rate (kt) after the utilisation rates."""
+    # Site geometry is decoded once at ingest (reference store)
+    gdf_production_site = df.copy()
+
+    for sector, utilization_rate in sector_utilization.items():
+
+        # Matching sector & utlisation rate
+        matching = gdf_production_site["aidres_sector_name"] == sector
+        gdf_production_site.loc[matching,
+                                "utilization_rate"] = utilization_rate
+
+    # Condition : prod_rate if prod_cap extist, but not prod_rate
+    prod_rate_cap_utli_condi_1 = gdf_production_site["utilization_rate"] / \
+        100 * gdf_production_site["prod_cap"]
+
+    condition_1 = (gdf_production_site["prod_rate"].isna() &
+                   gdf_production_site["prod_cap"].notna() &
+                   gdf_production_site["utilization_rate"].notna())
+
+    gdf_production_site["prod_rate"] = np.where(
+        condition_1, prod_rate_cap_utli_condi_1, gdf_production_site["prod_rate"])
+
+    # Condition : prod_rate if prod_rate exist but not prod_cap
+    prod_rate_cap_utli_condi_2 = gdf_production_site["utilization_rate"] / \
+        100 * gdf_production_site["prod_rate"]
+
+    condition_2 = (gdf_production_site["prod_rate"].notna() &
+                   gdf_production_site["prod_cap"].isna() &
+                   gdf_production_site["utilization_rate"].notna())
+
+    gdf_production_site["prod_rate"] = np.where(
+        condition_2, prod_rate_cap_utli_condi_2, gdf_production_site["prod_rate"])
+
+    # Condition : prod_rate if prod_rate exist and prod_cap
+    prod_rate_cap_utli_condi_3 = gdf_production_site["utilization_rate"] / \
+        100 * gdf_production_site["prod_cap"]
+
+    condition_3 = (gdf_production_site["prod_rate"].isna() &
+                   gdf_production_site["prod_cap"].isna() &
+                   gdf_production_site["utilization_rate"].notna())
+
+    gdf_production_site["prod_rate"] = np.where(
+        condition_3, prod_rate_cap_utli_condi_3, gdf_production_site["prod_rate"])
+
+    return gdf_production_site
+
+
+def pathways_site_demand(df, pathways, sector_utilization, selected_columns, country_codes=None):
+    """
+    Per site demand of several pathways.
+
+    The pathway x site x carrier demand is computed in one step from the
+    site production and the pathways intensities; each pathway's frame is
+    a slice of it.
+
+    Returns:
+        list: One DataFrame per pathway, with the site columns, product_name,
+        the demand columns ('<column> ton', direct emissions as 'Direct CO2
+        emissions (t)'), sector_name and total_energy, restricted to the sites
+        whose product is in the pathway and to country_codes (all if empty).
+    """
+    gdf_production_site = site_production(df, sector_utilization)
+
+    # Weighted per ton intensities of every product of the pathways
+    columns = selected_columns + ["direct_emission_[tco2/t]"]
+    registry = get_registry()
+    tensor, sectors = intensity_tensor(pathways, columns, registry.categories["product"])
+
+    # Sites are joined to the pathways by product code
+    site_codes = _product_codes(gdf_production_site["wp1_model_product_name"], registry)
+    production = gdf_production_site["prod_rate"].to_numpy(dtype=float) * 1000  # prod rate kt
+    demand = site_demand(tensor, site_codes, production)
+
+    gdf_production_site = gdf_production_site.reset_index(drop=True)
+    list_gdf = []
+    for i in range(len(pathways)):
+        site_sectors = np.where(site_codes >= 0, sectors[i][np.maximum(site_codes, 0)], None)
+        rows = np.flatnonzero(pd.notna(site_sectors))
+
+        # Frames hold float64 so cluster and export totals do not accumulate in float32
+        pathway_demand = demand[i, rows].astype(float)
+        gdf_prod_x_perton = gdf_production_site.iloc[rows].copy()
+        gdf_prod_x_perton["product_name"] = registry.names("product", site_codes[rows])
+        for j, column in enumerate(columns):
+            gdf_prod_x_perton[f"{column} ton"] = pathway_demand[:, j]
+        gdf_prod_x_perton["sector_name"] = site_sectors[rows]
+        gdf_prod_x_perton["total_energy"] = np.nansum(pathway_demand, axis=1)
+
+        gdf_prod_x_perton = gdf_prod_x_perton.rename(
+            columns={"direct_emission_[tco2/t] ton": "Direct CO2 emissions (t)"})
+        if country_codes:
+            gdf_prod_x_perton = gdf_prod_x_perton[
+                gdf_prod_x_perton["nuts3_code"].str[:2].isin(country_codes)]
+        list_gdf.append(gdf_prod_x_perton)
+    return list_gdf
@@ -4,6 +4,9 @@ import geopandas as gpd
 import pydeck as pdk
 import json
 
+from tool_modules.ingest import load_dataset
+from tool_modules.reference_store import get_reference
+
 
 def clean_numeric_column(series):
     return (
@@ -17,10 +20,8 @@ def clean_numeric_column(series):
 
 def eurostat_production():
     # Load Eurostat NUTS3 solar and wind production per m2 (2023)
-    NUTS3_solar_MWh_m2_2023 = pd.read_csv(
-        "data/Energy_production/Solar_MWh_m2_2023.csv")
-    NUTS3_wind_MWh_m2_2023 = pd.read_csv(
-        "data/Energy_production/WindOnshore_MWh_m2_2023.csv")
+    NUTS3_solar_MWh_m2_2023 = load_dataset("eurostat_solar")
+    NUTS3_wind_MWh_m2_2023 = load_dataset("eurostat_wind")
 
     # Load NUTS3 area data
     NUTS3_area = pd.read_excel(
@@ -31,8 +32,7 @@ def eurostat_production():
     }, inplace=True)
 
     # Load NUTS shapefile, filter NUTS3 regions
-    gdf = gpd.read_file(
-        "data/NUTS/NUTS_RG_20M_2021_4326/NUTS_RG_20M_2021_4326.shp")
+    gdf = get_reference("nuts_2021")
     gdf_NUTS3 = gdf[gdf["LEVL_CODE"] == 3].copy()
     gdf_NUTS3.rename(columns={"NUTS_ID": "NUTS3",
                      "NUTS_NAME": "Region name"}, inplace=True)
@@ -79,29 +79,8 @@ def eurostat_production():
 
 
 def enspreso(scenario):
-    # Load ENSPRESO data (NUTS2 level)
-    df = pd.read_csv(
-        "data/ENSPRESO/ENSPRESO_Integrated_NUTS2_Data2021.csv", encoding="latin1")
-
-    # Select relevant columns, rename NUTS2 code column
-    df = df[[
-        "nuts2_code",
-        "biomass_production_twh_medium_total",
-        "biomass_production_twh_low_total",
-        "biomass_production_twh_high_total",
-        "wind_onshore_production_twh_medium",
-        "wind_onshore_production_twh_low",
-        "wind_onshore_production_twh_high",
-        "solar_production_twh_medium_total",
-        "solar_production_twh_low_total",
-        "solar_production_twh_high_total"
-    ]]
-    df.rename(columns={"nuts2_code": "NUTS2"}, inplace=True)
-
-    # Filter columns based on selected scenario
-    scenario_cols = [col for col in df.columns if scenario in col]
-    selected_cols = ["NUTS2"] + scenario_cols
-    df_scenario = df[selected_cols].copy()
+    # ENSPRESO data (NUTS2 level), parsed and indexed once per server process
+    df_scenario = get_reference("enspreso_index").scenario_table(scenario)
 
     # Compute total ENSPRESO production for wind and solar at scenario level
     wind_col = next(
@@ -116,8 +95,7 @@ def enspreso(scenario):
 
 
 def load_nuts2_geometry():
-    gdf = gpd.read_file(
-        "data/NUTS/NUTS_RG_20M_2021_4326/NUTS_RG_20M_2021_4326.shp")
+    gdf = get_reference("nuts_2021")
     gdf = gdf[gdf["LEVL_CODE"] == 2].copy()
     gdf.rename(columns={"NUTS_ID": "NUTS2"}, inplace=True)
     return gdf
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+from tool_modules.pathway_engine import pathway_routes, product_groups
+
+# Default sampler settings
+N_SAMPLES = 10_000
+CONCENTRATION = 50.0
+PERCENTILES = (5, 50, 95)
+
+# Scope of the EU-wide totals in the results
+EU_SCOPE = "EU"
+
+
+def dirichlet_weights(weights, codes, n_groups, n_samples, concentration=CONCENTRATION, seed=0):
+    """
+    Draw route weights around the chosen ones, independently per product.
+
+    The weights of the routes of each product follow a Dirichlet
+    distribution centred on their normalised chosen weights; a larger
+    concentration gives tighter samples. A route with zero weight stays at
+    zero and a product with a single route keeps weight 1.
+
+    Parameters:
+        weights (np.ndarray): Chosen weight of each route.
+        codes (np.ndarray): Product (group) position of each route.
+        n_groups (int): Number of products.
+        n_samples (int): Number of weight vectors to draw.
+        concentration (float): Dirichlet concentration of every product.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        np.ndarray: n_samples x route weights, summing to one per product.
+    """
+    weights = np.asarray(weights, dtype=float)
+    weight_sums = np.bincount(codes, weights=weights, minlength=n_groups)
+    if np.any(weight_sums == 0):
+        raise ZeroDivisionError("Weights sum to zero, can't be normalized")
+
+    # Dirichlet draws as normalised Gamma variates, all products at once
+    alpha = concentration * weights / weight_sums[codes]
+    rng = np.random.default_rng(seed)
+    samples = rng.standard_gamma(alpha, size=(n_samples, len(weights)))
+
+    membership = np.zeros((len(weights), n_groups))
+    membership[np.arange(len(weights)), codes] = 1.0
+    sample_sums = samples @ membership
+    return samples / sample_sums[:, codes]
+
+
+def production_matrix(site_products, production, n_products, site_groups=None):
+    """
+    Product x scope matrix of production.
+
+    Column 0 holds the EU-wide production of each product; the next columns
+    the production of each site group (e.g. cluster), in sorted order.
+
+    Parameters:
+        site_products (np.ndarray): Product position of each site (-1 if none).
+        production (np.ndarray): Production of each site; missing counts as 0.
+        n_products (int): Number of products.
+        site_groups (array-like, optional): Group label of each site; sites
+            with a missing label (None/NaN) only count in the EU-wide column.
+
+    Returns:
+        (np.ndarray, list): The matrix and the scope labels of its columns.
+    """
+    site_products = np.asarray(site_products)
+    production = np.nan_to_num(np.asarray(production, dtype=float))
+    sites = np.flatnonzero(site_products >= 0)
+
+    scopes = [EU_SCOPE]
+    if site_groups is not None:
+        group_codes, labels = pd.factorize(np.asarray(site_groups), sort=True)
+        scopes += list(labels)
+
+    matrix = np.zeros((n_products, len(scopes)))
+    np.add.at(matrix[:, 0], site_products[sites], production[sites])
+    if site_groups is not None:
+        grouped = sites[group_codes[sites] >= 0]
+        np.add.at(matrix, (site_products[grouped], group_codes[grouped] + 1), production[grouped])
+    return matrix, scopes
+
+
+def sample_totals(pathway, value_cols, site_products, production, site_groups=None,
+                  n_samples=N_SAMPLES, concentration=CONCENTRATION, seed=0):
+    """
+    Totals of value columns over sites for sampled route weights.
+
+    Site demand is linear in the intensities, so the sites are first reduced
+    to a product x scope production matrix; every sample then costs one
+    row of a single (samples x routes) @ (routes x scopes*columns) product.
+
+    A product whose routes miss a value contributes zero to that column,
+    as missing site values do in the per site totals.
+
+    Parameters:
+        pathway (dict): 'Sector_Product' key -> DataFrame of routes.
+        value_cols (list): Per tonne columns to total.
+        site_products (array-like): Product name of each site.
+        production (array-like): Production of each site (t).
+        site_groups (array-like, optional): Group label of each site.
+        n_samples (int): Number of weight vectors to draw.
+        concentration (float): Dirichlet concentration of every product.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        (np.ndarray, np.ndarray, list): Sampled totals (samples x scopes x
+        columns), the totals for the chosen weights (scopes x columns) and
+        the scope labels.
+    """
+    value_cols = list(value_cols)
+    routes = pathway_routes(pathway)
+    codes, rows, site_codes, products = product_groups(routes["product_name"], site_products)
+    routes = routes.iloc[rows]
+
+    values = routes[value_cols].to_numpy(dtype=float)
+    # np.average makes the product value missing; the site totals skip it
+    missing = np.zeros((len(products), len(value_cols)), dtype=bool)
+    np.logical_or.at(missing, codes, np.isnan(values))
+    values = np.where(missing[codes], 0.0, values)
+
+    matrix, scopes = production_matrix(site_codes, production, len(products), site_groups)
+
+    # route x (scope, column) contribution of a unit weight
+    contribution = (matrix[codes][:, :, None] * values[:, None, :]).reshape(len(codes), -1)
+
+    weights = routes["route_weight"].to_numpy(dtype=float)
+    samples = dirichlet_weights(weights, codes, len(products), n_samples, concentration, seed)
+    totals = (samples @ contribution).reshape(n_samples, len(scopes), len(value_cols))
+
+    chosen = weights / np.bincount(codes, weights=weights)[codes]
+    point = (chosen @ contribution).reshape(len(scopes), len(value_cols))
+    return totals, point, scopes
+
+
+def uncertainty_bands(pathway, indicators, site_products, production, site_groups=None,
+                      n_samples=N_SAMPLES, concentration=CONCENTRATION, seed=0,
+                      percentiles=PERCENTILES):
+    """
+    Percentile bands of EU-wide and per group indicators under route weight
+    uncertainty.
+
+    Parameters:
+        pathway (dict): 'Sector_Product' key -> DataFrame of routes.
+        indicators (dict): Indicator name -> per tonne columns summed into it
+            (e.g. {"total_energy": [...], "Direct CO2 emissions (t)": [...]}).
+        site_products, production, site_groups, n_samples, concentration,
+        seed: As in sample_totals.
+        percentiles (tuple): Percentiles to report.
+
+    Returns:
+        pd.DataFrame: One row per scope and indicator with the value for the
+        chosen weights, the sample mean and the percentiles ('p5', ...).
+    """
+    value_cols = list(dict.fromkeys(col for cols in indicators.values() for col in cols))
+    totals, point, scopes = sample_totals(
+        pathway, value_cols, site_products, production, site_groups,
+        n_samples, concentration, seed)
+
+    # column x indicator selection
+    selection = np.zeros((len(value_cols), len(indicators)))
+    for j, cols in enumerate(indicators.values()):
+        selection[[value_cols.index(col) for col in cols], j] = 1.0
+    totals = totals @ selection
+    point = point @ selection
+
+    bands = np.percentile(totals, percentiles, axis=0)
+    rows = []
+    for g, scope in enumerate(scopes):
+        for j, indicator in enumerate(indicators):
+            row = {"scope": scope, "indicator": indicator,
+                   "chosen weights": point[g, j], "mean": totals[:, g, j].mean()}
+            row.update({f"p{q:g}": bands[i, g, j] for i, q in enumerate(percentiles)})
+            rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Set RES2GO_WARMUP=0 to skip the warm-up (e.g. when developing)
+WARMUP_ENABLED = os.environ.get("RES2GO_WARMUP", "1") != "0"
+
+
+def _warm_nuts():
+    from tool_modules.nuts_regions import get_nuts_index
+    from tool_modules.reference_store import get_reference
+
+    get_reference("nuts_2021")
+    get_nuts_index(2021)
+    get_nuts_index(2013)
+    get_reference("site_crosswalk")
+
+
+def _warm_emhires():
+    from tool_modules.emhires_cube import EMHIRES_SOURCES, get_emhires_cube
+
+    for technology in EMHIRES_SOURCES:
+        get_emhires_cube(technology)
+
+
+def _warm_references(*names):
+    def warm():
+        from tool_modules.reference_store import get_reference
+
+        for name in names:
+            get_reference(name)
+    return warm
+
+
+# Shared caches filled at server start, in order
+WARMUP_STEPS = [
+    ("AIDRES route table", _warm_references("perton_all", "perton_sector")),
+    ("EU-mix pathways", _warm_references("model_configuration", "eu_mix_pathways")),
+    ("Production sites", _warm_references("production_site")),
+    ("NUTS polygons", _warm_nuts),
+    ("ELMAS profiles", _warm_references("elmas_time_series", "elmas_clusters")),
+    ("EMHIRES profiles", _warm_emhires),
+]
+
+_status = {label: "pending" for label, _ in WARMUP_STEPS}
+_durations = {}
+_ready = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _run_warmup():
+    for label, step in WARMUP_STEPS:
+        _status[label] = "running"
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as error:
+            # A missing optional dataset must not stop the other steps
+            _status[label] = f"failed: {error}"
+            logger.warning("Warm-up step '%s' failed: %s", label, error)
+        else:
+            _status[label] = "done"
+        _durations[label] = time.perf_counter() - start
+    _ready.set()
+
+
+def start_warmup():
+    """
+    Start the warm-up thread once per server process.
+
+    Safe to call on every script run; later calls do nothing. When the
+    warm-up is disabled the process is reported ready straight away.
+    """
+    global _thread
+    with _thread_lock:
+        if _thread is not None or _ready.is_set():
+            return
+        if not WARMUP_ENABLED:
+            _ready.set()
+            return
+        _thread = threading.Thread(
+            target=_run_warmup, name="res2go-warmup", daemon=True)
+        _thread.start()
+
+
+def is_ready():
+    """True once every warm-up step has finished (or the warm-up is disabled)."""
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout=None):
+    """Block until the warm-up has finished; returns is_ready()."""
+    return _ready.wait(timeout)
+
+
+def warmup_status():
+    """
+    Progress of the warm-up.
+
+    Returns:
+        pd.DataFrame: One row per step with its status and duration (s).
+    """
+    return pd.DataFrame([{
+        "step": label,
+        "status": _status[label],
+        "duration (s)": _durations.get(label),
+    } for label, _ in WARMUP_STEPS], columns=["step", "status", "duration (s)"])